@@ -15,14 +15,17 @@
 """
 Core Logic for Agent Behavior (LLM Driven)
 """
+import asyncio
 import json
+import math
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from config.settings import MORTGAGE_CONFIG
 from models import Agent, AgentStory, Market
 from prompts.buyer_prompts import BUYER_PREFERENCE_TEMPLATE
-from prompts.seller_prompts import (LISTING_STRATEGY_TEMPLATE,
+from prompts.seller_prompts import (BATCH_PRICE_ADJUSTMENT_TEMPLATE,
+                                    LISTING_STRATEGY_TEMPLATE,
                                     PRICE_ADJUSTMENT_TEMPLATE)
 # --- Phase 8: Financial Calculator & New Prompts ---
 from services.financial_calculator import FinancialCalculator
@@ -31,11 +34,26 @@ from utils.llm_client import safe_call_llm, safe_call_llm_async
 
 # --- 1. Story Generation ---
 
-def generate_agent_story(agent: Agent, config=None, occupation_hint: str = None) -> AgentStory:
-    """
-    Generate background story and structured attributes for a new agent.
-    """
-    # 1. Investment Style (Personality) Selection
+STORY_SYSTEM_PROMPT = "你是小说家，擅长构建人物小传。"
+
+STORY_CONSTRAINTS = """
+    【强制约束】
+    1. 若持有房产(props > 0)，严禁在 story/housing_need 中描述为“无房刚需”、“首次置业”或“租房居住”。必须描述为“改善型需求”或“投资客”。
+    2. 若现金充裕(>100w)且有房，严禁描述为“积蓄不多”。
+    3. 住房需求(housing_need)的可选值：刚需(仅限无房), 改善(有房但小), 投资(有钱有房), 学区(有娃).
+
+    请包含：occupation(职业), career_outlook(职业前景), family_plan(家庭规划), education_need(教育需求),
+    housing_need(住房需求), selling_motivation(卖房动机), background_story(3-5句故事).
+
+    另外，请为该人物设定一个投资风格 (investment_style)，可选值:
+    - aggressive (激进): 愿意承担风险，追求高回报
+    - conservative (保守): 厌恶风险，追求本金安全
+    - balanced (平衡): 权衡风险与收益
+"""
+
+
+def pick_investment_style(config=None) -> str:
+    """Suggested investment style (personality) drawn from negotiation.personality_weights."""
     weights = {'balanced': 0.4} # default
     if config:
         weights = config.negotiation.get('personality_weights', {
@@ -45,12 +63,53 @@ def generate_agent_story(agent: Agent, config=None, occupation_hint: str = None)
 
     styles = list(weights.keys())
     probs = list(weights.values())
-    investment_style = random.choices(styles, weights=probs, k=1)[0]
+    return random.choices(styles, weights=probs, k=1)[0]
+
+
+def _default_story(occupation_hint: str = None) -> AgentStory:
+    return AgentStory(
+        occupation=occupation_hint if occupation_hint else "普通职员",
+        career_outlook="稳定",
+        family_plan="暂无",
+        education_need="无",
+        housing_need="刚需",
+        selling_motivation="无",
+        background_story="普通工薪阶层。",
+        investment_style="balanced"
+    )
+
+
+def _story_from_result(result: dict, investment_style: str) -> AgentStory:
+    return AgentStory(
+        occupation=result.get("occupation", "自由职业"),
+        career_outlook=result.get("career_outlook", "未知"),
+        family_plan=result.get("family_plan", "未知"),
+        education_need=result.get("education_need", "无"),
+        housing_need=result.get("housing_need", "刚需"),
+        selling_motivation=result.get("selling_motivation", "无"),
+        background_story=result.get("background_story", "平凡的一生。"),
+        investment_style=result.get("investment_style", investment_style)
+    )
 
+
+def _story_profile(agent: Agent) -> dict:
     # Logic Consistency Fix (Tier 6)
     prop_count = len(agent.owned_properties)
-    has_properties = prop_count > 0
-    total_asset_est = agent.cash + sum(p['current_valuation'] for p in agent.owned_properties) if has_properties else agent.cash
+    total_asset_est = agent.cash
+    if prop_count:
+        total_asset_est += sum(p['current_valuation'] for p in agent.owned_properties)
+    return {"prop_count": prop_count, "total_asset_est": total_asset_est}
+
+
+def generate_agent_story(agent: Agent, config=None, occupation_hint: str = None) -> AgentStory:
+    """
+    Generate background story and structured attributes for a new agent.
+    """
+    # 1. Investment Style (Personality) Selection
+    investment_style = pick_investment_style(config)
+
+    profile = _story_profile(agent)
+    prop_count = profile["prop_count"]
 
     occ_str = f"建议职业: {occupation_hint}" if occupation_hint else ""
 
@@ -64,7 +123,7 @@ def generate_agent_story(agent: Agent, config=None, occupation_hint: str = None)
     {occ_str}
     【关键资产】
     持有房产数量：{prop_count} 套
-    总资产预估：{total_asset_est:,.0f}
+    总资产预估：{profile["total_asset_est"]:,.0f}
 
     【强制约束】
     1. 若持有房产({prop_count} > 0)，严禁在 story/housing_need 中描述为“无房刚需”、“首次置业”或“租房居住”。必须描述为“改善型需求”或“投资客”。
@@ -82,33 +141,77 @@ def generate_agent_story(agent: Agent, config=None, occupation_hint: str = None)
     输出JSON格式。
     """
 
-    default_story = AgentStory(
-        occupation=occupation_hint if occupation_hint else "普通职员",
-        career_outlook="稳定",
-        family_plan="暂无",
-        education_need="无",
-        housing_need="刚需",
-        selling_motivation="无",
-        background_story="普通工薪阶层。",
-        investment_style="balanced"
-    )
+    default_story = _default_story(occupation_hint)
 
-    result = safe_call_llm(prompt, default_story, system_prompt="你是小说家，擅长构建人物小传。", model_type="fast")
+    result = safe_call_llm(prompt, default_story, system_prompt=STORY_SYSTEM_PROMPT, model_type="fast")
 
     # If result is dict (success), map to AgentStory
     if isinstance(result, dict):
-        return AgentStory(
-            occupation=result.get("occupation", "自由职业"),
-            career_outlook=result.get("career_outlook", "未知"),
-            family_plan=result.get("family_plan", "未知"),
-            education_need=result.get("education_need", "无"),
-            housing_need=result.get("housing_need", "刚需"),
-            selling_motivation=result.get("selling_motivation", "无"),
-            background_story=result.get("background_story", "平凡的一生。"),
-            investment_style=result.get("investment_style", investment_style)
-        )
+        return _story_from_result(result, investment_style)
     return result
 
+
+async def batched_generate_agent_stories_async(requests: List[Tuple[Agent, str, str]],
+                                              fallback_stories: List[AgentStory] = None) -> List[AgentStory]:
+    """
+    Generate stories for several agents in one structured LLM request.
+
+    `requests` holds (agent, occupation_hint, suggested_investment_style); the style is
+    drawn by the caller so the RNG sequence does not depend on completion order.
+    Agents missing from the reply get `fallback_stories[i]` if given, else the same
+    default story as generate_agent_story.
+    """
+    if not requests:
+        return []
+
+    profiles = []
+    for agent, occupation_hint, investment_style in requests:
+        profile = _story_profile(agent)
+        profiles.append({
+            "id": agent.id,
+            "age": agent.age,
+            "marital_status": agent.marital_status,
+            "monthly_income": round(agent.monthly_income),
+            "cash": round(agent.cash),
+            "props": profile["prop_count"],
+            "total_assets": round(profile["total_asset_est"]),
+            "occupation_hint": occupation_hint,
+            "suggested_style": investment_style,
+        })
+
+    prompt = f"""
+    为以下 {len(requests)} 个Agent分别生成背景故事 (props=持有房产数量, total_assets=总资产预估, suggested_style=建议投资风格)：
+    {json.dumps(profiles, ensure_ascii=False)}
+    {STORY_CONSTRAINTS}
+    输出JSON: {{"stories": [{{"id": 1, "occupation": "...", "career_outlook": "...", "family_plan": "...",
+        "education_need": "...", "housing_need": "...", "selling_motivation": "...",
+        "background_story": "...", "investment_style": "..."}}]}}
+    每个Agent一条，id 与输入一致。
+    """
+
+    response = await safe_call_llm_async(prompt, {"stories": []}, system_prompt=STORY_SYSTEM_PROMPT,
+                                         model_type="fast", priority="default")
+    items = response.get("stories", []) if isinstance(response, dict) else response
+    by_id = {}
+    if isinstance(items, list):
+        for item in items:
+            if isinstance(item, dict) and "id" in item:
+                try:
+                    by_id[int(item["id"])] = item
+                except (TypeError, ValueError):
+                    continue
+
+    stories = []
+    for i, (agent, occupation_hint, investment_style) in enumerate(requests):
+        item = by_id.get(agent.id)
+        if item:
+            stories.append(_story_from_result(item, investment_style))
+        elif fallback_stories:
+            stories.append(fallback_stories[i])
+        else:
+            stories.append(_default_story(occupation_hint))
+    return stories
+
 def determine_psychological_price(agent: Agent, market_avg_price: float, market_trend: str) -> float:
     """
     Calculate psychological price based on agent personality and market trend.
@@ -281,7 +384,7 @@ async def generate_buyer_preference(agent, market, current_month, macro_summary,
         "strategy_reason": "Default logic due to error"
     }
 
-    data = await safe_call_llm_async(prompt, default_return=default_data, model_type="smart")
+    data = await safe_call_llm_async(prompt, default_return=default_data, model_type="smart", priority="activation")
 
     # Parse Result
     try:
@@ -352,27 +455,42 @@ def generate_real_thought(agent: Agent, trigger: str, market: Market) -> str:
 
 # --- 2. Event System ---
 
-def select_monthly_event(agent: Agent, month: int, config=None) -> dict:
-    """
-    Select a life event for the agent for this month.
-    """
+def _monthly_event_prompt(agent: Agent, month: int, config=None):
+    """Returns the life-event prompt, or None when there is no event pool."""
     event_pool = []
     if config:
         event_pool = config.life_events.get('pool', [])
 
     if not event_pool:
-        # Fallback or return None
-        return {"event": None, "reasoning": "No event pool or config"}
+        return None
 
-    prompt = f"""
+    return f"""
     Agent {agent.id} 背景：{agent.story.background_story}
     可能发生的事件：{[e["event"] for e in event_pool]}
 
     第{month}月最可能发生什么？（无事件返回null）
     输出JSON：{{"event": "..." 或 null, "reasoning": "..."}}
     """
+
+
+def select_monthly_event(agent: Agent, month: int, config=None) -> dict:
+    """
+    Select a life event for the agent for this month.
+    """
+    prompt = _monthly_event_prompt(agent, month, config)
+    if prompt is None:
+        # Fallback or return None
+        return {"event": None, "reasoning": "No event pool or config"}
     return safe_call_llm(prompt, {"event": None, "reasoning": "No event"}, model_type="fast")
 
+
+async def select_monthly_event_async(agent: Agent, month: int, config=None) -> dict:
+    """Async version of select_monthly_event (same prompt, non-blocking call)."""
+    prompt = _monthly_event_prompt(agent, month, config)
+    if prompt is None:
+        return {"event": None, "reasoning": "No event pool or config"}
+    return await safe_call_llm_async(prompt, {"event": None, "reasoning": "No event"}, model_type="fast")
+
 def apply_event_effects(agent: Agent, event_data: dict, config=None):
     """
     Apply the financial effects of an event.
@@ -397,6 +515,24 @@ def determine_listing_strategy(agent: Agent, market_price_map: Dict[str, float],
     For multi-property owners, decide which properties to sell and the pricing strategy.
     Returns: (DecisionDict, ContextMetrics)
     """
+    prompt, default_resp, context_metrics = _build_listing_strategy_request(
+        agent, market_price_map, market_bulletin, market_trend, config)
+    decision = safe_call_llm(prompt, default_resp, priority="activation")
+    return decision, context_metrics
+
+
+async def determine_listing_strategy_async(agent: Agent, market_price_map: Dict[str, float], market_bulletin: str = "",
+                                           market_trend: str = "STABLE", config=None) -> tuple[dict, dict]:
+    """Async version of determine_listing_strategy (same prompt, non-blocking call)."""
+    prompt, default_resp, context_metrics = _build_listing_strategy_request(
+        agent, market_price_map, market_bulletin, market_trend, config)
+    decision = await safe_call_llm_async(prompt, default_resp, priority="activation")
+    return decision, context_metrics
+
+
+def _build_listing_strategy_request(agent: Agent, market_price_map: Dict[str, float], market_bulletin: str,
+                                    market_trend: str, config) -> tuple:
+    """Returns (prompt, default_decision, context_metrics) for the listing strategy call."""
     props_info = []
     total_holding_cost = 0
 
@@ -475,8 +611,7 @@ def determine_listing_strategy(agent: Agent, market_price_map: Dict[str, float],
         "reasoning": "Default balanced strategy"
     }
 
-    decision = safe_call_llm(prompt, default_resp)
-    return decision, context_metrics
+    return prompt, default_resp, context_metrics
 
 def decide_negotiation_format(seller: Agent, interested_buyers: List[Agent], market_info: str) -> str:
     """
@@ -517,28 +652,136 @@ def decide_negotiation_format(seller: Agent, interested_buyers: List[Agent], mar
     return fmt
 
 
-async def decide_price_adjustment(
-    agent_id: int,
-    agent_name: str,
-    investment_style: str,
-    property_id: int,
-    current_price: float,
-    listing_duration: int,
-    market_trend: str,
-    db_conn
-) -> tuple[dict, dict]:
+# --- Negotiation format planner (all sessions of a month, batched) ---
+
+NEGOTIATION_FORMAT_SYSTEM_PROMPT = """你是房产卖家的谈判顾问，为每个卖家选择本次出售的谈判方式。
+【可选方式】
+1. CLASSIC: 传统谈判 (一个个谈，稳妥)
+2. BATCH: 盲拍/批量竞价 (仅当买家>1时可选，适合市场火热，价高者得)
+3. FLASH: 闪电成交 (一口价甩卖，适合急需用钱或市场冷清，需降价换速度)
+【输出】JSON: {"formats": [{"session": 0, "format": "CLASSIC"|"BATCH"|"FLASH", "reasoning": "..."}]}，每个会话一条。"""
+
+
+def _enabled_negotiation_formats(config=None) -> set:
+    formats = {"CLASSIC", "BATCH", "FLASH"}
+    modes = config.get('negotiation.modes', {}) if config else {}
+    if not (modes.get('batch_bidding') or {}).get('enabled', True):
+        formats.discard("BATCH")
+    if not (modes.get('flash_deal') or {}).get('enabled', True):
+        formats.discard("FLASH")
+    return formats
+
+
+def _normalize_negotiation_format(fmt, buyer_count: int, enabled: set) -> str:
+    fmt = str(fmt or "CLASSIC").upper()
+    # Enforce logic: Batch requires > 1 buyer
+    if fmt == "BATCH" and buyer_count < 2:
+        return "CLASSIC"
+    if fmt not in enabled:
+        return "CLASSIC"
+    return fmt
+
+
+def forced_negotiation_format(buyer_count: int, enabled: set, single_buyer_fast_path: bool = True) -> Optional[str]:
+    """Rule fast path: the format when no choice is left, else None (ask the LLM)."""
+    if buyer_count == 0:
+        return "CLASSIC"
+    choices = {"CLASSIC", "FLASH"} & enabled if buyer_count < 2 else {"CLASSIC", "BATCH", "FLASH"} & enabled
+    if len(choices) <= 1:
+        return next(iter(choices), "CLASSIC")
+    if buyer_count == 1 and single_buyer_fast_path:
+        return "CLASSIC"
+    return None
+
+
+async def _plan_negotiation_format_batch_async(sessions: List[Tuple[int, Agent, List[Agent], str]],
+                                               enabled: set) -> Dict[int, str]:
+    entries = [{
+        "session": idx,
+        "seller_id": seller.id,
+        "background": seller.story.background_story[:80],
+        "style": seller.story.investment_style,
+        "market": market_hint,
+        "buyers": len(buyers),
+    } for idx, seller, buyers, market_hint in sessions]
+
+    prompt = f"""
+    以下 {len(entries)} 个卖家本月的房产都有买家感兴趣 (buyers=感兴趣的买家数)：
+    {json.dumps(entries, ensure_ascii=False)}
+    请为每个会话选择谈判方式。
     """
-    LLM decides whether to adjust price for a property that has been listed for too long.
-    Returns: (DecisionDict, ContextMetrics)
+    response = await safe_call_llm_async(prompt, {"formats": []}, system_prompt=NEGOTIATION_FORMAT_SYSTEM_PROMPT,
+                                         priority="negotiation")
+    items = response.get("formats", []) if isinstance(response, dict) else response
+    by_session = {}
+    if isinstance(items, list):
+        for item in items:
+            if isinstance(item, dict) and "session" in item:
+                try:
+                    by_session[int(item["session"])] = item.get("format")
+                except (TypeError, ValueError):
+                    continue
+
+    return {idx: _normalize_negotiation_format(by_session.get(idx), len(buyers), enabled)
+            for idx, _, buyers, _ in sessions}
+
+
+async def plan_negotiation_formats_async(sessions: List[Tuple[Agent, List[Agent], str]], config=None) -> List[str]:
     """
+    Decide the negotiation format for all sessions of a month before dispatch.
+
+    `sessions` holds (seller, interested_buyers, market_hint). Forced cases are
+    resolved by rule; the rest go to the LLM, negotiation.format_planner.batch_size
+    sessions per request, all requests concurrently. Returns 'CLASSIC' / 'BATCH' /
+    'FLASH' per session, in input order.
+    """
+    # The rule backend is LLM-free end to end: every session is a rule-driven CLASSIC negotiation
+    if config and config.get('negotiation.backend', 'llm') == 'rule':
+        return ["CLASSIC"] * len(sessions)
+
+    planner_cfg = (config.get('negotiation.format_planner', {}) if config else {}) or {}
+    batch_size = max(1, int(planner_cfg.get('batch_size', 20)))
+    single_buyer_fast_path = planner_cfg.get('single_buyer_fast_path', True)
+    enabled = _enabled_negotiation_formats(config)
+
+    formats: List[Optional[str]] = []
+    pending = []
+    for idx, (seller, buyers, market_hint) in enumerate(sessions):
+        forced = forced_negotiation_format(len(buyers), enabled, single_buyer_fast_path)
+        formats.append(forced)
+        if forced is None:
+            pending.append((idx, seller, buyers, market_hint))
+
+    if pending:
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        for planned in await asyncio.gather(*[_plan_negotiation_format_batch_async(b, enabled) for b in batches]):
+            for idx, fmt in planned.items():
+                formats[idx] = fmt
+
+    return formats
+
+
+PRICE_ADJUSTMENT_SYSTEM_PROMPT = "你是房产投资顾问，根据性格和市场做出理性决策。"
+PRICE_ADJUSTMENT_DEFAULT = {"action": "B", "coefficient": 0.96, "reason": "默认小幅降价"}
+# Bounds for an LLM-chosen price coefficient (options in the prompt span 0.80~1.0)
+PRICE_COEFFICIENT_RANGE = (0.7, 1.1)
 
-    # Fetch agent background
-    cursor = db_conn.cursor()
-    cursor.execute("SELECT background_story FROM agents_static WHERE agent_id = ?", (agent_id,))
-    row = cursor.fetchone()
-    background = row[0] if row else "普通投资者"
 
-    # Calculate Psych Price
+def _price_coefficient(value) -> float:
+    """LLM coefficient as a float within PRICE_COEFFICIENT_RANGE; null/garbage falls back to the default."""
+    try:
+        coefficient = float(value)
+    except (TypeError, ValueError):
+        return PRICE_ADJUSTMENT_DEFAULT["coefficient"]
+    if not math.isfinite(coefficient):
+        return PRICE_ADJUSTMENT_DEFAULT["coefficient"]
+    low, high = PRICE_COEFFICIENT_RANGE
+    return min(max(coefficient, low), high)
+
+
+def _price_adjustment_context(agent_id: int, investment_style: str, current_price: float,
+                              listing_duration: int, market_trend: str) -> Tuple[float, dict]:
+    """Psychological price and (simulated) holding-cost / competition metrics for a stale listing."""
     mock_agent = Agent(id=agent_id)
     mock_agent.story = AgentStory(investment_style=investment_style)
     psych_price = determine_psychological_price(
@@ -546,14 +789,52 @@ async def decide_price_adjustment(
         current_price,
         market_trend
     )
-    psych_advice = f"【参考建议】心理价位约 {psych_price:,.0f} (基于风格{investment_style})"
 
     # Mock Data for Comp & Holding Cost (Phase 8: To be real DB query)
     # For now, simulate:
     accumulated_holding_cost = current_price * 0.005 * listing_duration # 0.5% per month holding cost
     daily_views = max(0, int(30 - listing_duration * 2)) # Decay views
     comp_min_price = current_price * 0.95 # Competitor is 5% cheaper
-    price_diff = current_price - comp_min_price
+
+    context_metrics = {
+        "accumulated_holding_cost": accumulated_holding_cost,
+        "daily_views": daily_views,
+        "comp_min_price": comp_min_price,
+        "price_gap": current_price - comp_min_price
+    }
+    return psych_price, context_metrics
+
+
+async def decide_price_adjustment(
+    agent_id: int,
+    agent_name: str,
+    investment_style: str,
+    property_id: int,
+    current_price: float,
+    listing_duration: int,
+    market_trend: str,
+    db_conn=None,
+    background: str = None
+) -> tuple[dict, dict]:
+    """
+    LLM decides whether to adjust price for a property that has been listed for too long.
+    `background` is looked up in agents_static only when not supplied by the caller.
+    Returns: (DecisionDict, ContextMetrics)
+    """
+
+    if background is None:
+        # Fetch agent background
+        row = None
+        if db_conn is not None:
+            cursor = db_conn.cursor()
+            cursor.execute("SELECT background_story FROM agents_static WHERE agent_id = ?", (agent_id,))
+            row = cursor.fetchone()
+        background = row[0] if row else None
+    background = background or "普通投资者"
+
+    psych_price, context_metrics = _price_adjustment_context(
+        agent_id, investment_style, current_price, listing_duration, market_trend)
+    psych_advice = f"【参考建议】心理价位约 {psych_price:,.0f} (基于风格{investment_style})"
 
     prompt = PRICE_ADJUSTMENT_TEMPLATE.format(
         agent_name=agent_name,
@@ -564,40 +845,106 @@ async def decide_price_adjustment(
         current_price=current_price,
         market_trend=market_trend,
         psych_advice=psych_advice,
-        accumulated_holding_cost=accumulated_holding_cost,
-        daily_views=daily_views,
-        comp_min_price=comp_min_price,
-        price_diff=price_diff
+        accumulated_holding_cost=context_metrics["accumulated_holding_cost"],
+        daily_views=context_metrics["daily_views"],
+        comp_min_price=context_metrics["comp_min_price"],
+        price_diff=context_metrics["price_gap"]
     )
 
-    context_metrics = {
-        "accumulated_holding_cost": accumulated_holding_cost,
-        "daily_views": daily_views,
-        "comp_min_price": comp_min_price,
-        "price_gap": price_diff
-    }
-
-    default_return = {
-        "action": "B",
-        "coefficient": 0.96,
-        "reason": "默认小幅降价"
-    }
-
     result = await safe_call_llm_async(
         prompt,
-        default_return,
-        system_prompt="你是房产投资顾问，根据性格和市场做出理性决策。",
+        dict(PRICE_ADJUSTMENT_DEFAULT),
+        system_prompt=PRICE_ADJUSTMENT_SYSTEM_PROMPT,
         model_type="smart"
     )
 
     # Calculate new price
-    coefficient = result.get("coefficient", 0.96)
-    new_price = current_price * coefficient
+    if not isinstance(result, dict):
+        result = dict(PRICE_ADJUSTMENT_DEFAULT)
+    result["coefficient"] = _price_coefficient(result.get("coefficient"))
+    new_price = current_price * result["coefficient"]
 
     result["new_price"] = new_price
 
     return result, context_metrics
 
+
+async def _decide_price_adjustment_batch_async(listings: List[Dict], market_trend: str) -> List[Tuple[dict, dict]]:
+    entries, contexts = [], []
+    for idx, listing in enumerate(listings):
+        psych_price, metrics = _price_adjustment_context(
+            listing["agent_id"], listing["investment_style"], listing["current_price"],
+            listing["listing_duration"], market_trend)
+        contexts.append(metrics)
+        entries.append({
+            "listing": idx,
+            "seller": listing["agent_name"],
+            "style": listing["investment_style"],
+            "background": (listing.get("background") or "普通投资者")[:80],
+            "months": listing["listing_duration"],
+            "price": round(listing["current_price"]),
+            "psych_price": round(psych_price),
+            "holding_cost": round(metrics["accumulated_holding_cost"]),
+            "daily_views": metrics["daily_views"],
+            "comp_min_price": round(metrics["comp_min_price"]),
+        })
+
+    prompt = BATCH_PRICE_ADJUSTMENT_TEMPLATE.format(
+        count=len(entries),
+        market_trend=market_trend,
+        listings_json=json.dumps(entries, ensure_ascii=False)
+    )
+    response = await safe_call_llm_async(prompt, {"decisions": []}, system_prompt=PRICE_ADJUSTMENT_SYSTEM_PROMPT,
+                                         model_type="smart")
+    items = response.get("decisions", []) if isinstance(response, dict) else response
+    by_listing = {}
+    if isinstance(items, list):
+        for item in items:
+            if isinstance(item, dict) and "listing" in item:
+                try:
+                    by_listing[int(item["listing"])] = item
+                except (TypeError, ValueError):
+                    continue
+
+    results = []
+    for idx, (listing, metrics) in enumerate(zip(listings, contexts)):
+        result = {**PRICE_ADJUSTMENT_DEFAULT, **by_listing.get(idx, {})}
+        result.pop("listing", None)
+        result["coefficient"] = _price_coefficient(result.get("coefficient"))
+        result["new_price"] = listing["current_price"] * result["coefficient"]
+        results.append((result, metrics))
+    return results
+
+
+async def decide_price_adjustments_async(listings: List[Dict], market_trend: str,
+                                         batch_size: int = 10) -> List[Tuple[dict, dict]]:
+    """
+    Price decisions for many stale listings at once.
+
+    Each listing dict carries agent_id, agent_name, investment_style, background,
+    property_id, current_price and listing_duration (no DB access here). Listings
+    are grouped batch_size per LLM request and all requests run concurrently;
+    a single remaining listing uses the one-listing prompt. Returns
+    (DecisionDict, ContextMetrics) per listing, in input order.
+    """
+    batch_size = max(1, int(batch_size))
+    batches = [listings[i:i + batch_size] for i in range(0, len(listings), batch_size)]
+
+    async def run_batch(batch):
+        if len(batch) == 1:
+            item = batch[0]
+            return [await decide_price_adjustment(
+                agent_id=item["agent_id"], agent_name=item["agent_name"],
+                investment_style=item["investment_style"], property_id=item["property_id"],
+                current_price=item["current_price"], listing_duration=item["listing_duration"],
+                market_trend=market_trend, background=item.get("background") or "普通投资者")]
+        return await _decide_price_adjustment_batch_async(batch, market_trend)
+
+    results = []
+    for batch_results in await asyncio.gather(*[run_batch(b) for b in batches]):
+        results.extend(batch_results)
+    return results
+
 # --- 3. Role Determination ---
 
 from enum import Enum
@@ -823,7 +1170,8 @@ async def batched_determine_role_async(
     default_response = []
 
     # Use global system prompt for caching
-    response = await safe_call_llm_async(prompt, default_response, system_prompt=BATCH_ROLE_SYSTEM_PROMPT)
+    response = await safe_call_llm_async(prompt, default_response, system_prompt=BATCH_ROLE_SYSTEM_PROMPT,
+                                         priority="activation")
 
     if not isinstance(response, list):
         return []
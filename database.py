@@ -11,3 +11,298 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+"""
+SQLite schema and performance profile for simulation runs (V2 schema).
+
+This module owns table creation, migration of older run DBs, connection
+pragmas (WAL, synchronous=NORMAL, mmap/cache sizing) and the indexes used by
+the monthly hot queries.
+"""
+import logging
+import sqlite3
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# table -> [(column, definition)]
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "agents_static": [
+        ("agent_id", "INTEGER PRIMARY KEY"),
+        ("name", "TEXT"),
+        ("birth_year", "INTEGER"),
+        ("marital_status", "TEXT"),
+        ("children_ages", "TEXT"),
+        ("occupation", "TEXT"),
+        ("background_story", "TEXT"),
+        ("investment_style", "TEXT"),
+    ],
+    "agents_finance": [
+        ("agent_id", "INTEGER PRIMARY KEY"),
+        ("monthly_income", "REAL"),
+        ("cash", "REAL"),
+        ("total_assets", "REAL"),
+        ("total_debt", "REAL"),
+        ("mortgage_monthly_payment", "REAL DEFAULT 0"),
+        ("net_cashflow", "REAL"),
+        ("max_affordable_price", "REAL"),
+        ("psychological_price", "REAL"),
+        ("last_price_update_month", "INTEGER"),
+        ("last_price_update_reason", "TEXT"),
+        ("initial_net_worth", "REAL"),
+    ],
+    "properties_static": [
+        ("property_id", "INTEGER PRIMARY KEY"),
+        ("zone", "TEXT"),
+        ("quality", "INTEGER"),
+        ("building_area", "REAL"),
+        ("property_type", "TEXT"),
+        ("is_school_district", "BOOLEAN"),
+        ("school_tier", "INTEGER"),
+        ("price_per_sqm", "REAL"),
+        ("zone_price_tier", "TEXT"),
+        ("initial_value", "REAL"),
+        ("created_at", "INTEGER"),
+    ],
+    "properties_market": [
+        ("property_id", "INTEGER PRIMARY KEY"),
+        ("owner_id", "INTEGER"),
+        ("status", "TEXT DEFAULT 'off_market'"),
+        ("current_valuation", "REAL"),
+        ("listed_price", "REAL"),
+        ("min_price", "REAL"),
+        ("rental_price", "REAL"),
+        ("rental_yield", "REAL"),
+        ("listing_month", "INTEGER"),
+        ("last_transaction_month", "INTEGER"),
+        ("last_price_update_month", "INTEGER"),
+        ("last_price_update_reason", "TEXT"),
+    ],
+    "active_participants": [
+        ("agent_id", "INTEGER PRIMARY KEY"),
+        ("role", "TEXT"),
+        ("target_zone", "TEXT"),
+        ("max_price", "REAL"),
+        ("selling_property_id", "INTEGER"),
+        ("min_price", "REAL"),
+        ("listed_price", "REAL"),
+        ("life_pressure", "TEXT"),
+        ("llm_intent_summary", "TEXT"),
+        ("activated_month", "INTEGER"),
+        ("role_duration", "INTEGER DEFAULT 0"),
+    ],
+    "decision_logs": [
+        ("log_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("agent_id", "INTEGER"),
+        ("month", "INTEGER"),
+        ("event_type", "TEXT"),
+        ("decision", "TEXT"),
+        ("reason", "TEXT"),
+        ("thought_process", "TEXT"),
+        ("context_metrics", "TEXT"),
+        ("llm_called", "BOOLEAN"),
+    ],
+    "transactions": [
+        ("transaction_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("month", "INTEGER"),
+        ("buyer_id", "INTEGER"),
+        ("seller_id", "INTEGER"),
+        ("property_id", "INTEGER"),
+        ("final_price", "REAL"),
+        ("down_payment", "REAL"),
+        ("loan_amount", "REAL"),
+        ("negotiation_rounds", "INTEGER"),
+    ],
+    "negotiations": [
+        ("negotiation_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("buyer_id", "INTEGER"),
+        ("seller_id", "INTEGER"),
+        ("property_id", "INTEGER"),
+        ("round_count", "INTEGER"),
+        ("final_price", "REAL"),
+        ("success", "BOOLEAN"),
+        ("reason", "TEXT"),
+        ("log", "TEXT"),
+    ],
+    "property_buyer_matches": [
+        ("match_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("month", "INTEGER"),
+        ("property_id", "INTEGER"),
+        ("buyer_id", "INTEGER"),
+        ("listing_price", "REAL"),
+        ("buyer_bid", "REAL"),
+        ("is_valid_bid", "BOOLEAN"),
+        ("proceeded_to_negotiation", "BOOLEAN"),
+    ],
+    "market_bulletin": [
+        ("month", "INTEGER PRIMARY KEY"),
+        ("transaction_volume", "INTEGER"),
+        ("avg_price", "REAL"),
+        ("avg_unit_price", "REAL"),
+        ("zone_a_heat", "TEXT"),
+        ("zone_b_heat", "TEXT"),
+        ("zone_stats", "TEXT"),  # per-zone listings/buyers/transactions/heat as JSON (N zones)
+        ("trend_signal", "TEXT"),
+        ("policy_news", "TEXT"),
+        ("llm_analysis", "TEXT"),
+    ],
+    "agent_end_reports": [
+        ("report_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("agent_id", "INTEGER"),
+        ("simulation_run_id", "TEXT"),
+        ("identity_summary", "TEXT"),
+        ("finance_summary", "TEXT"),
+        ("transaction_summary", "TEXT"),
+        ("imp_decision_log", "TEXT"),
+        ("llm_portrait", "TEXT"),
+        ("portrait_status", "TEXT"),  # pending / done / failed / skipped (services/reporting_service.py)
+    ],
+    # Per-agent decision / negotiation history for BehaviorLogger (rebuilds its ring buffers on resume)
+    "agent_history": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("agent_id", "INTEGER"),
+        ("month", "INTEGER"),
+        ("kind", "TEXT"),
+        ("role", "TEXT"),
+        ("action", "TEXT"),
+        ("urgency", "REAL"),
+        ("thought", "TEXT"),
+    ],
+    # Per-month, per-phase profile (utils/profiler.py); phase 'total' = whole month
+    "perf_metrics": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("month", "INTEGER"),
+        ("phase", "TEXT"),
+        ("wall_time", "REAL"),
+        ("llm_calls", "INTEGER"),
+        ("llm_cache_hits", "INTEGER"),
+        ("llm_errors", "INTEGER"),
+        ("llm_latency_total", "REAL"),
+        ("llm_latency_max", "REAL"),
+        ("prompt_tokens", "INTEGER"),
+        ("completion_tokens", "INTEGER"),
+        ("db_statements", "INTEGER"),
+    ],
+}
+
+# (index name, table, columns). Covering where the hot query only needs these columns.
+INDEXES: List[Tuple[str, str, str]] = [
+    # Stale listings (price adjustment), for_sale counts, active listing scans
+    ("idx_pm_status_listing", "properties_market", "status, listing_month, owner_id, listed_price"),
+    # Owner joins (activation candidates, rental income ORDER BY owner_id, current_valuation)
+    ("idx_pm_owner", "properties_market", "owner_id, current_valuation, rental_price"),
+    # Zone sub-selects / joins (zone heat, unit price, rental averages)
+    ("idx_ps_zone", "properties_static", "zone, property_id, building_area"),
+    # Demand per zone (zone heat)
+    ("idx_ap_role_zone", "active_participants", "role, target_zone"),
+    # Per-agent history (reports, diaries)
+    ("idx_dl_agent_month", "decision_logs", "agent_id, month"),
+    # Monthly volume / bulletin
+    ("idx_tx_month", "transactions", "month, property_id, final_price"),
+    ("idx_tx_buyer", "transactions", "buyer_id"),
+    ("idx_tx_seller", "transactions", "seller_id"),
+    ("idx_pbm_buyer_month", "property_buyer_matches", "buyer_id, month"),
+    ("idx_reports_agent", "agent_end_reports", "agent_id"),
+    ("idx_reports_status", "agent_end_reports", "simulation_run_id, portrait_status"),
+    ("idx_agent_history_month", "agent_history", "month"),
+]
+
+DEFAULT_DB_CONFIG = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size_mb": 64,
+    "mmap_size_mb": 256,
+    "busy_timeout_ms": 30000,
+    "optimize_between_months": True,
+}
+
+
+def apply_pragmas(conn: sqlite3.Connection, db_config: Dict = None):
+    """Apply the run-DB performance profile (WAL, synchronous, cache/mmap sizing)."""
+    cfg = dict(DEFAULT_DB_CONFIG, **(db_config or {}))
+    conn.execute(f"PRAGMA journal_mode = {cfg['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {cfg['synchronous']}")
+    # Negative cache_size = KiB
+    conn.execute(f"PRAGMA cache_size = {-int(cfg['cache_size_mb'] * 1024)}")
+    conn.execute(f"PRAGMA mmap_size = {int(cfg['mmap_size_mb'] * 1024 * 1024)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {int(cfg['busy_timeout_ms'])}")
+
+
+def get_connection(db_path: str, db_config: Dict = None, timeout: float = 60.0,
+                   check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a run DB connection with sqlite3.Row rows and the performance profile applied."""
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, db_config)
+    return conn
+
+
+def _create_table_sql(table: str) -> str:
+    cols = ",\n    ".join(f"{name} {definition}" for name, definition in TABLES[table])
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    {cols}\n)"
+
+
+def create_indexes(conn: sqlite3.Connection):
+    for name, table, columns in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> int:
+    """Create missing tables, add missing columns, create indexes. Returns number of columns added."""
+    added = 0
+    for table in TABLES:
+        conn.execute(_create_table_sql(table))
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, definition in TABLES[table]:
+            if name in existing or "PRIMARY KEY" in definition:
+                continue
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            added += 1
+    create_indexes(conn)
+    conn.commit()
+    return added
+
+
+def init_db(db_path: str, db_config: Dict = None):
+    """Create the V2 schema and indexes for a new run."""
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        apply_pragmas(conn, db_config)
+        _ensure_schema(conn)
+        logger.info(f"Database initialized: {db_path}")
+    finally:
+        conn.close()
+
+
+def migrate_db_v2_7(db_path: str, db_config: Dict = None):
+    """
+    Bring an existing run DB up to the current schema (used on resume):
+    missing tables/columns (e.g. decision_logs.context_metrics,
+    properties_market.last_price_update_*) and indexes are added in place.
+    """
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    try:
+        apply_pragmas(conn, db_config)
+        added = _ensure_schema(conn)
+        # Fresh statistics for the new indexes
+        conn.execute("ANALYZE")
+        conn.commit()
+        if added:
+            logger.info(f"Migrated {db_path}: added {added} columns")
+    finally:
+        conn.close()
+
+
+def optimize_db(conn: sqlite3.Connection, analyze: bool = False):
+    """
+    Between-month maintenance: PRAGMA optimize refreshes planner statistics for
+    tables whose contents changed a lot. analyze=True forces a full ANALYZE
+    (useful after the first month, when tables go from empty to populated).
+    """
+    try:
+        if analyze:
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Database optimize failed: {e}")
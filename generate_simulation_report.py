@@ -6,6 +6,8 @@ from datetime import datetime
 
 import matplotlib.pyplot as plt
 
+from services.export_service import PYARROW_AVAILABLE, export_run_tables
+
 # Default Constants
 DB_PATH = 'real_estate_stage2.db'
 REPORT_DIR = 'reports'
@@ -15,85 +17,68 @@ def ensure_dir(path):
         os.makedirs(path)
 
 # --- CSV Export Functions ---
-def export_legacy_csvs(results_dir):
+CSV_CHUNK_ROWS = 10000
+
+def _stream_csv(cursor, path, encoding='utf-8', header=None, transform=None):
+    """Write a query result to CSV in fetchmany chunks (header from the cursor unless given)."""
+    header = header or [c[0] for c in cursor.description]
+    with open(path, "w", newline='', encoding=encoding) as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        while True:
+            rows = cursor.fetchmany(CSV_CHUNK_ROWS)
+            if not rows:
+                break
+            writer.writerows(map(transform, rows) if transform else rows)
+
+def _thought_row(row):
+    # 解析 thought_process JSON 为易读字段
+    month, agent_id, role, trigger, thought_process = row
+    urgency = ""
+    price_exp = ""
+    try:
+        tp = json.loads(thought_process or '{}')
+        urgency = tp.get('urgency', '')
+        price_exp = tp.get('price_expectation', '')
+    except (ValueError, AttributeError):
+        pass
+    return [month, agent_id, role, trigger, urgency, price_exp, thought_process or '']
+
+def export_legacy_csvs(conn, results_dir):
+    """agents.csv / thoughts.csv / properties.csv / trans.csv, streamed in fetchmany chunks."""
     ensure_dir(results_dir)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
-    # 1. agents.csv
+    # 1. agents.csv (V2: agents_static + agents_finance)
     print(f"Exporting agents.csv to {results_dir}...")
-    cursor.execute("SELECT * FROM agents")
-    rows = cursor.fetchall()
-    if rows:
-        with open(f"{results_dir}/agents.csv", "w", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-            writer.writeheader()
-            for row in rows:
-                writer.writerow(dict(row))
+    cursor.execute("""
+        SELECT s.*, f.monthly_income, f.cash, f.total_assets, f.total_debt, f.mortgage_monthly_payment, f.net_cashflow
+        FROM agents_static s LEFT JOIN agents_finance f ON s.agent_id = f.agent_id
+        ORDER BY s.agent_id
+    """)
+    _stream_csv(cursor, f"{results_dir}/agents.csv")
 
     # 2. thoughts.csv (Mapped from decision_logs, 解析JSON为易读格式)
     print("Exporting thoughts.csv...")
-    cursor.execute("SELECT month, agent_id, decision as role, reason as trigger, thought_process FROM decision_logs")
-    rows = cursor.fetchall()
-    if rows:
-        # 定义新的易读字段
-        fieldnames = ['月份', '代理人ID', '角色', '触发原因', '紧迫程度', '价格预期', '原始数据']
-        with open(f"{results_dir}/thoughts.csv", "w", newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in rows:
-                row_dict = dict(row)
-                # 解析 thought_process JSON
-                urgency = ""
-                price_exp = ""
-                try:
-                    tp = json.loads(row_dict.get('thought_process', '{}') or '{}')
-                    urgency = tp.get('urgency', '')
-                    price_exp = tp.get('price_expectation', '')
-                except:
-                    pass
-
-                writer.writerow({
-                    '月份': row_dict.get('month', ''),
-                    '代理人ID': row_dict.get('agent_id', ''),
-                    '角色': row_dict.get('role', ''),
-                    '触发原因': row_dict.get('trigger', ''),
-                    '紧迫程度': urgency,
-                    '价格预期': price_exp,
-                    '原始数据': row_dict.get('thought_process', '')
-                })
+    cursor.execute("SELECT month, agent_id, decision, reason, thought_process FROM decision_logs")
+    _stream_csv(cursor, f"{results_dir}/thoughts.csv", encoding='utf-8-sig',
+                header=['月份', '代理人ID', '角色', '触发原因', '紧迫程度', '价格预期', '原始数据'],
+                transform=_thought_row)
 
     # 3. properties.csv (Mapped to properties_market for V2)
     print("Exporting properties.csv (V2 Market)...")
     cursor.execute("SELECT * FROM properties_market")
-    rows = cursor.fetchall()
-    if rows:
-        with open(f"{results_dir}/properties.csv", "w", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-            writer.writeheader()
-            for row in rows:
-                writer.writerow(dict(row))
+    _stream_csv(cursor, f"{results_dir}/properties.csv")
 
     # 4. trans.csv (transactions)
     print("Exporting trans.csv...")
-    try:
-        cursor.execute("SELECT * FROM transactions")
-        rows = cursor.fetchall()
-        if rows:
-            with open(f"{results_dir}/trans.csv", "w", newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                writer.writeheader()
-                for row in rows:
-                    writer.writerow(dict(row))
-        else:
-            # Create empty file with header if no transactions
-            with open(f"{results_dir}/trans.csv", "w", newline='', encoding='utf-8') as f:
-                f.write("transaction_id,buyer_id,seller_id,board_id,price,date\n")
-    except Exception as e:
-        print(f"Error exporting trans.csv: {e}")
+    cursor.execute("SELECT * FROM transactions")
+    _stream_csv(cursor, f"{results_dir}/trans.csv")
 
-    # 5. console_log.txt (Copy current log)
+    print(f"Legacy CSVs exported to {results_dir}/")
+
+def copy_console_log(results_dir):
+    """console_log.txt (Copy current log)"""
     print("Copying console_log.txt...")
     try:
         if os.path.exists("simulation_run.log"):
@@ -104,31 +89,25 @@ def export_legacy_csvs(results_dir):
     except Exception as e:
         print(f"Error copying log: {e}")
 
-    conn.close()
-    print(f"Legacy CSVs exported to {results_dir}/")
-
 # --- Metric Reports (Markdown) ---
-def generate_agent_personas(report_dir=REPORT_DIR):
-    conn = sqlite3.connect(DB_PATH)
+def generate_agent_personas(conn, report_dir=REPORT_DIR):
     cursor = conn.cursor()
-    cursor.execute("SELECT agent_id, name, age, occupation, background_story, housing_need, selling_motivation FROM agents")
+    cursor.execute("SELECT agent_id, name, birth_year, occupation, background_story, investment_style "
+                   "FROM agents_static")
 
     content = "# Agent Personas Report\n\n"
     for row in cursor.fetchall():
-        content += f"## Agent {row[0]}: {row[1]} ({row[2]}岁)\n"
+        content += f"## Agent {row[0]}: {row[1]} ({2024 - row[2]}岁)\n" if row[2] else f"## Agent {row[0]}: {row[1]}\n"
         content += f"- **Occupation**: {row[3]}\n"
         content += f"- **Background**: {row[4]}\n"
-        content += f"- **Housing Need**: {row[5]}\n"
-        content += f"- **Selling Motivation**: {row[6]}\n"
+        content += f"- **Investment Style**: {row[5]}\n"
         content += "---\n"
 
     with open(f"{report_dir}/agent_personas.md", "w", encoding='utf-8') as f:
         f.write(content)
     print(f"Generated {report_dir}/agent_personas.md")
-    conn.close()
 
-def generate_negotiations(report_dir=REPORT_DIR):
-    conn = sqlite3.connect(DB_PATH)
+def generate_negotiations(conn, report_dir=REPORT_DIR):
     cursor = conn.cursor()
     cursor.execute("SELECT negotiation_id, buyer_id, seller_id, property_id, success, log, final_price FROM negotiations")
 
@@ -157,10 +136,8 @@ def generate_negotiations(report_dir=REPORT_DIR):
     with open(f"{report_dir}/negotiations.md", "w", encoding='utf-8') as f:
         f.write(content)
     print(f"Generated {report_dir}/negotiations.md")
-    conn.close()
 
-def generate_decisions(report_dir=REPORT_DIR):
-    conn = sqlite3.connect(DB_PATH)
+def generate_decisions(conn, report_dir=REPORT_DIR):
     cursor = conn.cursor()
     cursor.execute("SELECT month, agent_id, decision, reason, thought_process FROM decision_logs ORDER BY month, agent_id")
 
@@ -178,10 +155,8 @@ def generate_decisions(report_dir=REPORT_DIR):
     with open(f"{report_dir}/decisions.md", "w", encoding='utf-8') as f:
         f.write(content)
     print(f"Generated {report_dir}/decisions.md")
-    conn.close()
 
-def generate_market_report(report_dir=REPORT_DIR):
-    conn = sqlite3.connect(DB_PATH)
+def generate_market_report(conn, report_dir=REPORT_DIR):
     cursor = conn.cursor()
 
     content = "# Market Report\n\n"
@@ -215,23 +190,20 @@ def generate_market_report(report_dir=REPORT_DIR):
     with open(f"{report_dir}/market_report.md", "w", encoding='utf-8') as f:
         f.write(content)
     print(f"Generated {report_dir}/market_report.md")
-    conn.close()
 
-def generate_wealth_distribution(results_dir):
+def generate_wealth_distribution(conn, results_dir):
     """Generate wealth distribution chart (Histogram)"""
-    conn = sqlite3.connect(DB_PATH)
     # Calculate net worth: Cash + Property Value
-    # Note: Property Value approximation using base_value or listed_price
+    # Note: Property Value approximation using current_valuation
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT a.agent_id, a.cash,
+        SELECT a.agent_id, COALESCE(a.cash, 0),
                COALESCE(SUM(pm.current_valuation), 0) as prop_wealth
-        FROM agents a
+        FROM agents_finance a
         LEFT JOIN properties_market pm ON a.agent_id = pm.owner_id
         GROUP BY a.agent_id
     """)
     rows = cursor.fetchall()
-    conn.close()
 
     if not rows:
         print("No agents found for wealth chart.")
@@ -252,7 +224,7 @@ def generate_wealth_distribution(results_dir):
     plt.close()
     print(f"Generated Wealth Chart: {chart_path}")
 
-def generate_all_reports():
+def generate_all_reports(db_path=DB_PATH):
     """Main entry point for report generation."""
     print("Generating Reports & Exports...")
 
@@ -262,15 +234,24 @@ def generate_all_reports():
     ensure_dir(results_dir)
     ensure_dir(REPORT_DIR)
 
-    # 2. Generate Reports
-    generate_agent_personas(REPORT_DIR)
-    generate_negotiations(REPORT_DIR)
-    generate_decisions(REPORT_DIR)
-    generate_market_report(REPORT_DIR)
-    generate_wealth_distribution(results_dir)
-
-    # 3. Export CSVs
-    export_legacy_csvs(results_dir)
+    # 2. Generate Reports (one shared connection)
+    conn = sqlite3.connect(db_path)
+    try:
+        generate_agent_personas(conn, REPORT_DIR)
+        generate_negotiations(conn, REPORT_DIR)
+        generate_decisions(conn, REPORT_DIR)
+        generate_market_report(conn, REPORT_DIR)
+        generate_wealth_distribution(conn, results_dir)
+
+        # 3. Export CSVs (streamed), plus columnar Parquet + manifest when pyarrow is installed
+        export_legacy_csvs(conn, results_dir)
+        if PYARROW_AVAILABLE:
+            export_run_tables(db_path, os.path.join(results_dir, "parquet"))
+        else:
+            print("pyarrow not installed; skipping Parquet export")
+    finally:
+        conn.close()
+    copy_console_log(results_dir)
 
     print(f"Done! Reports saved in {REPORT_DIR}/ and Data in {results_dir}/")
 
@@ -227,6 +227,43 @@ class Market:
     def __init__(self, properties: List[Dict] = None):
         self.properties = properties or []
         self.price_history: Dict[str, Dict[int, float]] = {'A': {}, 'B': {}} # zone -> {month: avg_price}
+        # Running per-zone price sums so get_avg_price is O(1); kept in sync by
+        # update_property()/add_property(), rebuilt by rebuild_price_index().
+        self._zone_sum: Dict[str, float] = {}
+        self._zone_count: Dict[str, int] = {}
+        self._snapshots: Dict[int, Dict[str, float]] = {} # month -> {zone: avg_price}
+        self.rebuild_price_index()
+
+    @staticmethod
+    def _price_of(prop: Dict) -> float:
+        """Price a property contributes to its zone average (listed price, else base value)."""
+        price = prop.get('listed_price')
+        if price is None:
+            price = prop.get('base_value', 0)
+        return price or 0
+
+    def rebuild_price_index(self):
+        """Recompute zone sums from self.properties (after bulk loads or direct dict edits)."""
+        self._zone_sum = {}
+        self._zone_count = {}
+        for p in self.properties:
+            zone = p['zone']
+            self._zone_sum[zone] = self._zone_sum.get(zone, 0) + self._price_of(p)
+            self._zone_count[zone] = self._zone_count.get(zone, 0) + 1
+
+    def update_property(self, prop: Dict, **fields):
+        """Apply field changes (price / status / owner ...) to a property and keep zone sums in sync."""
+        zone = prop['zone']
+        old_price = self._price_of(prop)
+        prop.update(fields)
+        new_price = self._price_of(prop)
+        if new_price != old_price:
+            self._zone_sum[zone] = self._zone_sum.get(zone, 0) + new_price - old_price
+
+    def snapshot_month(self, month: int):
+        """Freeze current zone averages for `month` (end of month); later lookups of that month are O(1)."""
+        self._snapshots[month] = {zone: self._zone_sum[zone] / count
+                                  for zone, count in self._zone_count.items() if count}
 
     def get_price_change_rate(self, zone: str, month: int) -> float:
         """Calculate price change rate for a zone in a given month compared to previous month"""
@@ -245,18 +282,18 @@ class Market:
     def get_avg_price(self, zone: str, month: int = None) -> float:
         """Get average price for a zone. If month is provided, use historical data."""
         if month is not None:
-             # Look for recorded history first
-             if month in self.price_history[zone]:
-                 return self.price_history[zone][month]
-
-        # Fallback to current properties list
-        zone_props = [p for p in self.properties if p['zone'] == zone]
-        if not zone_props:
+            # Recorded history first, then end-of-month snapshots
+            if month in self.price_history.get(zone, {}):
+                return self.price_history[zone][month]
+            snapshot = self._snapshots.get(month)
+            if snapshot is not None and zone in snapshot:
+                return snapshot[zone]
+
+        # Fallback to current properties (running sums of listed_price or base_value)
+        count = self._zone_count.get(zone, 0)
+        if not count:
             return 0.0
-
-        # Calculate avg based on listed_price or base_value
-        total_price = sum(p.get('listed_price', p.get('base_value', 0)) for p in zone_props)
-        return total_price / len(zone_props)
+        return self._zone_sum[zone] / count
 
     def set_price_change(self, zone: str, month: int, change_rate: float):
         """Mock method for testing price changes: sets price for current month based on prev * (1+rate)"""
@@ -265,10 +302,13 @@ class Market:
              prev_price = 5000000 if zone == 'A' else 2500000 # Default
 
         new_price = prev_price * (1 + change_rate)
-        self.price_history[zone][month] = new_price
+        self.price_history.setdefault(zone, {})[month] = new_price
 
     def add_property(self, property: Dict):
         self.properties.append(property)
+        zone = property['zone']
+        self._zone_sum[zone] = self._zone_sum.get(zone, 0) + self._price_of(property)
+        self._zone_count[zone] = self._zone_count.get(zone, 0) + 1
 
 class DecisionLog:
     def __init__(self, agent_id: int, month: int, event_type: str, decision: str, reason: str, thought_process: str, context_metrics: Dict = None, llm_called: bool = False):
@@ -76,3 +76,26 @@ D. 撤牌观望 (转售为租，或等待明年)
     "reason": "简述原因（必须引用竞品价或持有成本）"
 }}
 """
+
+BATCH_PRICE_ADJUSTMENT_TEMPLATE = """
+以下 {count} 套房产挂牌已久仍未成交，请分别代入每位房东的性格与财务压力做出决策。
+市场趋势：{market_trend}
+
+字段说明: listing=序号, style=投资风格, months=已挂牌月数, price=当前挂牌价,
+psych_price=心理价位参考, holding_cost=挂牌期间累计持有成本, daily_views=浏览量(模拟),
+comp_min_price=同小区竞品最低价
+{listings_json}
+
+【决策选项】
+A. 维持原价 (死扛，相信奇迹)
+B. 小幅降价 (系数 0.95~0.98，试探市场)
+C. 大幅降价/止损 (系数 0.80~0.92，承认失败，立刻套现止损)
+D. 撤牌观望 (转售为租，或等待明年)
+
+返回 JSON (每套房产一条):
+{{
+    "decisions": [
+        {{"listing": 0, "action": "A/B/C/D", "coefficient": 1.0, "reason": "简述原因（必须引用竞品价或持有成本）"}}
+    ]
+}}
+"""
@@ -5,11 +5,15 @@ Export Results Script
 Exports DB tables and Logs to a timestamped folder.
 Enhanced to produce "房产交易中心记录.csv" with rich details.
 """
+import argparse
 import datetime
 import logging
 import os
 import shutil
 import sqlite3
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -31,7 +35,7 @@ def find_latest_result_dir(base_dir="results"):
     dirs.sort(key=os.path.getmtime, reverse=True)
     return dirs[0]
 
-def export_data(db_path=None, output_dir=None):
+def export_data(db_path=None, output_dir=None, parquet=False):
     # Determine DB Path
     if not db_path:
         db_path = DEFAULT_DB_PATH
@@ -66,6 +70,16 @@ def export_data(db_path=None, output_dir=None):
     conn = sqlite3.connect(db_path)
     conn.close()
 
+    # Optional columnar export (Parquet + manifest.json, streamed in chunks)
+    if parquet:
+        from services.export_service import export_run_tables
+        parquet_dir = os.path.join(result_dir, "parquet")
+        manifest = export_run_tables(db_path, parquet_dir)
+        total = sum(entry["rows"] for entry in manifest["tables"].values())
+        logger.info(f"🧱 Parquet export: {total} rows from {len(manifest['tables'])} tables -> {parquet_dir}")
+        logger.info("✅ Export Complete (Log + Parquet).")
+        return
+
     logger.info("✅ Export Complete (Log only).")
     return
 
@@ -77,4 +91,9 @@ def export_data(db_path=None, output_dir=None):
     return
 
 if __name__ == "__main__":
-    export_data()
+    parser = argparse.ArgumentParser(description="Export run logs (and optionally Parquet tables)")
+    parser.add_argument("--db", default=None, help="Run DB path")
+    parser.add_argument("--out", default=None, help="Result directory")
+    parser.add_argument("--parquet", action="store_true", help="Also export run tables to Parquet (requires pyarrow)")
+    args = parser.parse_args()
+    export_data(db_path=args.db, output_dir=args.out, parquet=args.parquet)
@@ -9,26 +9,43 @@ import time
 from typing import Dict, List
 
 from agent_behavior import (apply_event_effects, batched_determine_role_async,
-                            determine_listing_strategy, generate_agent_story,
-                            generate_buyer_preference, select_monthly_event,
-                            should_agent_exit_market)
+                            batched_generate_agent_stories_async,
+                            determine_listing_strategy_async,
+                            generate_buyer_preference, pick_investment_style,
+                            select_monthly_event_async, should_agent_exit_market)
 from config.agent_templates import get_template_for_tier
 from config.agent_tiers import AGENT_TIER_CONFIG
 from models import Agent
+from services.state_store import MarketState
 from utils.name_generator import ChineseNameGenerator
+from utils.persona_generator import PersonaGenerator
+from utils.progress import ThroughputMeter
 
 logger = logging.getLogger(__name__)
 
 class AgentService:
-    def __init__(self, config, db_conn: sqlite3.Connection):
+    def __init__(self, config, db_conn: sqlite3.Connection, market_state: MarketState = None):
         self.config = config
         self.conn = db_conn
         self.agents: List[Agent] = []
         self.agent_map: Dict[int, Agent] = {}
         self.is_v2 = True # Default for new runs
+        # Listing writes go through the in-memory market state (flushed once per phase)
+        self.market_state = market_state or MarketState(db_conn)
 
     def initialize_agents(self, agent_count: int, market_properties: List[Dict]):
-        """批量生成 Agent (V2 Schema)"""
+        """批量生成 Agent (V2 Schema) - sync entry point"""
+        asyncio.run(self.initialize_agents_async(agent_count, market_properties))
+
+    async def initialize_agents_async(self, agent_count: int, market_properties: List[Dict]):
+        """
+        批量生成 Agent (V2 Schema)
+        Allocation runs sequentially (deterministic RNG order); every `story_batch_size`
+        agents are packed into one story request that runs concurrently with the rest
+        of the allocation. Finished batches are written through _flush_agents.
+        With story_generation.mode = template, stories come from PersonaGenerator
+        (no LLM); `llm_sample_rate` of them are still enriched by the LLM.
+        """
         logger.info("Starting Batch Agent Generation (V2 Schema)...")
         self.agents = []
         cursor = self.conn.cursor()
@@ -87,6 +104,19 @@ class AgentService:
 
         property_updates = []
 
+        story_cfg = self.config.get('simulation.agent.story_generation', {}) or {}
+        story_batch_size = max(1, int(story_cfg.get('batch_size', 10)))
+        story_mode = story_cfg.get('mode', 'llm')
+        llm_sample_rate = float(story_cfg.get('llm_sample_rate', 0.0))
+        persona_gen = None
+        if story_mode == 'template':
+            persona_gen = PersonaGenerator(seed=random.randint(0, 10000))
+            logger.info(f"Story generation: offline templates (LLM enrichment for {llm_sample_rate:.0%} sample)")
+        pending_stories = []
+        pending_fallbacks = []
+        story_tasks = []
+        ready_agents = []
+
         for tier in ordered_tiers:
             count = tier_counts.get(tier, 0)
             if count == 0: continue
@@ -145,12 +175,44 @@ class AgentService:
 
                 # Generate Story AFTER assets assigned
                 # Pass occupation hint from template to guide LLM
-                agent.story = generate_agent_story(agent, self.config, occupation_hint=template["occupation"])
+                investment_style = pick_investment_style(self.config)
+                if persona_gen is not None:
+                    agent.story = persona_gen.generate(agent, tier, template, investment_style)
+                    if persona_gen.should_enrich(agent.id, llm_sample_rate):
+                        pending_stories.append((agent, template["occupation"], investment_style))
+                        pending_fallbacks.append(agent.story)
+                    else:
+                        ready_agents.append(agent)
+                else:
+                    pending_stories.append((agent, template["occupation"], investment_style))
 
                 self.agents.append(agent)
                 self.agent_map[agent.id] = agent
 
-                # V2 Data Pipelining
+                current_id += 1
+
+                if len(pending_stories) >= story_batch_size:
+                    story_tasks.append(asyncio.create_task(
+                        self._generate_story_batch(pending_stories, pending_fallbacks or None)))
+                    pending_stories = []
+                    pending_fallbacks = []
+                    # Let the request start while allocation continues
+                    await asyncio.sleep(0)
+
+        if pending_stories:
+            story_tasks.append(asyncio.create_task(
+                self._generate_story_batch(pending_stories, pending_fallbacks or None)))
+
+        async def completed_groups():
+            if ready_agents:
+                yield ready_agents
+            for next_done in asyncio.as_completed(story_tasks):
+                yield await next_done
+
+        # V2 Data Pipelining (in completion order)
+        meter = ThroughputMeter(len(self.agents), label="Agent stories", unit="agents")
+        async for done_agents in completed_groups():
+            for agent in done_agents:
                 s_dict = agent.to_v2_static_dict()
                 f_dict = agent.to_v2_finance_dict()
 
@@ -165,15 +227,14 @@ class AgentService:
                     f_dict['total_assets'], f_dict['total_debt'], f_dict['mortgage_monthly_payment'],
                     f_dict['net_cashflow'], f_dict['max_affordable_price'],
                     f_dict['psychological_price'], f_dict['last_price_update_month'],
-                    f_dict['last_price_update_reason']
+                    f_dict['last_price_update_reason'], f_dict['total_assets']
                 ))
+                meter.update()
 
-                current_id += 1
-
-                if len(batch_static) >= BATCH_SIZE:
-                    self._flush_agents(cursor, batch_static, batch_finance)
-                    batch_static = []
-                    batch_finance = []
+            if len(batch_static) >= BATCH_SIZE:
+                self._flush_agents(cursor, batch_static, batch_finance)
+                batch_static = []
+                batch_finance = []
 
         # Flush remaining
         if batch_static:
@@ -202,6 +263,12 @@ class AgentService:
         # Let's handle it here to keep initialization self-contained.
         self._create_initial_listings(cursor)
 
+    async def _generate_story_batch(self, requests, fallback_stories=None) -> List[Agent]:
+        stories = await batched_generate_agent_stories_async(requests, fallback_stories)
+        for (agent, _, _), story in zip(requests, stories):
+            agent.story = story
+        return [agent for agent, _, _ in requests]
+
     def _flush_agents(self, cursor, batch_static, batch_finance):
         for _retry in range(5):
             try:
@@ -213,9 +280,9 @@ class AgentService:
                     INSERT INTO agents_finance (
                         agent_id, monthly_income, cash, total_assets, total_debt, mortgage_monthly_payment,
                         net_cashflow, max_affordable_price, psychological_price,
-                        last_price_update_month, last_price_update_reason
+                        last_price_update_month, last_price_update_reason, initial_net_worth
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, batch_finance)
                 self.conn.commit()
                 break
@@ -263,19 +330,20 @@ class AgentService:
         except:
             self.is_v2 = False
 
+        self.agents = []
+        self.agent_map = {}
+
         if self.is_v2:
-            logger.info("Loading from V2 Agents tables...")
-            cursor.execute("""
-                SELECT s.*, f.*
-                FROM agents_static s
-                JOIN agents_finance f ON s.agent_id = f.agent_id
-            """)
-        else:
-            logger.info("Loading from V1 Agents table...")
-            cursor.execute("SELECT * FROM agents")
+            self._load_agents_v2(conn)
+            # Load active participants info
+            self._load_active_participants(cursor)
+            logger.info(f"Loaded {len(self.agents)} agents from DB.")
+            return
+
+        logger.info("Loading from V1 Agents table...")
+        cursor.execute("SELECT * FROM agents")
 
         rows = cursor.fetchall()
-        self.agents = []
         for row in rows:
             row = dict(row)
             age = row.get('age')
@@ -292,11 +360,7 @@ class AgentService:
             )
             a.story.occupation = row['occupation']
             a.story.background_story = row['background_story']
-
-            if self.is_v2:
-               a.story.investment_style = row.get('investment_style', 'balanced')
-            else:
-               a.story.housing_need = row.get('housing_need', '')
+            a.story.housing_need = row.get('housing_need', '')
 
             self.agents.append(a)
             self.agent_map[a.id] = a
@@ -306,16 +370,56 @@ class AgentService:
 
         logger.info(f"Loaded {len(self.agents)} agents from DB.")
 
+    def _load_agents_v2(self, conn):
+        """Bulk resume path: one streamed JOIN with explicit columns and tuple rows."""
+        logger.info("Loading from V2 Agents tables...")
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("""
+            SELECT s.agent_id, s.name, s.birth_year, s.marital_status, s.occupation,
+                   s.background_story, s.investment_style,
+                   f.cash, f.monthly_income, f.mortgage_monthly_payment, f.total_debt
+            FROM agents_static s
+            JOIN agents_finance f ON s.agent_id = f.agent_id
+        """)
+
+        agents = self.agents
+        agent_map = self.agent_map
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for (agent_id, name, birth_year, marital_status, occupation, background_story,
+                 investment_style, cash, monthly_income, mortgage_payment, total_debt) in rows:
+                age = 2024 - birth_year if birth_year else 30
+                a = Agent(
+                    id=agent_id,
+                    name=name,
+                    age=age,
+                    marital_status=marital_status,
+                    cash=float(cash),
+                    monthly_income=float(monthly_income)
+                )
+                a.story.occupation = occupation
+                a.story.background_story = background_story
+                a.story.investment_style = investment_style or 'balanced'
+                # Keep mortgage obligations across resume
+                a.mortgage_monthly_payment = float(mortgage_payment or 0)
+                a.total_debt = float(total_debt or 0)
+
+                agents.append(a)
+                agent_map[agent_id] = a
+
     def _load_active_participants(self, cursor):
         """Load active participants and restore their preference data."""
         if self.is_v2:
             try:
                 cursor.execute("SELECT * FROM active_participants")
                 active_rows = cursor.fetchall()
-                active_map = {r['agent_id']: dict(r) for r in active_rows}
-                for a in self.agents:
-                    if a.id in active_map:
-                        a_data = active_map[a.id]
+                for r in active_rows:
+                    a_data = dict(r)
+                    a = self.agent_map.get(a_data['agent_id'])
+                    if a:
                         # Agent object doesn't have 'role' attr by default until runtime
                         # We can attach runtime attrs
                         a.role = a_data.get('role', 'OBSERVER')
@@ -376,15 +480,16 @@ class AgentService:
             cursor.executemany("UPDATE agents_finance SET cash=?, net_cashflow=? WHERE agent_id=?", batch_update)
             self.conn.commit()
 
-    def process_life_events(self, month: int, batch_decision_logs: List):
-        """Handle stochastic life events."""
+    async def process_life_events(self, month: int, batch_decision_logs: List):
+        """Handle stochastic life events (LLM selections run concurrently, effects applied in sample order)."""
         cursor = self.conn.cursor()
         if self.config.life_events:
             life_event_sample_size = int(len(self.agents) * 0.05)
             life_event_candidates = random.sample(self.agents, min(life_event_sample_size, len(self.agents)))
 
-            for agent in life_event_candidates:
-                event_result = select_monthly_event(agent, month, self.config)
+            event_results = await asyncio.gather(*[
+                select_monthly_event_async(agent, month, self.config) for agent in life_event_candidates])
+            for agent, event_result in zip(life_event_candidates, event_results):
                 if event_result and event_result.get("event"):
                     apply_event_effects(agent, event_result, self.config)
 
@@ -504,18 +609,20 @@ class AgentService:
             results = await asyncio.gather(*tasks)
             return [item for sublist in results for item in sublist]
 
+        # Stage 1: role decisions (all batches concurrently)
         logger.info("Running parallel LLM activation...")
         decisions_flat = await process_activation_batches()
         # Process results
 
         new_buyers = []
-        new_sellers = []
         batch_active_insert = []
         batch_finance_update = [] # New: Persist Tier 6 finance data
 
         # Pre-calc property map for fast lookup
         props_map = {p['property_id']: p for p in market.properties}
 
+        # Resolve roles and withdrawals (no LLM), collect the per-agent LLM work
+        activated = []  # (decision, agent, role_str, trigger, is_seller, is_buyer)
         for d in decisions_flat:
             a_id = d.get("id")
             role_str = d.get("role", "OBSERVER").upper()
@@ -538,21 +645,15 @@ class AgentService:
             is_seller = role_str in ["SELLER", "BUYER_SELLER"]
             is_buyer = role_str in ["BUYER", "BUYER_SELLER"]
 
-            metrics = None # Init metrics
-
-            # Seller Logic
-            if is_seller:
-                if not agent.owned_properties:
-                    if is_buyer:
-                        agent.role = "BUYER"
-                        role_str = "BUYER"
-                        is_seller = False
-                    else:
-                        agent.role = "OBSERVER"
-                        continue
+            # Seller without property
+            if is_seller and not agent.owned_properties:
+                if is_buyer:
+                    agent.role = "BUYER"
+                    role_str = "BUYER"
+                    is_seller = False
                 else:
-                    # Generate Listing
-                    decision, metrics = self._create_seller_listing(agent, market, month, market_trend, market_bulletin)
+                    agent.role = "OBSERVER"
+                    continue
 
             # 🛑 Consitency Fix: If NOT seller, ensure no active listings (Withdraw)
             if not is_seller:
@@ -562,9 +663,7 @@ class AgentService:
                      p_obj = props_map.get(prop['property_id'])
                      if p_obj and p_obj.get('status') == 'for_sale':
                          logger.info(f"Agent {agent.id} (Role: {role_str}) withdrawing Property {p_obj['property_id']} from market.")
-                         p_obj['status'] = 'off_market'
-                         # Update DB
-                         cursor.execute("UPDATE properties_market SET status='off_market' WHERE property_id=?", (p_obj['property_id'],))
+                         self.market_state.update(p_obj['property_id'], status='off_market')
                          # Log
                          batch_decision_logs.append((
                              agent.id, month, "LISTING_ACTION", "WITHDRAW",
@@ -572,13 +671,42 @@ class AgentService:
                              None, False
                          ))
 
-            # Buyer Logic
-            if is_buyer:
+            activated.append((d, agent, role_str, trigger, is_seller, is_buyer))
+
+        # Stage 2: all seller strategies and buyer preferences concurrently (bounded)
+        concurrency = max(1, int(self.config.get('simulation.agent.activation_concurrency', 32) or 32))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def seller_stage(agent):
+            async with semaphore:
+                return await self._create_seller_listing(agent, market, month, market_trend, market_bulletin)
+
+        async def buyer_stage(agent):
+            async with semaphore:
                 # PASS recent_bulletins here!
-                pref, reason, b_metrics = await generate_buyer_preference(
+                return await generate_buyer_preference(
                     agent, market, month, macro_desc, market_trend,
                     db_conn=self.conn, recent_bulletins=recent_bulletins
                 )
+
+        seller_jobs = [seller_stage(agent) for _, agent, _, _, is_seller, _ in activated if is_seller]
+        buyer_jobs = [buyer_stage(agent) for _, agent, _, _, _, is_buyer in activated if is_buyer]
+        logger.info(f"Activation fan-out: {len(seller_jobs)} seller strategies, {len(buyer_jobs)} buyer preferences")
+        stage_results = await asyncio.gather(*seller_jobs, *buyer_jobs)
+        seller_results = iter(stage_results[:len(seller_jobs)])
+        buyer_results = iter(stage_results[len(seller_jobs):])
+
+        # Stage 3: apply results in decision order and buffer persistence
+        for d, agent, role_str, trigger, is_seller, is_buyer in activated:
+            metrics = None # Init metrics
+
+            # Seller Logic
+            if is_seller:
+                decision, metrics = next(seller_results)
+
+            # Buyer Logic
+            if is_buyer:
+                pref, reason, b_metrics = next(buyer_results)
                 agent.preference = pref
                 if reason and d:
                     d['reason'] = f"{d.get('reason', '')} | Pref: {reason}"
@@ -642,24 +770,29 @@ class AgentService:
                 WHERE agent_id = ?
             """, batch_finance_update)
 
+        self.market_state.flush(cursor)
         self.conn.commit()
 
         return new_buyers, decisions_flat
 
 
-    def _create_seller_listing(self, agent, market, month, market_trend="STABLE", market_bulletin=""):
-        """Creates listing and returns (listing_dict, context_metrics)."""
-        cursor = self.conn.cursor()
+    async def _create_seller_listing(self, agent, market, month, market_trend="STABLE", market_bulletin=""):
+        """Creates listing and returns (decision, context_metrics)."""
         properties_to_list = []
         strategy_hint = "balanced"
 
         # Calculate strategy first
         zone_prices = {z: market.get_avg_price(z) for z in ["A", "B"]}
 
-        decision, metrics = determine_listing_strategy(agent, zone_prices, market_bulletin, market_trend, self.config)
+        decision, metrics = await determine_listing_strategy_async(agent, zone_prices, market_bulletin, market_trend,
+                                                                   self.config)
 
         target_ids = decision.get("properties_to_sell", [])
-        pricing_coefficient = decision.get("pricing_coefficient", 1.0)
+        # A null/garbled coefficient would send generate_seller_listing down its blocking sync LLM path
+        try:
+            pricing_coefficient = float(decision.get("pricing_coefficient", 1.0))
+        except (TypeError, ValueError):
+            pricing_coefficient = 1.0
         strategy_code = decision.get("strategy", "B")
         strategy_map = {"A": "aggressive", "B": "balanced", "C": "urgent", "D": "hold"}
         strategy_hint = strategy_map.get(strategy_code, "balanced")
@@ -678,8 +811,10 @@ class AgentService:
             listing = generate_seller_listing(agent, p_data, market, strategy_hint, pricing_coefficient=coeff)
             if not hasattr(agent, 'listing'): agent.listing = listing # Store first for active_participants
 
-            # V2 Update
-            cursor.execute("UPDATE properties_market SET status='for_sale', listed_price=?, min_price=?, listing_month=?, last_price_update_month=?, last_price_update_reason=? WHERE property_id=?",
-                          (listing['listed_price'], listing['min_price'], month, month, "Initial Listing", listing['property_id']))
+            # V2 Update (write-behind, flushed with the activation batch)
+            self.market_state.update(listing['property_id'], status='for_sale',
+                                     listed_price=listing['listed_price'], min_price=listing['min_price'],
+                                     listing_month=month, last_price_update_month=month,
+                                     last_price_update_reason="Initial Listing")
 
         return decision, metrics
@@ -0,0 +1,220 @@
+"""
+Columnar export of a run DB to partitioned Parquet files plus a manifest.
+
+Tables are streamed with fetchmany (chunk_rows at a time) and written as row
+groups, so memory stays bounded by one chunk regardless of DB size. Month-keyed
+tables are split Hive-style (<table>/month=<m>/part-0.parquet) and can be read
+with pyarrow.dataset / pandas.read_parquet on the table directory; as in
+Hive, the partition column lives in the directory name, not in the files.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 可选: pyarrow (未安装时无法导出 Parquet)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# table -> partition column (None = single unpartitioned dataset)
+EXPORT_TABLES: Dict[str, Optional[str]] = {
+    "agents_static": None,
+    "agents_finance": None,
+    "properties_static": None,
+    "properties_market": None,
+    "transactions": "month",
+    "negotiations": None,
+    "decision_logs": "month",
+    "market_bulletin": None,
+    "property_buyer_matches": "month",
+}
+
+MANIFEST_FILE = "manifest.json"
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _arrow_type(declared: str):
+    """Arrow type for a SQLite declared column type (affinity rules)."""
+    declared = (declared or "").upper()
+    if "BOOL" in declared:
+        return pa.bool_()
+    if "INT" in declared:
+        return pa.int64()
+    if any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _to_int(v) -> int:
+    """Whole numbers only: 3.0 / '3' -> 3, while 2.5 raises instead of truncating."""
+    if isinstance(v, int):
+        return v
+    f = float(v)
+    if not f.is_integer():
+        raise ValueError(f"{v!r} is not an integer")
+    return int(f)
+
+
+def _converter(arrow_type):
+    if arrow_type == pa.bool_():
+        return bool
+    if arrow_type == pa.int64():
+        return _to_int
+    if arrow_type == pa.float64():
+        return float
+    return str
+
+
+def table_schema(conn: sqlite3.Connection, table: str):
+    """Typed Arrow schema from the table's declared column types."""
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return pa.schema([(col[1], _arrow_type(col[2])) for col in columns])
+
+
+class _PartitionWriter:
+    """One open ParquetWriter per partition of a table, created on first rows."""
+
+    def __init__(self, table_dir: str, schema, partition_col: Optional[str], compression: str):
+        self.table_dir = table_dir
+        self.schema = schema
+        self.partition_col = partition_col
+        self.compression = compression
+        self.writers = {}
+        self.rows: Dict[str, int] = {}
+
+    def path_for(self, value) -> str:
+        if self.partition_col is None:
+            return os.path.join(self.table_dir, "part-0.parquet")
+        key = NULL_PARTITION if value is None else value
+        return os.path.join(self.table_dir, f"{self.partition_col}={key}", "part-0.parquet")
+
+    def write(self, value, columns: Dict[str, List]):
+        path = self.path_for(value)
+        writer = self.writers.get(path)
+        if writer is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = pq.ParquetWriter(path, self.schema, compression=self.compression)
+            self.writers[path] = writer
+            self.rows[path] = 0
+        batch = pa.Table.from_pydict(columns, schema=self.schema)
+        writer.write_table(batch)
+        self.rows[path] += batch.num_rows
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def export_table(conn: sqlite3.Connection, table: str, out_dir: str, partition_col: Optional[str] = None,
+                 chunk_rows: int = 50000, compression: str = "snappy") -> Dict:
+    """
+    Stream one table into <out_dir>/<table>/. Returns its manifest entry.
+    Values that do not fit the declared column type are exported as null and
+    counted in 'coerced_values'.
+    """
+    schema = table_schema(conn, table)
+    names = schema.names
+    converters = [_converter(field.type) for field in schema]
+    part_idx = names.index(partition_col) if partition_col in names else None
+    if part_idx is None:
+        partition_col = None
+    file_fields = [i for i in range(len(names)) if i != part_idx]
+    file_schema = pa.schema([schema.field(i) for i in file_fields])
+
+    table_dir = os.path.join(out_dir, table)
+    writer = _PartitionWriter(table_dir, file_schema, partition_col, compression)
+    coerced = 0
+    total = 0
+    cursor = conn.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY rowid")
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            total += len(rows)
+            # Split the chunk by partition value; rows within a partition keep rowid order
+            partitions: Dict[object, List] = {}
+            for row in rows:
+                key = row[part_idx] if part_idx is not None else None
+                partitions.setdefault(key, []).append(row)
+            for key, part_rows in partitions.items():
+                columns = {}
+                for i in file_fields:
+                    name, convert = names[i], converters[i]
+                    values = []
+                    for row in part_rows:
+                        v = row[i]
+                        if v is not None:
+                            try:
+                                v = convert(v)
+                            except (TypeError, ValueError):
+                                v = None
+                                coerced += 1
+                        values.append(v)
+                    columns[name] = values
+                writer.write(key, columns)
+    finally:
+        writer.close()
+
+    return {
+        "rows": total,
+        "partition_by": partition_col,
+        "schema": {field.name: str(field.type) for field in schema},
+        "coerced_values": coerced,
+        "files": [{"path": os.path.relpath(path, out_dir), "rows": n} for path, n in sorted(writer.rows.items())],
+    }
+
+
+def export_run_tables(db_path: str, out_dir: str, tables: List[str] = None, chunk_rows: int = 50000,
+                      compression: str = "snappy") -> Dict:
+    """
+    Export run tables (default EXPORT_TABLES) to Parquet and write manifest.json
+    with per-table/per-file row counts and schemas. The manifest is written
+    last, so a directory without one is an incomplete export. Re-exporting
+    removes the old manifest first and replaces each exported table directory,
+    so no stale partitions survive.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        manifest = {
+            "db_path": os.path.abspath(db_path),
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "format": "parquet",
+            "compression": compression,
+            "chunk_rows": chunk_rows,
+            "tables": {},
+        }
+        for table in tables or list(EXPORT_TABLES):
+            if table not in existing:
+                logger.warning(f"Export: table {table} not found in {db_path}, skipped")
+                continue
+            shutil.rmtree(os.path.join(out_dir, table), ignore_errors=True)
+            entry = export_table(conn, table, out_dir, EXPORT_TABLES.get(table), chunk_rows, compression)
+            manifest["tables"][table] = entry
+            logger.info(f"Exported {table}: {entry['rows']} rows in {len(entry['files'])} file(s)")
+    finally:
+        conn.close()
+
+    tmp_path = os.path.join(out_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
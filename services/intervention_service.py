@@ -144,9 +144,10 @@ class InterventionService:
             # New columns have defaults, but let's be explicit where needed or rely on defaults.
             # Schema has total_debt.
             cursor.execute("""
-                INSERT INTO agents_finance (agent_id, monthly_income, cash, total_assets, total_debt, mortgage_monthly_payment, net_cashflow)
-                VALUES (?,?,?,?,?,?,?)
-            """, (agent.id, agent.monthly_income, agent.cash, agent.cash, 0, 0, 0))
+                INSERT INTO agents_finance (agent_id, monthly_income, cash, total_assets, total_debt,
+                                            mortgage_monthly_payment, net_cashflow, initial_net_worth)
+                VALUES (?,?,?,?,?,?,?,?)
+            """, (agent.id, agent.monthly_income, agent.cash, agent.cash, 0, 0, 0, agent.cash))
 
         self.conn.commit()
         logger.info(f"Intervention: Added {count} new agents ({tier}).")
@@ -190,7 +191,7 @@ class InterventionService:
             }
 
             # Add to memory
-            market_service.market.properties.append(prop)
+            market_service.market.add_property(prop)
 
             # DB Insert
             cursor.execute("INSERT INTO properties_static (property_id, zone, building_area, initial_value) VALUES (?,?,?,?)",
@@ -1,3 +1,4 @@
+import json
 import logging
 import sqlite3
 from typing import Dict, List
@@ -62,63 +63,18 @@ class MarketService:
         self.conn.commit()
         logger.info(f"Persisted {len(properties)} properties to DB (V2).")
 
-    def load_market_from_db(self, agents: List):
-        """Load market properties from database and link to owners."""
-        cursor = self.conn.cursor()
-        # Use V2 Schema: Join properties_static with properties_market
-        cursor.execute("""
-            SELECT ps.*, pm.status, pm.owner_id, pm.listed_price, pm.current_valuation
-            FROM properties_static ps
-            LEFT JOIN properties_market pm ON ps.property_id = pm.property_id
-        """)
-        # V1 table 'properties' contains everything. V2 split checks?
-        # SimulationRunner.load_from_db checks 'properties'.
-        # Since we just verified V1 cleanup, 'properties' table might still exist?
-        # Wait, I removed 'create table properties' but did I remove 'properties' table?
-        # In simulation_runner, I removed 'property_listings'.
-        # 'properties' table creation was at line 159.
-        # I did NOT remove 'properties' table creation in my V1 Cleanups?
-        # Let's check my edits.
-
-        # Step 1038 edit:
-        # I removed 'cursor.execute("DROP TABLE IF EXISTS property_listings")' and creation.
-
-        # Did I remove 'properties' table?
-        # The edit showed removing property_listings.
-        # Line 158 in simulation_runner starts 'CREATE TABLE properties'.
-
-        # If 'properties' table still exists, it's V1 legcay.
-        # Ideally we should use properties_static and properties_market.
-        # For now, let's assume we still use 'properties' for reading if it wasn't deleted.
-        # BUT, the goal is architecture evolution.
-        # I should probably switch to V2 tables here if possible.
-
-        # Let's assume loading from V2 for now if possible, else fallback.
-        # But 'properties' table creation was NOT removed in the previous step?
-        # I replaced lines 130-141. 'properties' creation starts at 158.
-        # Ah, I might have missed removing 'properties' creation?
-        # Task said "V1 Table Cleanup: Audit property_listings... Remove creation of property_listings..."
-        # It didn't explicitly say remove 'properties' table yet, but it's part of V1.
-        # However, verifying script checks 'property_listings'.
-
-        # Correct approach: Read from properties_static + properties_market.
-        cursor.execute("SELECT ps.*, pm.status, pm.owner_id, pm.listed_price, pm.current_valuation FROM properties_static ps LEFT JOIN properties_market pm ON ps.property_id = pm.property_id")
-        rows = cursor.fetchall()
-
-        properties = []
-        for row in rows:
-            # Need to map columns correctly. 'properties_static' has headers?
-            # Sqlite Row factory useful here.
-            # Assuming row is dict-like if configured, but here we passed db_conn.
-            # We should probably configure row_factory in Runner or here.
-            pass
-            # Implementation detail: simulation_runner sets row_factory.
-
-        # To avoid complexity in this first draft, I will assume we can query 'properties' if it exists, or V2.
-        # But wait, if I am decoupling, I should do it right.
-        # Let's stick to 'properties' for now if I didn't delete it, OR implement V2 loading.
-        # Since I verified verify_db_results targets properties_market, I should use V2.
+    def load_market_from_db(self, agents: List, agent_map: Dict = None):
+        """
+        Load market properties from database and link to owners.
+        One streamed JOIN over properties_static + properties_market; owners are
+        linked through agent_map (O(1) per property).
+        """
+        if agent_map is None:
+            agent_map = {a.id: a for a in agents}
 
+        cursor = self.conn.cursor()
+        # Plain tuples are much cheaper than sqlite3.Row for 100k+ rows
+        cursor.row_factory = None
         cursor.execute("""
             SELECT ps.property_id, ps.zone, ps.quality, ps.building_area, ps.property_type,
                    ps.is_school_district, ps.school_tier, ps.initial_value as base_value,
@@ -126,20 +82,25 @@ class MarketService:
             FROM properties_static ps
             LEFT JOIN properties_market pm ON ps.property_id = pm.property_id
         """)
+        columns = tuple(d[0] for d in cursor.description)
 
-        # Convert to dict
-        columns = [d[0] for d in cursor.description]
-        properties = [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-        # Link to agents
-        for p in properties:
-            if p['owner_id']:
-                agent = next((x for x in agents if x.id == p['owner_id']), None)
-                if agent:
-                    agent.owned_properties.append(p)
+        properties = []
+        linked = 0
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                p = dict(zip(columns, row))
+                properties.append(p)
+
+                owner = agent_map.get(p['owner_id']) if p['owner_id'] else None
+                if owner:
+                    owner.owned_properties.append(p)
+                    linked += 1
 
         self.market = Market(properties)
-        logger.info(f"Loaded {len(properties)} properties from DB (V2).")
+        logger.info(f"Loaded {len(properties)} properties from DB (V2), {linked} linked to owners.")
 
     def get_recent_bulletins(self, current_month: int, n: int = 3) -> List[Dict]:
         """
@@ -159,6 +120,59 @@ class MarketService:
         # Return in chronological order
         return [{'month': r[0], 'avg_price': r[1], 'volume': r[2], 'trend': r[3]} for r in reversed(rows)]
 
+    def get_zone_stats(self, month: int) -> Dict[str, Dict]:
+        """
+        One grouped aggregation for all zones: current listings and buyer demand,
+        plus transactions of `month` (count / total price / total area).
+        Zones come from market.zones config plus any zone present in the data.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT zone, SUM(listings), SUM(buyers), SUM(tx_count), SUM(tx_value), SUM(tx_area)
+            FROM (
+                SELECT ps.zone AS zone, COUNT(*) AS listings, 0 AS buyers, 0 AS tx_count, 0 AS tx_value, 0 AS tx_area
+                FROM properties_market pm
+                JOIN properties_static ps ON ps.property_id = pm.property_id
+                WHERE pm.status = 'for_sale'
+                GROUP BY ps.zone
+                UNION ALL
+                SELECT target_zone, 0, COUNT(*), 0, 0, 0
+                FROM active_participants
+                WHERE role IN ('BUYER', 'BUYER_SELLER') AND target_zone IS NOT NULL
+                GROUP BY target_zone
+                UNION ALL
+                SELECT ps.zone, 0, 0, COUNT(*), SUM(t.final_price), SUM(ps.building_area)
+                FROM transactions t
+                JOIN properties_static ps ON t.property_id = ps.property_id
+                WHERE t.month = ?
+                GROUP BY ps.zone
+            )
+            GROUP BY zone
+        """, (month,))
+
+        zone_stats = {z: {"listings": 0, "buyers": 0, "tx_count": 0, "tx_value": 0.0, "tx_area": 0.0}
+                      for z in (self.config.get('market.zones', {}) or {})}
+        for zone, listings, buyers, tx_count, tx_value, tx_area in cursor.fetchall():
+            zone_stats[zone] = {
+                "listings": listings or 0,
+                "buyers": buyers or 0,
+                "tx_count": tx_count or 0,
+                "tx_value": tx_value or 0.0,
+                "tx_area": tx_area or 0.0,
+            }
+
+        for s in zone_stats.values():
+            s["avg_unit_price"] = s["tx_value"] / s["tx_area"] if s["tx_area"] else 0.0
+            s["heat"] = self._zone_heat(s["listings"], s["buyers"])
+        return zone_stats
+
+    @staticmethod
+    def _zone_heat(listings: int, buyers: int) -> str:
+        if buyers == 0:
+            return "COLD" if listings > 5 else "BALANCED"
+        ratio = listings / max(buyers, 1)
+        return "COLD" if ratio > 1.5 else ("HOT" if ratio < 0.7 else "BALANCED")
+
     async def generate_market_bulletin(self, month: int, extra_news: List[str] = None) -> str:
         """
         Generate monthly market bulletin with LLM analysis.
@@ -168,26 +182,15 @@ class MarketService:
 
         cursor = self.conn.cursor()
 
-        # 1. Query last month's transactions (Volume & Total Price)
-        # JOIN with properties_static to fetch AREA for unit price calculation
-        cursor.execute("""
-            SELECT
-                COUNT(*) as count,
-                AVG(t.final_price) as avg_price,
-                SUM(t.final_price) as total_volume,
-                SUM(t.final_price) / SUM(p.building_area) as avg_unit_price
-            FROM transactions t
-            JOIN properties_static p ON t.property_id = p.property_id
-            WHERE t.month = ?
-        """, (month - 1,))
-
-        last_month_stats = cursor.fetchone()
-        transaction_count = last_month_stats[0] if last_month_stats else 0
-        avg_price = last_month_stats[1] if last_month_stats and last_month_stats[1] else 0
-        avg_unit_price = last_month_stats[3] if last_month_stats and last_month_stats[3] else 0
-
-        # Handle case where no transactions occurred
-        if not avg_unit_price: avg_unit_price = 0
+        # 1. Per-zone listings / demand / last month's transactions in one aggregate query
+        zone_stats = self.get_zone_stats(month - 1)
+
+        # Market-wide last month figures (Volume, Avg Price, Unit Price = total price / total area)
+        transaction_count = sum(s["tx_count"] for s in zone_stats.values())
+        total_value = sum(s["tx_value"] for s in zone_stats.values())
+        total_area = sum(s["tx_area"] for s in zone_stats.values())
+        avg_price = total_value / transaction_count if transaction_count else 0
+        avg_unit_price = total_value / total_area if total_area else 0
 
         # 2. Calculate price change (MoM for Unit Price)
         price_change_pct = 0.0
@@ -205,23 +208,14 @@ class MarketService:
             if prev_bulletin and len(prev_bulletin) > 1 and prev_bulletin[1] and prev_bulletin[1] > 0 and avg_unit_price > 0:
                  unit_price_change_pct = ((avg_unit_price - prev_bulletin[1]) / prev_bulletin[1]) * 100
 
-        # 3. Calculate zone heat
-        def calc_zone_heat(zone):
-            cursor.execute("SELECT COUNT(*) FROM properties_market WHERE status = 'for_sale' AND property_id IN (SELECT property_id FROM properties_static WHERE zone = ?)", (zone,))
-            result = cursor.fetchone()
-            listings = result[0] if result else 0
-
-            cursor.execute("SELECT COUNT(*) FROM active_participants WHERE role IN ('BUYER', 'BUYER_SELLER') AND target_zone = ?", (zone,))
-            result = cursor.fetchone()
-            buyers = result[0] if result else 0
-
-            if buyers == 0:
-                return "COLD" if listings > 5 else "BALANCED"
-            ratio = listings / max(buyers, 1)
-            return "COLD" if ratio > 1.5 else ("HOT" if ratio < 0.7 else "BALANCED")
-
-        zone_a_heat = calc_zone_heat('A')
-        zone_b_heat = calc_zone_heat('B')
+        # 3. Zone heat (listings vs. buyer demand), any number of zones
+        # str() key: properties/buyers without a zone group under None
+        # Rows without a zone stay in zone_stats (JSON) but are not a zone to report on
+        zone_heat = {z: s["heat"] for z, s in sorted(zone_stats.items(), key=lambda kv: str(kv[0])) if z is not None}
+        zone_a_heat = zone_heat.get('A')
+        zone_b_heat = zone_heat.get('B')
+        zone_heat_lines = "\n".join(f"            - {z}区热度: {h}" for z, h in zone_heat.items())
+        zone_heat_summary = " | ".join(f"{z}区热度: {h}" for z, h in zone_heat.items())
 
         # 4. Determine trend signal
         change_to_use = unit_price_change_pct if avg_unit_price > 0 else price_change_pct
@@ -248,8 +242,7 @@ class MarketService:
             - 成交量: {transaction_count}套
             - 成交均价: {avg_price:,.0f}元
             - 📏 单位均价: {avg_unit_price:,.0f} 元/㎡ (环比 {unit_price_change_pct:+.1f}%)
-            - A区热度: {zone_a_heat}
-            - B区热度: {zone_b_heat}
+{zone_heat_lines}
             - 趋势: {trend_signal} (连续 {abs(self.consecutive_trend)} 个月)
             - 政策新闻: {", ".join(extra_news) if extra_news else "无"}
             """
@@ -280,9 +273,11 @@ class MarketService:
         try:
             cursor.execute("""
                 INSERT OR REPLACE INTO market_bulletin
-                (month, transaction_volume, avg_price, avg_unit_price, zone_a_heat, zone_b_heat, trend_signal, policy_news, llm_analysis)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (month, transaction_count, avg_price, avg_unit_price, zone_a_heat, zone_b_heat, trend_signal, policy_news_str, llm_analysis_text))
+                (month, transaction_volume, avg_price, avg_unit_price, zone_a_heat, zone_b_heat, zone_stats,
+                 trend_signal, policy_news, llm_analysis)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (month, transaction_count, avg_price, avg_unit_price, zone_a_heat, zone_b_heat,
+                  json.dumps(zone_stats, ensure_ascii=False), trend_signal, policy_news_str, llm_analysis_text))
             self.conn.commit()
         except sqlite3.OperationalError as e:
             print(f"Error saving market bulletin: {e}")
@@ -295,7 +290,7 @@ class MarketService:
         📈 上月成交: {transaction_count} 套
         💰 成交均价: ¥{avg_price:,.0f}
         📏 单位均价: ¥{avg_unit_price:,.0f}/㎡ ({unit_price_change_pct:+.1f}%)
-        🏢 A区热度: {zone_a_heat} | B区热度: {zone_b_heat}
+        🏢 {zone_heat_summary}
         📊 趋势信号: {trend_signal} {trend_emoji}
 
         【📝 专家点评】
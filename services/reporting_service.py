@@ -1,111 +1,291 @@
 import asyncio
 import json
 import logging
+import random
 import sqlite3
-from typing import Dict
+from itertools import groupby
+from typing import Dict, Iterable, List, Set
 
+from config.agent_tiers import get_tier_by_income
+from utils.db_pool import DatabasePool
 from utils.llm_client import safe_call_llm_async
 
 logger = logging.getLogger(__name__)
 
+REPORT_DECISION_EVENTS = ('BID', 'LIST_PROPERTY', 'ACCEPT_OFFER', 'REJECT_OFFER')
+LLM_DISABLED_PORTRAIT = "LLM Analysis Disabled"
+NOT_SELECTED_PORTRAIT = "未抽样 (未被画像策略选中)"
+PORTRAIT_FAILED = "分析生成失败"
+
+# agent_end_reports.portrait_status
+PORTRAIT_PENDING = "pending"
+PORTRAIT_DONE = "done"
+PORTRAIT_SKIPPED = "skipped"
+PORTRAIT_FAILED_STATUS = "failed"  # retried when the portrait stage is re-run
+
+PORTRAIT_POLICIES = ("all", "stratified", "transacting", "top_wealth_change")
+
+
+def _rows_as_dicts(cursor) -> List[Dict]:
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def collect_all_agent_data(conn: sqlite3.Connection) -> Dict[int, Dict]:
+    """
+    Report data for every agent with a handful of set-based queries
+    (static, finance, transactions, key decisions) grouped in memory.
+    Agents without a finance row are left out.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT * FROM agents_static ORDER BY agent_id")
+    statics = _rows_as_dicts(cursor)
+    cursor.execute("SELECT * FROM agents_finance")
+    finances = {row['agent_id']: row for row in _rows_as_dicts(cursor)}
+
+    data = {}
+    for static in statics:
+        finance = finances.get(static['agent_id'])
+        if finance is None:
+            continue
+        data[static['agent_id']] = {"identity": static, "finance": finance, "transactions": [], "decisions": []}
+
+    # Transactions (Buy/Sell), per agent ordered by month
+    cursor.execute("SELECT month, property_id, final_price, buyer_id, seller_id FROM transactions "
+                   "ORDER BY month, transaction_id")
+    for month, property_id, final_price, buyer_id, seller_id in cursor.fetchall():
+        for agent_id, tx_type in ((buyer_id, 'BUY'), (seller_id, 'SELL')):
+            if agent_id in data:
+                data[agent_id]["transactions"].append(
+                    {"month": month, "property_id": property_id, "final_price": final_price, "type": tx_type})
+
+    # Key Decisions (Sample important ones)
+    cursor.execute(f"""
+        SELECT agent_id, month, event_type, decision, reason
+        FROM decision_logs
+        WHERE event_type IN ({', '.join('?' * len(REPORT_DECISION_EVENTS))})
+        ORDER BY agent_id, month, log_id
+    """, REPORT_DECISION_EVENTS)
+    for agent_id, month, event_type, decision, reason in cursor.fetchall():
+        if agent_id in data:
+            data[agent_id]["decisions"].append(
+                {"month": month, "event_type": event_type, "decision": decision, "reason": reason})
+
+    return data
+
+
+def agent_tier(d: Dict) -> str:
+    return get_tier_by_income((d['finance'].get('monthly_income') or 0) * 12)
+
+
+def wealth_change(d: Dict) -> float:
+    """Net worth change over the run (0 for agents without an initial_net_worth snapshot)."""
+    finance = d['finance']
+    initial = finance.get('initial_net_worth')
+    if initial is None:
+        return 0.0
+    return (finance.get('total_assets') or 0) - initial
+
+
+def select_portrait_agents(data: Dict[int, Dict], policy: str = "all", sample_rate: float = 0.1,
+                           top_n: int = 100, seed: int = 42) -> Set[int]:
+    """
+    Agent ids that get an LLM portrait under `policy`:
+    - all: every agent
+    - stratified: `sample_rate` of each income tier (at least one per tier), seeded
+    - transacting: agents with at least one BUY/SELL
+    - top_wealth_change: `top_n` agents with the largest absolute net worth change
+    """
+    if policy == "all":
+        return set(data)
+    if policy == "transacting":
+        return {agent_id for agent_id, d in data.items() if d['transactions']}
+    if policy == "top_wealth_change":
+        ranked = sorted(data, key=lambda agent_id: (-abs(wealth_change(data[agent_id])), agent_id))
+        return set(ranked[:max(0, int(top_n))])
+    if policy == "stratified":
+        rng = random.Random(seed)
+        tiers: Dict[str, List[int]] = {}
+        for agent_id in sorted(data):
+            tiers.setdefault(agent_tier(data[agent_id]), []).append(agent_id)
+        selected = set()
+        for tier in sorted(tiers):
+            members = tiers[tier]
+            k = min(len(members), max(1, round(len(members) * sample_rate)))
+            selected.update(rng.sample(members, k))
+        return selected
+    raise ValueError(f"Unknown portrait policy: {policy} (expected one of {PORTRAIT_POLICIES})")
+
+
+def _portrait_group_key(d: Dict):
+    """Agents sharing tier, style and trading activity are batched into one portrait prompt."""
+    return agent_tier(d), d['identity'].get('investment_style') or "", bool(d['transactions'])
+
+
 class ReportingService:
-    def __init__(self, config, db_conn: sqlite3.Connection):
+    """
+    End-of-run agent reports in two stages:
+    1. Data: all agents collected with set-based queries and written with one
+       executemany. The portrait policy decides which rows are marked
+       portrait_status 'pending'; the rest are 'skipped'.
+    2. Portraits: pending rows are grouped by tier / style / trading activity
+       and sent `batch_size` agents per LLM call under a concurrency limit,
+       checkpointed ('done', or 'failed' when the LLM call failed) every
+       `chunk_size` portraits. Re-running the stage picks up rows that are
+       still pending or failed, so it resumes after a crash or rate limiting.
+    Settings: system.reporting (llm_portraits, portrait_policy, sample_rate,
+    top_n, sample_seed, batch_size, portrait_concurrency, chunk_size).
+    """
+
+    def __init__(self, config, db_conn: sqlite3.Connection, db_pool: DatabasePool = None):
         self.config = config
         self.conn = db_conn
+        # Optional pooled access: bulk reads run on a pooled reader, writes go through its writer
+        self.db_pool = db_pool
+        report_cfg = (config.get('system.reporting', {}) if config else {}) or {}
+        self.portrait_concurrency = max(1, int(report_cfg.get('portrait_concurrency', 16)))
+        self.chunk_size = max(1, int(report_cfg.get('chunk_size', 200)))
+        self.batch_size = max(1, int(report_cfg.get('batch_size', 1)))
+        self.portrait_policy = report_cfg.get('portrait_policy', 'all')
+        self.sample_rate = float(report_cfg.get('sample_rate', 0.1))
+        self.top_n = int(report_cfg.get('top_n', 100))
+        self.sample_seed = report_cfg.get('sample_seed', 42)
+        # 'enable_llm_portraits' (top level) is the older switch, still honoured
+        self.use_llm = config.get('enable_llm_portraits', report_cfg.get('llm_portraits', True)) if config else True
+
+    async def _read(self, fn, *args):
+        if self.db_pool:
+            return await self.db_pool.run_read_async(fn, *args)
+        return fn(self.conn, *args)
+
+    async def _write(self, fn):
+        if self.db_pool:
+            return await self.db_pool.write_async(fn)
+        result = fn(self.conn)
+        self.conn.commit()
+        return result
 
-    async def generate_all_agent_reports(self, month: int, run_id: str = None) -> int:
+    async def generate_all_agent_reports(self, month: int, run_id: str = None, use_llm: bool = None) -> int:
         """
         Generate end-of-simulation reports for ALL agents.
         Returns count of reports generated.
         """
         logger.info(f"Generating Agent End Reports for Month {month}...")
+        use_llm = self.use_llm if use_llm is None else use_llm
 
-        # 1. Get all Agent IDs
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT agent_id FROM agents_static")
-        agent_ids = [r[0] for r in cursor.fetchall()]
-
-        # 2. Process in batches to control concurrency (if using LLM)
-        batch_size = 5
-        generated_count = 0
-
-        # Check if LLM portrait is enabled
-        # We can add a config flag for this, forcing it ON for now as per user request
-        use_llm = getattr(self.config, 'enable_llm_portraits', True)
-
-        for i in range(0, len(agent_ids), batch_size):
-            batch_ids = agent_ids[i : i + batch_size]
-            tasks = [self._process_single_agent(aid, run_id, use_llm) for aid in batch_ids]
-
-            # Run batch
-            results = await asyncio.gather(*tasks)
-            generated_count += len(results)
-
-            logger.info(f"Processed batch {i // batch_size + 1}, total {generated_count}/{len(agent_ids)}")
+        written = await self.build_reports(run_id, use_llm)
+        if use_llm:
+            await self.generate_portraits(run_id)
 
         logger.info("Agent Reporting Complete.")
-        return generated_count
-
-    async def _process_single_agent(self, agent_id: int, run_id: str, use_llm: bool):
-        """Aggregate data and generate report for one agent."""
-        try:
-            # 1. Collect Data
-            data = self._collect_agent_data(agent_id)
-
-            # 2. Generate LLM Portrait (Optional)
-            if use_llm:
-                portrait = await self._generate_llm_portrait(data)
-                data['llm_portrait'] = portrait
+        return written
+
+    async def build_reports(self, run_id: str = None, use_llm: bool = True) -> int:
+        """
+        Stage 1: bulk-collect report data and insert rows for agents not yet
+        reported under run_id. Existing rows are only found when this run's
+        reporting stage is being re-run; each simulation run passes its own id.
+        """
+        data = await self._read(collect_all_agent_data)
+        existing = {row[0] for row in await self._read(
+            lambda conn: conn.execute("SELECT agent_id FROM agent_end_reports WHERE simulation_run_id IS ?",
+                                      (run_id,)).fetchall())}
+
+        # Selection runs over all agents with a fixed seed, so a resumed run picks the same sample
+        selected = select_portrait_agents(data, self.portrait_policy, self.sample_rate,
+                                          self.top_n, self.sample_seed) if use_llm else set()
+
+        rows = []
+        for agent_id, d in data.items():
+            if agent_id in existing:
+                continue
+            if agent_id in selected:
+                portrait, status = None, PORTRAIT_PENDING
             else:
-                data['llm_portrait'] = "LLM Analysis Disabled"
-
-            # 3. Persist
-            self._persist_report(agent_id, run_id, data)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to report agent {agent_id}: {e}")
-            return False
-
-    def _collect_agent_data(self, agent_id: int) -> Dict:
-        """Fetch all relevant DB data for the agent."""
-        cursor = self.conn.cursor()
-
-        # Identity
-        cursor.execute("SELECT * FROM agents_static WHERE agent_id=?", (agent_id,))
-        static = dict(cursor.fetchone())
-
-        # Finance
-        cursor.execute("SELECT * FROM agents_finance WHERE agent_id=?", (agent_id,))
-        finance = dict(cursor.fetchone())
-
-        # Transactions (Buy/Sell)
-        cursor.execute("""
-            SELECT month, property_id, final_price, 'BUY' as type
-            FROM transactions WHERE buyer_id=?
-            UNION ALL
-            SELECT month, property_id, final_price, 'SELL' as type
-            FROM transactions WHERE seller_id=?
-            ORDER BY month
-        """, (agent_id, agent_id))
-        tx_rows = cursor.fetchall()
-        transactions = [dict(r) for r in tx_rows]
-
-        # Key Decisions (Sample important ones)
-        cursor.execute("""
-            SELECT month, event_type, decision, reason
-            FROM decision_logs
-            WHERE agent_id=? AND event_type IN ('BID', 'LIST_PROPERTY', 'ACCEPT_OFFER', 'REJECT_OFFER')
-            ORDER BY month
-        """, (agent_id,))
-        dec_rows = cursor.fetchall()
-        decisions = [dict(r) for r in dec_rows]
-
-        return {
-            "identity": static,
-            "finance": finance,
-            "transactions": transactions,
-            "decisions": decisions
-        }
+                portrait, status = (NOT_SELECTED_PORTRAIT if use_llm else LLM_DISABLED_PORTRAIT), PORTRAIT_SKIPPED
+            rows.append((
+                agent_id, run_id,
+                json.dumps(d['identity'], ensure_ascii=False),
+                json.dumps(d['finance'], ensure_ascii=False),
+                json.dumps(d['transactions'], ensure_ascii=False),
+                json.dumps(d['decisions'], ensure_ascii=False),
+                portrait, status
+            ))
+
+        if rows:
+            await self._write(lambda conn: conn.executemany("""
+                INSERT INTO agent_end_reports
+                (agent_id, simulation_run_id, identity_summary, finance_summary, transaction_summary, imp_decision_log,
+                 llm_portrait, portrait_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows))
+        policy = self.portrait_policy if use_llm else 'disabled'
+        logger.info(f"Agent report data: {len(rows)} written, {len(existing)} already present, "
+                    f"{len(selected)} selected for portraits (policy {policy})")
+        return len(rows)
+
+    async def generate_portraits(self, run_id: str = None) -> int:
+        """Stage 2: LLM portraits for pending/failed reports (batched prompts, bounded concurrency, checkpoints)."""
+        pending = await self._read(lambda conn: conn.execute("""
+            SELECT report_id, identity_summary, finance_summary, transaction_summary, imp_decision_log
+            FROM agent_end_reports
+            WHERE simulation_run_id IS ? AND portrait_status IN (?, ?)
+            ORDER BY report_id
+        """, (run_id, PORTRAIT_PENDING, PORTRAIT_FAILED_STATUS)).fetchall())
+        if not pending:
+            return 0
+
+        reports = []
+        for report_id, identity, finance, txs, decisions in pending:
+            reports.append((report_id, {"identity": json.loads(identity), "finance": json.loads(finance),
+                                        "transactions": json.loads(txs), "decisions": json.loads(decisions)}))
+        batches = list(self._portrait_batches(reports))
+
+        logger.info(f"Generating {len(pending)} LLM portraits in {len(batches)} calls "
+                    f"(batch {self.batch_size}, concurrency {self.portrait_concurrency})...")
+        semaphore = asyncio.Semaphore(self.portrait_concurrency)
+
+        async def portraits_for(batch):
+            async with semaphore:
+                try:
+                    if len(batch) == 1:
+                        texts = [await self._generate_llm_portrait(batch[0][1])]
+                    else:
+                        texts = await self._generate_llm_portraits_batch([d for _, d in batch])
+                except Exception as e:
+                    logger.error(f"Failed to generate portraits for reports {[r for r, _ in batch]}: {e}")
+                    texts = [PORTRAIT_FAILED] * len(batch)
+            # Handle if safe_call returned dict error
+            return [(text if isinstance(text, str) else str(text), report_id)
+                    for text, (report_id, _) in zip(texts, batch)]
+
+        done = 0
+        buffer = []
+        for next_done in asyncio.as_completed([portraits_for(batch) for batch in batches]):
+            buffer.extend(await next_done)
+            if len(buffer) >= self.chunk_size:
+                done += await self._checkpoint_portraits(buffer)
+                buffer = []
+                logger.info(f"Portraits: {done}/{len(pending)}")
+        if buffer:
+            done += await self._checkpoint_portraits(buffer)
+        return done
+
+    def _portrait_batches(self, reports: List) -> Iterable[List]:
+        """Chunks of up to batch_size (report_id, data) pairs, each from one group of similar agents."""
+        keyed = sorted(reports, key=lambda r: (_portrait_group_key(r[1]), r[0]))
+        for _, group in groupby(keyed, key=lambda r: _portrait_group_key(r[1])):
+            group = list(group)
+            for i in range(0, len(group), self.batch_size):
+                yield group[i:i + self.batch_size]
+
+    async def _checkpoint_portraits(self, rows) -> int:
+        rows = [(text, PORTRAIT_FAILED_STATUS if text == PORTRAIT_FAILED else PORTRAIT_DONE, report_id)
+                for text, report_id in rows]
+        await self._write(lambda conn: conn.executemany(
+            "UPDATE agent_end_reports SET llm_portrait = ?, portrait_status = ? WHERE report_id = ?", rows))
+        return len(rows)
 
     async def _generate_llm_portrait(self, data: Dict) -> str:
         """Call DeepSeek to write a biography."""
@@ -137,26 +317,57 @@ class ReportingService:
         4. 必须用中文。
         """
 
-        return await safe_call_llm_async(prompt, default_return="分析生成失败", model_type="smart")
+        return await safe_call_llm_async(prompt, default_return=PORTRAIT_FAILED, model_type="smart",
+                                         priority="reporting")
 
-    def _persist_report(self, agent_id: int, run_id: str, data: Dict):
-        """Save structured data to DB."""
-        cursor = self.conn.cursor()
-
-        # Serialize JSON fields
-        id_json = json.dumps(data['identity'], ensure_ascii=False)
-        fin_json = json.dumps(data['finance'], ensure_ascii=False)
-        tx_json = json.dumps(data['transactions'], ensure_ascii=False)
-        dec_json = json.dumps(data['decisions'], ensure_ascii=False)
-        llm_text = data.get('llm_portrait', "")
+    async def _generate_llm_portraits_batch(self, batch: List[Dict]) -> List[str]:
+        """
+        Portraits for several similar agents in one structured LLM request.
+        Agents missing from the reply fall back to a single-agent prompt.
+        """
+        profiles = []
+        for data in batch:
+            identity, finance, txs = data['identity'], data['finance'], data['transactions']
+            profiles.append({
+                "id": identity['agent_id'],
+                "name": identity['name'],
+                "age": 2024 - identity['birth_year'],
+                "occupation": identity['occupation'],
+                "style": identity['investment_style'],
+                "cash_wan": round(finance['cash'] / 10000),
+                "net_worth_wan": round(finance['total_assets'] / 10000),
+                "debt_wan": round(finance['total_debt'] / 10000),
+                "trades": [f"M{t['month']} {t['type']} {t['final_price'] / 10000:.0f}万" for t in txs] or "无交易",
+                "decisions": len(data['decisions']),
+            })
 
-        if isinstance(llm_text, dict): # Handle if safe_call returned dict error
-             llm_text = str(llm_text)
+        prompt = f"""
+        你是一位犀利的房地产观察家。请为以下 {len(batch)} 个 Agent 分别撰写一段【人物画像/投资风格辣评】（每人100字左右）。
+        (cash/net_worth/debt 单位: 万; trades=交易历史; decisions=关键决策数)
+        {json.dumps(profiles, ensure_ascii=False)}
 
-        cursor.execute("""
-            INSERT INTO agent_end_reports
-            (agent_id, simulation_run_id, identity_summary, finance_summary, transaction_summary, imp_decision_log, llm_portrait)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (agent_id, run_id, id_json, fin_json, tx_json, dec_json, llm_text))
+        **要求**:
+        1. 风格犀利、幽默或一针见血。
+        2. 评价其行为是否符合其身份和投资风格。
+        3. 如果是"韭菜"（高买低卖）请无情嘲讽；如果是"股神"（低买高卖）请给予赞赏；如果是"等等党"（一直不买）请评价其心态。
+        4. 必须用中文。
+        输出JSON: {{"portraits": [{{"id": 1, "portrait": "..."}}]}}
+        每个Agent一条，id 与输入一致。
+        """
 
-        self.conn.commit()
+        response = await safe_call_llm_async(prompt, {"portraits": []}, model_type="smart", priority="reporting")
+        items = response.get("portraits", []) if isinstance(response, dict) else response
+        by_id = {}
+        if isinstance(items, list):
+            for item in items:
+                if isinstance(item, dict) and item.get("portrait"):
+                    try:
+                        by_id[int(item.get("id"))] = str(item["portrait"])
+                    except (TypeError, ValueError):
+                        continue
+
+        portraits = []
+        for data in batch:
+            text = by_id.get(data['identity']['agent_id'])
+            portraits.append(text if text is not None else await self._generate_llm_portrait(data))
+        return portraits
@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class MarketState:
+    """
+    Authoritative in-memory copy of properties_market for the monthly loop.
+
+    Services call update() instead of issuing one UPDATE per row; changed
+    columns are tracked per property and written with executemany by flush(),
+    inside the caller's transaction (one commit per phase).
+    """
+    # Columns loaded from properties_market (plus property_id)
+    LOAD_COLUMNS = ("owner_id", "status", "listed_price", "min_price", "listing_month", "current_valuation")
+    # Fields mirrored onto market.properties dicts so in-memory lookups stay consistent
+    MIRRORED_FIELDS = ("owner_id", "status", "listed_price")
+
+    def __init__(self, db_conn: sqlite3.Connection):
+        self.conn = db_conn
+        self.rows: Dict[int, Dict] = {}
+        self.props_map: Dict[int, Dict] = {}
+        self.market = None
+        self._dirty: Dict[int, set] = {}
+
+    def load(self, properties: List[Dict], market=None):
+        """
+        Read properties_market once (start of run / resume) and index market.properties.
+        With `market`, mirrored changes go through Market.update_property so its zone
+        price sums stay current.
+        """
+        self.props_map = {p['property_id']: p for p in properties}
+        self.market = market
+        if market is not None:
+            market.rebuild_price_index()
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT property_id, {', '.join(self.LOAD_COLUMNS)} FROM properties_market")
+        self.rows = {row[0]: dict(zip(("property_id",) + self.LOAD_COLUMNS, row)) for row in cursor.fetchall()}
+        self._dirty = {}
+        logger.info(f"MarketState loaded: {len(self.rows)} properties, {len(self.active_listings())} active listings")
+
+    def get(self, property_id: int) -> Dict:
+        return self.rows.get(property_id)
+
+    def update(self, property_id: int, **fields):
+        row = self.rows.setdefault(property_id, {"property_id": property_id})
+        row.update(fields)
+        self._dirty.setdefault(property_id, set()).update(fields)
+
+        prop = self.props_map.get(property_id)
+        if prop is not None:
+            mirrored = {k: fields[k] for k in self.MIRRORED_FIELDS if k in fields}
+            if not mirrored:
+                return
+            if self.market is not None:
+                self.market.update_property(prop, **mirrored)
+            else:
+                prop.update(mirrored)
+
+    def active_listings(self) -> List[Dict]:
+        """Fresh listing dicts for all for_sale properties (same shape as the old per-month SELECT)."""
+        return [
+            {
+                "property_id": r["property_id"],
+                "seller_id": r.get("owner_id"),
+                "listed_price": r.get("listed_price"),
+                "min_price": r.get("min_price"),
+                "status": r["status"],
+                "created_month": r.get("listing_month"),
+            }
+            for r in self.rows.values() if r.get("status") == "for_sale"
+        ]
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def flush(self, cursor: sqlite3.Cursor = None) -> int:
+        """Write dirty rows (grouped by column set) with executemany. Caller commits."""
+        if not self._dirty:
+            return 0
+        cursor = cursor or self.conn.cursor()
+
+        by_columns: Dict[tuple, List[tuple]] = {}
+        for pid, cols in self._dirty.items():
+            cols = tuple(sorted(cols))
+            row = self.rows[pid]
+            by_columns.setdefault(cols, []).append(tuple(row.get(c) for c in cols) + (pid,))
+
+        for cols, params in by_columns.items():
+            set_clause = ", ".join(f"{c} = ?" for c in cols)
+            cursor.executemany(f"UPDATE properties_market SET {set_clause} WHERE property_id = ?", params)
+
+        count = len(self._dirty)
+        self._dirty = {}
+        return count
+
+
+class AgentState:
+    """
+    Write-behind buffer for per-agent rows touched in the monthly loop
+    (agents_finance snapshots and active_participants removals).
+    Agent objects stay authoritative; flush() serialises them once per phase.
+    """
+    FINANCE_COLUMNS = ("mortgage_monthly_payment", "cash", "total_assets", "total_debt", "net_cashflow")
+
+    def __init__(self, db_conn: sqlite3.Connection):
+        self.conn = db_conn
+        self._finance_dirty: Dict[int, object] = {}
+        self._participant_removals = set()
+
+    def mark_finance(self, agent):
+        self._finance_dirty[agent.id] = agent
+
+    def remove_participant(self, agent_id: int):
+        self._participant_removals.add(agent_id)
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._finance_dirty) + len(self._participant_removals)
+
+    def flush(self, cursor: sqlite3.Cursor = None) -> int:
+        """Write buffered agent changes with executemany. Caller commits."""
+        if not self._finance_dirty and not self._participant_removals:
+            return 0
+        cursor = cursor or self.conn.cursor()
+
+        if self._finance_dirty:
+            batch = []
+            for agent_id, agent in self._finance_dirty.items():
+                fin = agent.to_v2_finance_dict()
+                batch.append(tuple(fin[c] for c in self.FINANCE_COLUMNS) + (agent_id,))
+            set_clause = ", ".join(f"{c}=?" for c in self.FINANCE_COLUMNS)
+            cursor.executemany(f"UPDATE agents_finance SET {set_clause} WHERE agent_id=?", batch)
+
+        if self._participant_removals:
+            cursor.executemany("DELETE FROM active_participants WHERE agent_id = ?",
+                               [(aid,) for aid in self._participant_removals])
+
+        count = self.dirty_count
+        self._finance_dirty = {}
+        self._participant_removals = set()
+        return count
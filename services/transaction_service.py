@@ -8,24 +8,34 @@ from typing import Dict, List
 #     match_property_for_buyer, run_negotiation_session_async, execute_transaction,
 #     handle_failed_negotiation
 # )
-from agent_behavior import decide_price_adjustment
+from agent_behavior import decide_price_adjustments_async
 from models import Agent
+from services.state_store import AgentState, MarketState
+from utils.profiler import SimulationProfiler
 
 logger = logging.getLogger(__name__)
 
 class TransactionService:
-    def __init__(self, config, db_conn: sqlite3.Connection):
+    def __init__(self, config, db_conn: sqlite3.Connection,
+                 market_state: MarketState = None, agent_state: AgentState = None,
+                 profiler: SimulationProfiler = None):
         self.config = config
         self.conn = db_conn
+        # matching / negotiation / execution phases are timed here
+        self.profiler = profiler or SimulationProfiler(enabled=False)
+        self.last_month_transactions: List[Dict] = []
+        # In-memory state with write-behind; flushed once per phase
+        self.market_state = market_state or MarketState(db_conn)
+        self.agent_state = agent_state or AgentState(db_conn)
 
     async def process_listing_price_adjustments(self, month: int, market_trend: str):
-        """Tier 3: LLM Autonomous Price Adjustment."""
+        """Tier 3: LLM Autonomous Price Adjustment (one query, batched LLM decisions)."""
         cursor = self.conn.cursor()
 
-        # Select stale listings using V2 tables
+        # Select stale listings together with all seller context the decision needs
         cursor.execute("""
             SELECT pm.property_id, pm.owner_id, pm.listed_price, pm.listing_month,
-                   ast.name, ast.investment_style
+                   ast.name, ast.investment_style, ast.background_story
             FROM properties_market pm
             JOIN agents_static ast ON pm.owner_id = ast.agent_id
             WHERE pm.status='for_sale' AND pm.listing_month <= ?
@@ -36,29 +46,26 @@ class TransactionService:
         if not stale_listings:
             return
 
-        tasks = []
+        requests = []
         for row in stale_listings:
             pid, seller_id, current_price, created_m = row[0], row[1], row[2], row[3]
-            agent_name, investment_style = row[4], row[5]
-            listing_duration = month - created_m
-
-            task = decide_price_adjustment(
-                agent_id=seller_id,
-                agent_name=agent_name,
-                investment_style=investment_style,
-                property_id=pid,
-                current_price=current_price,
-                listing_duration=listing_duration,
-                market_trend=market_trend,
-                db_conn=self.conn
-            )
-            tasks.append((pid, task, seller_id))
-
-        results = await asyncio.gather(*[t[1] for t in tasks])
+            requests.append({
+                "agent_id": seller_id,
+                "agent_name": row[4],
+                "investment_style": row[5],
+                "background": row[6],
+                "property_id": pid,
+                "current_price": current_price,
+                "listing_duration": month - created_m,
+            })
+
+        batch_size = self.config.get('market.price_adjustment.batch_size', 10)
+        results = await decide_price_adjustments_async(requests, market_trend, batch_size=batch_size)
 
         batch_decision_logs = []
 
-        for (pid, _, seller_id), result_tuple in zip(tasks, results):
+        for request, result_tuple in zip(requests, results):
+            pid, seller_id = request["property_id"], request["agent_id"]
             # unpack result which is now (decision_dict, context_metrics)
             result = result_tuple[0]
             metrics = result_tuple[1]
@@ -76,19 +83,13 @@ class TransactionService:
                 logger.debug(f"Property {pid}: 维持原价 - {reason}")
             elif action in ["B", "C"]:
                 # Update price (V2)
-                cursor.execute("""
-                    UPDATE properties_market
-                    SET listed_price = ?, last_price_update_month = ?, last_price_update_reason = ?
-                    WHERE property_id = ?
-                """, (round(new_price, 2), month, reason, pid))
+                self.market_state.update(pid, listed_price=round(new_price, 2),
+                                         last_price_update_month=month, last_price_update_reason=reason)
                 logger.info(f"Property {pid}: 调价至 {new_price:,.0f} - {reason}")
             elif action == "D":
                 # Delist (V2)
-                cursor.execute("""
-                    UPDATE properties_market
-                    SET status='off_market', last_price_update_month = ?, last_price_update_reason = ?
-                    WHERE property_id = ?
-                """, (month, reason, pid))
+                self.market_state.update(pid, status='off_market',
+                                         last_price_update_month=month, last_price_update_reason=reason)
                 logger.info(f"Property {pid}: 撤牌观望 - {reason}")
 
             # Log decision with context_metrics
@@ -103,7 +104,8 @@ class TransactionService:
             cursor.executemany("""INSERT INTO decision_logs
                 (agent_id, month, event_type, decision, reason, thought_process, context_metrics, llm_called)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", batch_decision_logs)
-            self.conn.commit()
+        self.market_state.flush(cursor)
+        self.conn.commit()
 
     async def process_monthly_transactions(self, month: int, buyers: List[Agent],
                                          listings_by_zone: Dict, active_listings: List[Dict],
@@ -116,19 +118,24 @@ class TransactionService:
         cursor = self.conn.cursor()
         transactions_count = 0
         failed_negotiations = 0
+        self.last_month_transactions = []
 
         # --- 1. Matching Phase (批量匹配重构) ---
-        from transaction_engine import match_property_for_buyer
-
-        # Use simpler matching for now or re-import the bulk match function if available
-        # The previous version imported bulk_match_all_buyers but it wasn't in the provided transaction_engine.py content
-        # I only wrote basic functions to transaction_engine.py in Step 4565.
-        # So I should use the loop based matching from Step 4565 logic or implement bulk there.
-        # Step 4565 transaction_engine.py has match_property_for_buyer.
-        # Let's use simple loop matching since bulk_match isn't in my written file yet.
+        self.profiler.start_phase("matching")
+        from transaction_engine import (ListingIndex,
+                                        batched_match_properties_async)
+
+        # Index listings once per month, shortlist all buyers in one pass,
+        # then one structured LLM request per batch of buyers
+        listing_index = ListingIndex(active_listings, props_map)
+        batch_size = self.config.get('negotiation.matching.batch_size', 20)
+        logger.info(f"Matching {len(buyers)} buyers against {listing_index.size} listings (batch size {batch_size})...")
+        selections = await batched_match_properties_async(buyers, active_listings, props_map,
+                                                          batch_size=batch_size, listing_index=listing_index)
+
         buyer_matches = []
         for buyer in buyers:
-            match = match_property_for_buyer(buyer, active_listings, props_map)
+            match = selections.get(buyer.id)
             if match:
                 buyer_matches.append({'buyer': buyer, 'listing': match})
 
@@ -165,6 +172,7 @@ class TransactionService:
             interest_registry[pid].append(m['buyer'])
 
         # --- 2. Negotiation Phase ---
+        self.profiler.start_phase("negotiation")
         if interest_registry:
             logger.info(f"Starting {len(interest_registry)} Negotiation Sessions (Parallel)...")
 
@@ -172,8 +180,8 @@ class TransactionService:
             session_metadata = []
 
             # Local imports to avoid circular dependency
-            from transaction_engine import (decide_negotiation_format,
-                                            execute_transaction,
+            from agent_behavior import plan_negotiation_formats_async
+            from transaction_engine import (execute_transaction,
                                             handle_failed_negotiation,
                                             run_negotiation_session_async)
 
@@ -184,13 +192,6 @@ class TransactionService:
                  seller_agent = agent_map.get(listing['seller_id'])
                  if not seller_agent: continue
 
-                 # Determine Negotiation Mode
-                 market_hint = "买家众多" if len(interested_buyers) > 1 else "单一买家"
-
-                 mode = decide_negotiation_format(seller_agent, interested_buyers, market_hint)
-
-                 # ✅ Phase 3.3: Pass db_conn to enable bid recording
-                 tasks.append(run_negotiation_session_async(seller_agent, interested_buyers, listing, market, month, self.config, self.conn))
                  session_metadata.append({
                      "pid": pid,
                      "seller": seller_agent,
@@ -198,14 +199,26 @@ class TransactionService:
                      "listing": listing
                  })
 
+            # Determine Negotiation Mode for all sessions up front (rule fast path + batched LLM)
+            modes = await plan_negotiation_formats_async(
+                [(m["seller"], m["buyers"], "买家众多" if len(m["buyers"]) > 1 else "单一买家") for m in session_metadata],
+                self.config)
+
+            for meta, mode in zip(session_metadata, modes):
+                 tasks.append(run_negotiation_session_async(meta["seller"], meta["buyers"], meta["listing"], market,
+                                                            month, self.config, mode=mode))
+
             if tasks:
                 session_results = await asyncio.gather(*tasks)
             else:
                 session_results = []
 
             # Process Results
+            self.profiler.start_phase("execution")
             batch_transactions = []
             batch_negotiations = []
+            # ✅ Phase 3.3: Batch-bidding bids, in session order then buyer order
+            bid_records = [row for result in session_results for row in result.get('bid_records', [])]
 
             for i, session_result in enumerate(session_results):
                 meta = session_metadata[i]
@@ -237,6 +250,7 @@ class TransactionService:
 
                      if tx_record:
                          transactions_count += 1
+                         self.last_month_transactions.append(tx_record)
                          batch_transactions.append((
                              month,
                              winner.id,
@@ -251,20 +265,18 @@ class TransactionService:
                          batch_negotiations.append((winner.id, seller_agent.id, pid, len(history), final_price, True, "Deal Concluded", json.dumps(history)))
 
                          # Update Listing / Properties (V2)
-                         # execute_transaction updates objects, but we need to update DB status
-                         cursor.execute("UPDATE properties_market SET status='off_market', owner_id=?, last_transaction_month=?, current_valuation=? WHERE property_id=?",
-                                      (winner.id, month, final_price, pid))
+                         # execute_transaction updates objects; the state store persists them at phase end
+                         self.market_state.update(pid, status='off_market', owner_id=winner.id,
+                                                  last_transaction_month=month, current_valuation=final_price)
 
-                         # Update Buyer Financials (Persist Mortgage & Cash)
-                         # Use helper to ensure all fields (especially net_cashflow) are consistent
-                         w_fin = winner.to_v2_finance_dict()
-                         cursor.execute("UPDATE agents_finance SET mortgage_monthly_payment=?, cash=?, total_assets=?, total_debt=?, net_cashflow=? WHERE agent_id=?",
-                                      (w_fin['mortgage_monthly_payment'], w_fin['cash'], w_fin['total_assets'], w_fin['total_debt'], w_fin['net_cashflow'], winner.id))
+                         # Persist Buyer & Seller Financials (Mortgage & Cash)
+                         self.agent_state.mark_finance(winner)
+                         self.agent_state.mark_finance(seller_agent)
 
                          # Reset winner role
                          winner.role = "OBSERVER"
                          # Clean up active_participants
-                         cursor.execute("DELETE FROM active_participants WHERE agent_id = ?", (winner.id,))
+                         self.agent_state.remove_participant(winner.id)
 
                 else:
                      failed_negotiations += 1
@@ -282,8 +294,8 @@ class TransactionService:
                      try:
                          adjusted = handle_failed_negotiation(seller_agent, listing, market, potential_buyers_count=potential_buyers_est)
                          if adjusted:
-                             cursor.execute("UPDATE properties_market SET listed_price=?, min_price=? WHERE property_id=?",
-                                           (listing['listed_price'], listing['min_price'], pid))
+                             self.market_state.update(pid, listed_price=listing['listed_price'],
+                                                     min_price=listing['min_price'])
                      except Exception as e:
                          logger.warning(f"Failed to adjust price after failure: {e}")
 
@@ -294,11 +306,23 @@ class TransactionService:
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """, batch_transactions)
 
+            if bid_records:
+                cursor.executemany("""
+                    INSERT INTO property_buyer_matches
+                    (month, property_id, buyer_id, listing_price, buyer_bid, is_valid_bid, proceeded_to_negotiation)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, bid_records)
+
             if batch_negotiations:
                 # Need to handle table columns match.
                 # negotiations table might strictly be (buyer_id, seller_id, property_id, round_count, final_price, success, reason, log)
                 cursor.executemany("INSERT INTO negotiations (buyer_id, seller_id, property_id, round_count, final_price, success, reason, log) VALUES (?,?,?,?,?,?,?,?)", batch_negotiations)
 
+            # One write-behind flush for all deals of the month
+            market_rows = self.market_state.flush(cursor)
+            agent_rows = self.agent_state.flush(cursor)
             self.conn.commit()
+            logger.info(f"Persisted {market_rows} property rows and {agent_rows} agent rows")
 
+        self.profiler.end_phase()
         return transactions_count, failed_negotiations
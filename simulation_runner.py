@@ -1,21 +1,31 @@
 import asyncio
 import logging
 import os
-import sqlite3
 import sys
 from typing import List
 
 from config.config_loader import SimulationConfig
 from config.settings import MACRO_ENVIRONMENT, get_current_macro_sentiment
-from database import init_db
+from database import get_connection, init_db, optimize_db
 from services.agent_service import AgentService
 from services.intervention_service import InterventionService
 from services.market_service import MarketService
 from services.rental_service import RentalService
 from services.reporting_service import ReportingService
+from services.state_store import AgentState, MarketState
 from services.transaction_service import TransactionService
 from utils.behavior_logger import BehaviorLogger
+from utils.db_pool import DatabasePool
 from utils.exchange_display import ExchangeDisplay
+from utils.llm_client import (
+    close_async_clients,
+    configure_cache,
+    configure_scheduler,
+    get_cache,
+    format_cache_stats,
+    format_scheduler_stats,
+)
+from utils.profiler import SimulationProfiler
 from utils.workflow_logger import WorkflowLogger
 
 # Configure Logging
@@ -44,27 +54,58 @@ class SimulationRunner:
         self.resume = resume
         self.config = config if config else SimulationConfig()
         self.db_path = db_path
+        self.run_id = None
+
+        # Global LLM scheduler limits (system.llm.scheduler)
+        configure_scheduler(self.config.get('system.llm.scheduler', {}))
 
         # Initialize Database connection
         if not self.db_path:
              # Fallback if not provided (though main script usually provides it)
              self.db_path = 'simulation.db'
 
+        # Persistent LLM response cache next to the run DB (system.llm.cache). A bare DB filename
+        # (scratch/test runs in the CWD) gets no default cache file; cache.path can still set one.
+        cache_cfg = dict(self.config.get('system.llm.cache', {}) or {})
+        cache_cfg.setdefault('enabled', self.config.get('system.llm.enable_caching', True))
+        run_dir = os.path.dirname(self.db_path)
+        configure_cache(os.path.join(run_dir, 'llm_cache.db') if run_dir else None, cache_cfg)
+
+        # SQLite performance profile (system.database)
+        self.db_config = self.config.get('system.database', {}) or {}
+
         # Initialize DB Schema if needed
         if not self.resume:
-             init_db(self.db_path)
-
-        self.conn = sqlite3.connect(self.db_path, timeout=60.0)
-        self.conn.row_factory = sqlite3.Row
-        self.conn.execute("PRAGMA busy_timeout = 30000")
+             init_db(self.db_path, self.db_config)
+
+        self.conn = get_connection(self.db_path, self.db_config)
+
+        # Per-phase timing / LLM / SQL statement profile (system.profiling)
+        profiling_cfg = self.config.get('system.profiling', {}) or {}
+        self.profiler = SimulationProfiler(enabled=profiling_cfg.get('enabled', True),
+                                           cprofile_month=profiling_cfg.get('cprofile_month'),
+                                           output_dir=os.path.dirname(self.db_path) or "results")
+        self.profiler.attach(self.conn)
+        # Pooled readers + single queued writer for work that runs concurrently (agent reports);
+        # the profiler counts their statements too
+        self.db_pool = DatabasePool(self.db_path, self.db_config,
+                                    read_pool_size=self.db_config.get('read_pool_size', 4),
+                                    on_connect=self.profiler.attach)
+
+        # In-memory market/agent state shared by the monthly phases (write-behind to DB)
+        self.market_state = MarketState(self.conn)
+        self.agent_state = AgentState(self.conn)
 
         # Initialize Services
         self.market_service = MarketService(self.config, self.conn)
-        self.agent_service = AgentService(self.config, self.conn)
-        self.transaction_service = TransactionService(self.config, self.conn)
+        self.agent_service = AgentService(self.config, self.conn, market_state=self.market_state)
+        self.transaction_service = TransactionService(self.config, self.conn,
+                                                      market_state=self.market_state,
+                                                      agent_state=self.agent_state,
+                                                      profiler=self.profiler)
         self.intervention_service = InterventionService(self.conn)
         self.rental_service = RentalService(self.config, self.conn)
-        self.reporting_service = ReportingService(self.config, self.conn)
+        self.reporting_service = ReportingService(self.config, self.conn, db_pool=self.db_pool)
 
         # Pending Interventions (Tier 5)
         self.pending_interventions = []
@@ -74,6 +115,10 @@ class SimulationRunner:
         self.pending_interventions = news_items
 
     def initialize(self):
+        """Initialize Simulation State (sync entry point)"""
+        asyncio.run(self.initialize_async())
+
+    async def initialize_async(self):
         """Initialize Simulation State"""
 
         if self.resume:
@@ -89,7 +134,7 @@ class SimulationRunner:
             properties = self.market_service.initialize_market()
 
             # 2. Initialize Agents (and allocate properties)
-            self.agent_service.initialize_agents(self.agent_count, properties)
+            await self.agent_service.initialize_agents_async(self.agent_count, properties)
 
             # Show Summary
             wf_logger = WorkflowLogger(self.config)
@@ -104,10 +149,10 @@ class SimulationRunner:
         from database import migrate_db_v2_7
 
         # Ensure Schema is up to date (V2.7)
-        migrate_db_v2_7(self.db_path)
+        migrate_db_v2_7(self.db_path, self.db_config)
 
         self.agent_service.load_agents_from_db()
-        self.market_service.load_market_from_db(self.agent_service.agents)
+        self.market_service.load_market_from_db(self.agent_service.agents, self.agent_service.agent_map)
 
     def get_last_simulation_month(self) -> int:
         """Get the last simulated month from DB."""
@@ -124,8 +169,20 @@ class SimulationRunner:
             return 0
 
     def run(self):
-        """Main Simulation Loop (Coordinator)"""
+        """Main Simulation Loop (sync entry point, drives run_async on one event loop)"""
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Main Simulation Loop (Coordinator).
+        All async phases of all months share this event loop, so the pooled
+        AsyncOpenAI connections stay warm for the whole run.
+        """
         start_month = 0
+        profiler = self.profiler
+        # Month 0 = run-level phases (initialization, final reporting)
+        profiler.start_month(0)
+        profiler.start_phase("initialization")
 
         if self.resume:
              logger.info("Resuming simulation...")
@@ -133,13 +190,28 @@ class SimulationRunner:
              start_month = self.get_last_simulation_month()
              logger.info(f"Resuming from Month {start_month}")
         else:
-             self.initialize()
+             await self.initialize_async()
+
+        # Listings / props_map live in memory from here on
+        self.market_state.load(self.market_service.market.properties, self.market_service.market)
+        profiler.end_month()
 
         # Initialize Loggers
         log_dir = os.path.dirname(self.db_path)
         if not log_dir:
             log_dir = "results"
-        behavior_logger = BehaviorLogger(results_dir=log_dir)
+        log_cfg = self.config.get('system.behavior_log', {}) or {}
+        behavior_logger = BehaviorLogger(results_dir=log_dir, db_conn=self.conn,
+                                         flush_rows=log_cfg.get('flush_rows', 1000),
+                                         flush_interval=log_cfg.get('flush_interval', 2.0),
+                                         parquet=log_cfg.get('parquet', False))
+        if self.resume:
+            behavior_logger.rebuild_history(start_month)
+        # A bare DB filename has no run directory: keep perf_summary.json / cProfile dumps with this run's logs
+        if not os.path.dirname(self.db_path):
+            profiler.output_dir = behavior_logger.output_dir
+        # End reports are keyed per run, so a resumed simulation reports its own months afresh
+        self.run_id = f"{behavior_logger.session_id}_m{start_month + 1}-{start_month + self.months}"
         exchange_display = ExchangeDisplay(use_rich=True)
         wf_logger = WorkflowLogger(self.config)
 
@@ -150,6 +222,7 @@ class SimulationRunner:
             for month in range(start_month + 1, start_month + self.months + 1):
 
                 logger.info(f"--- Month {month} ---")
+                profiler.start_month(month)
 
                 # 1. Macro Environment
                 macro_key = get_current_macro_sentiment(month)
@@ -158,7 +231,8 @@ class SimulationRunner:
 
                 # 2. Market Bulletin (Service)
                 # Pass pending interventions
-                bulletin = asyncio.run(self.market_service.generate_market_bulletin(month, self.pending_interventions))
+                profiler.start_phase("bulletin")
+                bulletin = await self.market_service.generate_market_bulletin(month, self.pending_interventions)
                 logger.info(bulletin)
 
                 # Clear interventions after broadcasting (unless they are persistent? No, news is valid for one month usually)
@@ -168,12 +242,15 @@ class SimulationRunner:
                 market_trend = self.market_service.get_market_trend(month)
 
                 # 3. Agent Updates (Financials)
+                profiler.start_phase("financials")
                 self.agent_service.update_financials()
 
                 # 3.5 Rental Market (Phase 7.2)
+                profiler.start_phase("rental")
                 self.rental_service.process_rental_market(month)
 
                 # 4. Agent Lifecycle: Manage Active Participants (Timeouts/Exits)
+                profiler.start_phase("lifecycle")
                 batch_decision_logs = []
                 active_buyers = self.agent_service.update_active_participants(month, self.market_service.market, batch_decision_logs)
 
@@ -184,21 +261,22 @@ class SimulationRunner:
                 # Let's check TransactionService.process_listing_price_adjustments
                 # It likely needs to be updated to capture context_metrics too.
                 # For now just run it.
-                asyncio.run(self.transaction_service.process_listing_price_adjustments(month, market_trend))
+                profiler.start_phase("price_adjustment")
+                await self.transaction_service.process_listing_price_adjustments(month, market_trend)
 
                 # 6. Life Events (Stochastic)
-                self.agent_service.process_life_events(month, batch_decision_logs)
+                profiler.start_phase("life_events")
+                await self.agent_service.process_life_events(month, batch_decision_logs)
 
                 # 6.5 Market Memory (Phase 7.2)
                 recent_bulletins = self.market_service.get_recent_bulletins(month, n=3)
 
                 # 7. Agent Activation (New Participants)
-                new_buyers, decisions = asyncio.run(
-                    self.agent_service.activate_new_agents(
-                        month, self.market_service.market, macro_desc,
-                        batch_decision_logs, market_trend, bulletin,
-                        recent_bulletins=recent_bulletins # 棣冨晭 Pass History
-                    )
+                profiler.start_phase("activation")
+                new_buyers, decisions = await self.agent_service.activate_new_agents(
+                    month, self.market_service.market, macro_desc,
+                    batch_decision_logs, market_trend, bulletin,
+                    recent_bulletins=recent_bulletins # 棣冨晭 Pass History
                 )
 
                 # Merge lists for display/processing
@@ -214,6 +292,7 @@ class SimulationRunner:
                     self.conn.commit()
 
                 # Logging
+                profiler.end_phase()
                 wf_logger.show_activation_summary(decisions)
 
                 # 8. Transaction Processing (Service)
@@ -224,18 +303,9 @@ class SimulationRunner:
                 # The method signature I designed: process_monthly_transactions(locals...)
                 # Let's construct arguments.
 
-                # Fetch Active Listings (from DB to ensure latest prices)
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    SELECT property_id, owner_id as seller_id, listed_price, min_price, status, listing_month as created_month
-                    FROM properties_market
-                    WHERE status='for_sale'
-                """)
-                cols = [description[0] for description in cursor.description]
-                active_listings = [dict(zip(cols, row)) for row in cursor.fetchall()]
-
-                # Build maps
-                props_map = {p['property_id']: p for p in self.market_service.market.properties}
+                # Active Listings from the in-memory market state (already includes price adjustments)
+                active_listings = self.market_state.active_listings()
+                props_map = self.market_state.props_map
 
                 # Cluster by Zone
                 listings_by_zone = {}
@@ -252,19 +322,41 @@ class SimulationRunner:
                 exchange_display.show_buyers(all_buyers)
 
                 # Execute Transactions
-                tx_count, fail_count = asyncio.run(self.transaction_service.process_monthly_transactions(
+                tx_count, fail_count = await self.transaction_service.process_monthly_transactions(
                     month, all_buyers, listings_by_zone, active_listings,
                     props_map, self.agent_service.agent_map,
                     self.market_service.market,
                     wf_logger, exchange_display
-                ))
+                )
 
 
                 logger.info(f"Month {month} Complete. Transactions: {tx_count}, Failed Negs: {fail_count}")
+                self.market_service.market.snapshot_month(month)
+                logger.info(f"LLM Scheduler: {format_scheduler_stats()}")
+                logger.info(f"LLM Cache: {format_cache_stats()}")
+
+                behavior_logger.flush()
+                behavior_logger.flush_history()
+                self.conn.commit()
+
+                # Refresh planner statistics (full ANALYZE once tables are populated after the first month)
+                if self.db_config.get('optimize_between_months', True):
+                    profiler.start_phase("db_maintenance")
+                    optimize_db(self.conn, analyze=(month == start_month + 1))
+
+                month_elapsed = profiler.end_month()
+                wf_logger.show_monthly_summary(month, self.transaction_service.last_month_transactions, month_elapsed)
+                logger.info(profiler.format_month(month))
+                profiler.persist(self.conn, month)
 
             # --- Phase 10: End-of-Run Reporting ---
             logger.info("Generating Final Agent Reports (Automated Portrait)...")
-            asyncio.run(self.reporting_service.generate_all_agent_reports(self.months))
+            profiler.start_month(0)
+            profiler.start_phase("reporting")
+            await self.reporting_service.generate_all_agent_reports(self.months, run_id=self.run_id)
+            profiler.end_month()
+            profiler.persist(self.conn, 0)
+            profiler.write_summary()
 
         except KeyboardInterrupt:
             logger.info("Simulation Stopped by User.")
@@ -272,10 +364,16 @@ class SimulationRunner:
             logger.error(f"Simulation Error: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            behavior_logger.close()
+            await close_async_clients()
 
     def close(self):
+        if self.db_pool:
+            self.db_pool.close()
         if self.conn:
             self.conn.close()
+        get_cache().close()
 
 if __name__ == "__main__":
     # Allow running directly for testing
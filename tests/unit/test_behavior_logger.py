@@ -0,0 +1,133 @@
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from utils.behavior_logger import BehaviorLogger
+from utils.buffered_writer import PYARROW_AVAILABLE, BufferedRowWriter
+
+
+class TestBehaviorLoggerHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(path)
+        self.conn = sqlite3.connect(path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _log_run(self, logger):
+        agent = SimpleNamespace(id=1, name="A1")
+        other = SimpleNamespace(id=2, name="A2")
+        for month in range(1, 6):
+            logger.log_decision(month, agent, {"role": "BUYER", "action_description": f"看房{month}", "urgency": 0.8})
+            logger.log_decision(month, other, {"role": "OBSERVER"})
+        thought = "这个价格还可以再谈谈，先看看对方的底线到底在哪里，再决定要不要继续加价"
+        history = [{"round": r, "party": party, "action": "OFFER", "price": 1e6, "thought": thought}
+                   for r in range(1, 4) for party in ("buyer", "seller")]
+        logger.log_negotiation(5, 1, 2, 10, history, "success", 1e6)
+
+    def test_history_served_from_ring_buffer(self):
+        logger = BehaviorLogger(results_dir=self.tmpdir.name, history_months=3)
+        self._log_run(logger)
+
+        with patch("builtins.open", side_effect=AssertionError("history lookup touched disk")):
+            text = logger.get_agent_history(1, max_months=2)
+        lines = text.split("\n")
+        self.assertEqual(lines[:2], ["- [月度决策] 第4月: [BUYER] 看房4 (紧迫度:0.8)",
+                                     "- [月度决策] 第5月: [BUYER] 看房5 (紧迫度:0.8)"])
+        # Three buyer rounds for agent 1, thoughts truncated to 30 chars
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[2].startswith("- [谈判记录] 第5月: OFFER (想法: "))
+        self.assertTrue(lines[2].endswith("...)"))
+        # Buffer is bounded by history_months
+        self.assertEqual(logger.get_agent_history(1, max_months=10).count("[月度决策]"), 3)
+        self.assertEqual(logger.get_agent_history(99), "")
+        logger.close()
+
+    def test_rebuild_from_index_on_resume(self):
+        logger = BehaviorLogger(results_dir=self.tmpdir.name, history_months=3, db_conn=self.conn)
+        self._log_run(logger)
+        self.assertEqual(logger.flush_history(), 16)
+        self.conn.commit()
+
+        resumed = BehaviorLogger(results_dir=os.path.join(self.tmpdir.name, "resumed"), history_months=3,
+                                 db_conn=self.conn)
+        resumed.rebuild_history(5)
+        for agent_id in (1, 2):
+            self.assertEqual(resumed.get_agent_history(agent_id), logger.get_agent_history(agent_id))
+        logger.close()
+        resumed.close()
+
+    def test_buffered_csv_flushed_on_month_boundary_and_close(self):
+        logger = BehaviorLogger(results_dir=self.tmpdir.name, flush_rows=1000, flush_interval=60)
+        self._log_run(logger)
+
+        def read(path):
+            with open(path, encoding='utf-8-sig') as f:
+                return list(csv.reader(f))
+
+        # Below flush_rows and before the interval: only the header is on disk
+        self.assertEqual(len(read(logger.decisions_file)), 1)
+        logger.flush()
+        decisions = read(logger.decisions_file)
+        self.assertEqual(len(decisions), 11)
+        self.assertEqual(decisions[1][:4], ["1", "1", "A1", "BUYER"])
+
+        logger.log_decision(6, SimpleNamespace(id=3, name="A3"), {"role": "SELLER"})
+        logger.close()
+        self.assertEqual(read(logger.decisions_file)[-1][:4], ["6", "3", "A3", "SELLER"])
+        negotiations = read(logger.negotiations_file)
+        self.assertEqual(len(negotiations), 8)
+        self.assertEqual(negotiations[-1][2], "结果")
+
+
+class TestBufferedRowWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "rows.csv")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_background_flush_by_size(self):
+        writer = BufferedRowWriter(self.path, ["a", "b"], flush_rows=10, flush_interval=60)
+        writer.write_many([i, i * 2] for i in range(25))
+        deadline = time.time() + 5
+        while writer.pending and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(writer.pending, 0)
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.write([1, 2])
+        with open(self.path, encoding='utf-8-sig') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["a", "b"])
+        self.assertEqual(rows[1:], [[str(i), str(i * 2)] for i in range(25)])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, "pyarrow not installed")
+    def test_parquet_sink(self):
+        import pyarrow.parquet as pq
+        writer = BufferedRowWriter(self.path, ["a", "b"], parquet=True)
+        writer.write_many([[1, "x"], [2, None]])
+        writer.flush()
+        writer.write([3, "z"])
+        writer.close()
+        table = pq.read_table(writer.parquet_path)
+        self.assertEqual(table.column("a").to_pylist(), ["1", "2", "3"])
+        self.assertEqual(table.column("b").to_pylist(), ["x", None, "z"])
+
+
+if __name__ == '__main__':
+    unittest.main()
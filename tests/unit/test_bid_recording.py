@@ -0,0 +1,89 @@
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from config.config_loader import SimulationConfig
+from database import init_db
+from models import Agent, Market
+from transaction_engine import run_negotiation_session_async
+
+BID_SQL = """
+    INSERT INTO property_buyer_matches
+    (month, property_id, buyer_id, listing_price, buyer_bid, is_valid_bid, proceeded_to_negotiation)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class TestBidRecording(unittest.TestCase):
+    def setUp(self):
+        self.config = SimulationConfig(os.path.join(os.path.dirname(__file__), '../../config/baseline.yaml'))
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(self.path)
+        self.market = Market([])
+        # buyer_id -> bid (0 = pass, 5e8 = unaffordable)
+        self.bids = {2: 2.9e6, 3: 0, 4: 3.1e6, 5: 5e8, 6: 2.5e6, 7: 3.3e6}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    async def fake_llm(self, prompt, default, **kwargs):
+        buyer_id = int(re.search(r"你是买家 (\d+)", prompt).group(1))
+        # Replies arrive in random order
+        await asyncio.sleep(random.random() * 0.02)
+        return {"bid_price": self.bids[buyer_id], "reason": "test"}
+
+    def expected_rows(self, month, listing, buyers):
+        # Row layout of the former per-bid INSERT
+        rows = []
+        for buyer in buyers:
+            bid = self.bids[buyer.id]
+            valid = bid < 1e8
+            rows.append((month, listing['property_id'], buyer.id, listing['listed_price'], bid,
+                         1 if valid else 0, 1 if valid and bid > 0 else 0))
+        return rows
+
+    def test_bulk_rows_match_per_bid_inserts_in_order(self):
+        sessions = []
+        for pid, buyer_ids in ((10, [4, 2, 3]), (20, [7, 5, 6])):
+            listing = {"property_id": pid, "seller_id": 1, "zone": "A", "listed_price": 3e6, "min_price": 2.8e6}
+            buyers = [Agent(id=i, cash=5e6, monthly_income=5e4) for i in buyer_ids]
+            sessions.append((listing, buyers))
+
+        async def run_month():
+            return await asyncio.gather(*[run_negotiation_session_async(
+                Agent(id=1), buyers, listing, self.market, 3, self.config, mode="BATCH")
+                for listing, buyers in sessions])
+
+        random.seed(11)
+        with patch('transaction_engine.safe_call_llm_async', side_effect=self.fake_llm):
+            results = asyncio.run(run_month())
+
+        # Flattened the way TransactionService does, one executemany for the month
+        bid_records = [row for result in results for row in result.get('bid_records', [])]
+        conn = sqlite3.connect(self.path)
+        conn.executemany(BID_SQL, bid_records)
+        conn.commit()
+        recorded = conn.execute("""
+            SELECT month, property_id, buyer_id, listing_price, buyer_bid, is_valid_bid, proceeded_to_negotiation
+            FROM property_buyer_matches ORDER BY rowid
+        """).fetchall()
+        conn.close()
+
+        expected = [row for listing, buyers in sessions for row in self.expected_rows(3, listing, buyers)]
+        self.assertEqual(recorded, expected)
+        self.assertEqual([r['outcome'] for r in results], ["success", "success"])
+        self.assertEqual([r['buyer_id'] for r in results], [4, 7])
+
+
+if __name__ == '__main__':
+    unittest.main()
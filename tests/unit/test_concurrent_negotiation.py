@@ -0,0 +1,68 @@
+import asyncio
+import os
+import re
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from config.config_loader import SimulationConfig
+from models import Agent, Market
+from transaction_engine import run_negotiation_session_async
+
+
+def make_buyer(agent_id, max_price=5e6):
+    buyer = Agent(id=agent_id, cash=5e6, monthly_income=5e4)
+    buyer.preference.max_price = max_price
+    return buyer
+
+
+class TestConcurrentClassic(unittest.TestCase):
+    def setUp(self):
+        self.config = SimulationConfig(os.path.join(os.path.dirname(__file__), '../../config/baseline.yaml'))
+        self.config._config['negotiation'].update(
+            rounds_range=[3, 3], concurrent_classic={"enabled": True, "max_parallel_buyers": 8})
+        self.seller = Agent(id=1)
+        self.listing = {"property_id": 10, "seller_id": 1, "zone": "A", "listed_price": 3e6, "min_price": 2.5e6}
+        self.market = Market([{"property_id": 10, "zone": "A", "status": "for_sale", "base_value": 3e6}])
+        self.prompts = []
+
+    async def fake_llm(self, prompt, default, system_prompt="", **kwargs):
+        self.prompts.append(prompt)
+        buyer = re.search(r"你是买方Agent (\d+)", prompt)
+        if buyer:
+            if buyer.group(1) == "3":
+                return {"action": "ACCEPT", "reason": "fine"}
+            await asyncio.sleep(0.01)
+            return {"action": "OFFER", "offer_price": 2.8e6, "reason": "try"}
+        await asyncio.sleep(0.01)
+        return {"action": "COUNTER", "counter_price": 2.95e6, "reason": "hold"}
+
+    def test_first_deal_wins_and_cancels_others(self):
+        buyers = [make_buyer(2), make_buyer(3), make_buyer(4)]
+        with patch('transaction_engine.safe_call_llm_async', side_effect=self.fake_llm):
+            result = asyncio.run(run_negotiation_session_async(
+                self.seller, buyers, self.listing, self.market, 1, self.config, mode="CLASSIC"))
+
+        self.assertEqual(result["outcome"], "success")
+        self.assertEqual(result["buyer_id"], 3)
+        self.assertEqual(result["final_price"], 3e6)
+        self.assertEqual(result["mode"], "classic")
+        self.assertIsInstance(result["history"], list)
+        # Buyers 2 and 4 were cancelled before finishing their rounds
+        self.assertLess(len(self.prompts), 3 * 2 * 2 + 1)
+
+    def test_seller_sees_competing_offers(self):
+        buyers = [make_buyer(2), make_buyer(4)]
+        with patch('transaction_engine.safe_call_llm_async', side_effect=self.fake_llm):
+            result = asyncio.run(run_negotiation_session_async(
+                self.seller, buyers, self.listing, self.market, 1, self.config, mode="CLASSIC"))
+
+        self.assertEqual(result["outcome"], "failed")
+        self.assertTrue(any("其他买家最高出价: 2,800,000" in p for p in self.prompts if "你是卖方Agent" in p))
+
+
+if __name__ == '__main__':
+    unittest.main()
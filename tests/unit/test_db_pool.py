@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from utils.db_pool import DatabasePool
+
+
+class TestDatabasePool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(self.path)
+        self.pool = DatabasePool(self.path, read_pool_size=3)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_concurrent_writes_from_threads_and_coroutines(self):
+        sql = "INSERT INTO property_buyer_matches (month, property_id, buyer_id) VALUES (?, ?, ?)"
+
+        def worker(t):
+            for i in range(50):
+                self.pool.execute(sql, (1, t, i))
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(4)]
+        for th in threads:
+            th.start()
+
+        async def writers():
+            await asyncio.gather(*[self.pool.executemany_async(sql, [(2, 100 + c, i) for i in range(25)])
+                                   for c in range(8)])
+            sql_count = "SELECT COUNT(*) FROM property_buyer_matches WHERE month=2"
+            rows = await asyncio.gather(*[self.pool.read_async(sql_count) for _ in range(6)])
+            return [r[0][0] for r in rows]
+
+        counts = asyncio.run(writers())
+        for th in threads:
+            th.join()
+        self.pool.flush()
+
+        self.assertEqual(counts, [200] * 6)
+        self.assertEqual(self.pool.read("SELECT COUNT(*) FROM property_buyer_matches")[0][0], 400)
+
+    def test_failed_write_rolls_back_and_readers_are_read_only(self):
+        def bad_job(conn):
+            conn.execute("INSERT INTO property_buyer_matches (month, property_id, buyer_id) VALUES (1, 1, 1)")
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.pool.submit_write(bad_job).result()
+        self.assertEqual(self.pool.read("SELECT COUNT(*) FROM property_buyer_matches")[0][0], 0)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.pool.read("DELETE FROM property_buyer_matches")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from services.export_service import MANIFEST_FILE, PYARROW_AVAILABLE, export_run_tables
+
+
+@unittest.skipUnless(PYARROW_AVAILABLE, "pyarrow not installed")
+class TestParquetExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany("INSERT INTO transactions (month, buyer_id, seller_id, property_id, final_price) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [(1, 1, 2, 10, 3e6), (2, 3, 4, 11, 2e6), (1, 5, 6, 12, 'n/a'), (None, 7, 8, 13, 1e6),
+                          (2, 9, 1, 14, 4e6)])
+        conn.executemany("INSERT INTO negotiations (buyer_id, seller_id, property_id, success, log) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [(1, 2, 10, 1, '[]'), (3, 4, 11, 0, None)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_partitioned_export_and_manifest(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        out_dir = os.path.join(self.tmpdir.name, "parquet")
+        export_run_tables(self.db_path, out_dir, chunk_rows=2)
+        with open(os.path.join(out_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        tx = manifest["tables"]["transactions"]
+        self.assertEqual(tx["rows"], 5)
+        self.assertEqual(tx["partition_by"], "month")
+        self.assertEqual(tx["schema"]["final_price"], "double")
+        self.assertEqual(tx["coerced_values"], 1)
+        self.assertEqual({f["path"]: f["rows"] for f in tx["files"]}, {
+            os.path.join("transactions", "month=1", "part-0.parquet"): 2,
+            os.path.join("transactions", "month=2", "part-0.parquet"): 2,
+            os.path.join("transactions", "month=__HIVE_DEFAULT_PARTITION__", "part-0.parquet"): 1,
+        })
+        self.assertEqual(manifest["tables"]["agents_static"]["rows"], 0)
+        self.assertEqual(manifest["tables"]["agents_static"]["files"], [])
+
+        partitioning = ds.partitioning(pa.schema([("month", pa.int64())]), flavor="hive")
+        table = ds.dataset(os.path.join(out_dir, "transactions"), format="parquet",
+                           partitioning=partitioning).to_table().sort_by("property_id")
+        self.assertEqual(table.column("month").to_pylist(), [1, 2, 1, None, 2])
+        self.assertEqual(table.column("final_price").to_pylist(), [3e6, 2e6, None, 1e6, 4e6])
+
+        negotiations = pq.read_table(os.path.join(out_dir, "negotiations", "part-0.parquet"))
+        self.assertEqual(negotiations.schema.field("success").type, pa.bool_())
+        self.assertEqual(negotiations.column("success").to_pylist(), [True, False])
+        self.assertEqual(negotiations.column("log").to_pylist(), ['[]', None])
+
+    def test_reexport_replaces_previous_output(self):
+        import pyarrow.parquet as pq
+
+        out_dir = os.path.join(self.tmpdir.name, "parquet")
+        export_run_tables(self.db_path, out_dir, tables=["transactions"])
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DELETE FROM transactions WHERE month = 2")
+        # A fractional id is not truncated into an INTEGER column
+        conn.execute("UPDATE transactions SET buyer_id = 2.5 WHERE property_id = 10")
+        conn.commit()
+        conn.close()
+
+        manifest = export_run_tables(self.db_path, out_dir, tables=["transactions"])
+        tx = manifest["tables"]["transactions"]
+        self.assertEqual(tx["rows"], 3)
+        self.assertEqual(tx["coerced_values"], 2)
+        self.assertEqual(sorted(os.listdir(os.path.join(out_dir, "transactions"))),
+                         ["month=1", "month=__HIVE_DEFAULT_PARTITION__"])
+        month_1 = pq.read_table(os.path.join(out_dir, "transactions", "month=1", "part-0.parquet"))
+        self.assertEqual(month_1.column("buyer_id").to_pylist(), [None, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import random
+import sys
+import unittest
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from transaction_engine import ListingIndex, build_buyer_shortlist
+
+
+def make_buyer(i, rng):
+    pref = SimpleNamespace(
+        target_zone=rng.choice(["A", "B", None]),
+        max_price=rng.uniform(1e6, 8e6),
+        min_bedrooms=rng.choice([1, 2, 3]),
+        need_school_district=rng.random() < 0.3,
+    )
+    return SimpleNamespace(id=i, preference=pref)
+
+
+class TestListingIndex(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.props_map = {}
+        self.listings = []
+        for pid in range(500):
+            prop = {"property_id": pid, "zone": rng.choice(["A", "B"]),
+                    "is_school_district": rng.random() < 0.4}
+            # Some properties have no bedrooms column at all
+            if rng.random() < 0.8:
+                prop["bedrooms"] = rng.choice([1, 2, 3, 4])
+            self.props_map[pid] = prop
+            # Coarse prices so ties are common
+            self.listings.append({"property_id": pid, "listed_price": rng.randint(5, 90) * 100000.0})
+        # Listing without a property record is ignored
+        self.listings.append({"property_id": 9999, "listed_price": 1.0})
+        self.buyers = [make_buyer(i, rng) for i in range(200)]
+
+    def test_matches_scalar_shortlist(self):
+        index = ListingIndex(self.listings, self.props_map)
+        batch = index.batch_candidates(self.buyers)
+        for buyer in self.buyers:
+            expected = build_buyer_shortlist(buyer, self.listings, self.props_map)
+            self.assertEqual(index.candidates(buyer), expected)
+            self.assertEqual(batch[buyer.id], expected)
+
+    def test_ignore_zone_and_k(self):
+        index = ListingIndex(self.listings, self.props_map)
+        for buyer in self.buyers[:50]:
+            expected = build_buyer_shortlist(buyer, self.listings, self.props_map, ignore_zone=True, limit=10)
+            self.assertEqual(index.candidates(buyer, k=10, ignore_zone=True), expected)
+
+    def test_empty(self):
+        index = ListingIndex([], {})
+        self.assertEqual(index.batch_candidates(self.buyers[:3]), {0: [], 1: [], 2: []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from utils.llm_cache import LLMResponseCache
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "llm_cache.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_covers_all_inputs(self):
+        base = LLMResponseCache.make_key("m", "sys", "hi", 0.7, False)
+        self.assertEqual(base, LLMResponseCache.make_key("m", "sys", "hi", 0.7, False))
+        self.assertNotEqual(base, LLMResponseCache.make_key("m2", "sys", "hi", 0.7, False))
+        self.assertNotEqual(base, LLMResponseCache.make_key("m", "sys", "hi", 0.2, False))
+        self.assertNotEqual(base, LLMResponseCache.make_key("m", "sys", "hi", 0.7, True))
+
+    def test_record_then_replay_across_runs(self):
+        cache = LLMResponseCache(self.path, mode="record")
+        key = LLMResponseCache.make_key("m", "sys", "hi", 0.7, True)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "m", '{"ok": true}')
+        cache.close()
+
+        replay = LLMResponseCache(self.path, mode="replay")
+        self.assertEqual(replay.get(key), '{"ok": true}')
+        replay.put("other", "m", "ignored")
+        self.assertIsNone(replay.get("other"))
+        stats = replay.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["writes"]), (1, 1, 0))
+        replay.close()
+
+    def test_repeated_prompts_keep_separate_samples(self):
+        cache = LLMResponseCache(self.path, mode="record")
+        key = LLMResponseCache.make_key("m", "sys", "hi", 0.7, True)
+        first, second = cache.occurrence_key(key), cache.occurrence_key(key)
+        self.assertEqual(first, key)
+        self.assertNotEqual(second, key)
+        cache.put(first, "m", "sample 1")
+        cache.put(second, "m", "sample 2")
+        cache.close()
+
+        # A replayed run sees the samples in the same order
+        replay = LLMResponseCache(self.path, mode="replay")
+        self.assertEqual([replay.get(replay.occurrence_key(key)) for _ in range(3)], ["sample 1", "sample 2", None])
+        replay.close()
+
+    def test_lru_eviction(self):
+        cache = LLMResponseCache(self.path, mode="record", max_entries=50, max_size_mb=0)
+        for i in range(100):
+            cache.put(f"k{i}", "m", f"v{i}")
+        self.assertEqual(cache.get_stats()["evictions"], 50)
+        self.assertIsNone(cache.get("k0"))
+        self.assertEqual(cache.get("k99"), "v99")
+        cache.close()
+
+    def test_buffered_writes_leave_no_open_transaction(self):
+        cache = LLMResponseCache(self.path, mode="record", flush_every=3, flush_interval=3600)
+        cache.put("k1", "m", "v1")
+        # Buffered: served from memory, nothing written or held open yet
+        self.assertEqual(cache.get("k1"), "v1")
+        self.assertFalse(cache._conn.in_transaction)
+        other = sqlite3.connect(self.path, timeout=0.1)
+        self.assertEqual(other.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0], 0)
+
+        # Third buffered operation triggers one batched commit
+        cache.put("k2", "m", "v2")
+        self.assertFalse(cache._conn.in_transaction)
+        self.assertEqual(other.execute("SELECT cache_key, hits FROM llm_cache ORDER BY cache_key").fetchall(),
+                         [("k1", 1), ("k2", 0)])
+
+        # LRU hits are buffered too; another connection can write in the meantime
+        self.assertEqual(cache.get("k2"), "v2")
+        self.assertFalse(cache._conn.in_transaction)
+        other.execute("UPDATE llm_cache SET model = 'x' WHERE cache_key = 'k1'")
+        other.commit()
+        cache.close()
+        self.assertEqual(other.execute("SELECT hits FROM llm_cache WHERE cache_key = 'k2'").fetchone()[0], 1)
+        other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from utils.llm_client import LLMScheduler
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_concurrency_cap(self):
+        scheduler = LLMScheduler({"smart": {"max_concurrency": 2, "requests_per_minute": 0, "tokens_per_minute": 0}})
+        peak = {"now": 0, "max": 0}
+
+        async def worker():
+            async with scheduler.slot("smart"):
+                peak["now"] += 1
+                peak["max"] = max(peak["max"], peak["now"])
+                await asyncio.sleep(0.01)
+                peak["now"] -= 1
+
+        async def run():
+            await asyncio.gather(*[worker() for _ in range(10)])
+
+        asyncio.run(run())
+        self.assertEqual(peak["max"], 2)
+        stats = scheduler.get_stats()
+        self.assertEqual(stats["models"]["smart"]["requests"], 10)
+        self.assertEqual(stats["models"]["smart"]["queue_depth"], 0)
+        self.assertGreater(stats["models"]["smart"]["max_queue_depth"], 0)
+
+    def test_priority_lanes(self):
+        scheduler = LLMScheduler({"smart": {"max_concurrency": 1, "requests_per_minute": 0, "tokens_per_minute": 0}})
+        order = []
+
+        async def worker(priority):
+            async with scheduler.slot("smart", priority=priority):
+                order.append(priority)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            # Occupy the only slot, then queue reporting before negotiation
+            blocker = await scheduler.acquire("smart")
+            tasks = [asyncio.create_task(worker("reporting")), asyncio.create_task(worker("activation"))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(worker("negotiation")))
+            await asyncio.sleep(0)
+            scheduler.release(blocker)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        self.assertEqual(order, ["negotiation", "activation", "reporting"])
+
+    def test_requests_per_minute_budget(self):
+        # 60 RPM = 1 request/sec refill, bucket starts full at 60
+        scheduler = LLMScheduler({"fast": {"max_concurrency": 4, "requests_per_minute": 60, "tokens_per_minute": 0}})
+        for _ in range(60):
+            scheduler.release(scheduler.acquire_sync("fast"))
+        wait = scheduler._lanes["fast"].requests.wait_time(1, scheduler._lanes["fast"].requests.updated)
+        self.assertGreater(wait, 0)
+
+    def test_sync_acquire_on_event_loop_thread_never_blocks(self):
+        scheduler = LLMScheduler({"fast": {"max_concurrency": 1, "requests_per_minute": 0, "tokens_per_minute": 0}})
+
+        async def run():
+            # A free slot is granted at once
+            scheduler.release(scheduler.acquire_sync("fast"))
+            # With the only slot held by a coroutine, waiting would deadlock the loop
+            held = await scheduler.acquire("fast")
+            started = time.monotonic()
+            with self.assertRaises(RuntimeError):
+                scheduler.acquire_sync("fast")
+            elapsed = time.monotonic() - started
+            scheduler.release(held)
+            return elapsed
+
+        self.assertLess(asyncio.run(asyncio.wait_for(run(), 5)), 0.5)
+        lane = scheduler._lanes["fast"]
+        self.assertEqual((lane.granted, lane.waiters, lane.in_flight), (2, [], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import sys
@@ -7,7 +8,10 @@ from unittest.mock import MagicMock, patch
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from agent_behavior import AgentRole, batched_determine_role, determine_role
+from agent_behavior import (AgentRole, batched_determine_role,
+                            batched_generate_agent_stories_async,
+                            decide_price_adjustments_async, determine_role,
+                            plan_negotiation_formats_async)
 from models import Agent, AgentStory
 
 
@@ -77,5 +81,70 @@ class TestMockLLM(unittest.TestCase):
         self.assertEqual(results[0]['role'], "BUYER")
         mock_llm.assert_called_once()
 
+    @patch('agent_behavior.safe_call_llm_async')
+    def test_batched_agent_stories(self, mock_llm):
+        # One request for the whole batch; agents missing from the reply get the default story
+        mock_llm.return_value = {"stories": [{"id": 2, "occupation": "医生", "background_story": "三甲医院主治医师。"}]}
+        first = Agent(id=1, age=30, cash=1e5, monthly_income=1e4)
+        second = Agent(id=2, age=40, cash=2e6, monthly_income=5e4)
+
+        stories = asyncio.run(batched_generate_agent_stories_async(
+            [(first, "教师", "balanced"), (second, "医生", "aggressive")]))
+
+        self.assertEqual(stories[0].occupation, "教师")
+        self.assertEqual(stories[1].background_story, "三甲医院主治医师。")
+        self.assertEqual(stories[1].investment_style, "aggressive")
+        mock_llm.assert_called_once()
+
+    @patch('agent_behavior.safe_call_llm_async')
+    def test_negotiation_format_planner(self, mock_llm):
+        # Single/zero-buyer sessions are decided by rule; the rest are batched (2 per request)
+        mock_llm.return_value = {"formats": [{"session": 2, "format": "batch"}, {"session": 3, "format": "FLASH"},
+                                             {"session": 4, "format": "unknown"}]}
+        config = MagicMock()
+        values = {"negotiation.format_planner": {"batch_size": 2}}
+        config.get.side_effect = lambda key, default=None: values.get(key, default)
+        sessions = [(self.agent, [self.agent], "单一买家"), (self.agent, [], "")] + \
+                   [(self.agent, [self.agent, self.agent], "买家众多")] * 3
+
+        formats = asyncio.run(plan_negotiation_formats_async(sessions, config))
+
+        self.assertEqual(formats, ["CLASSIC", "CLASSIC", "BATCH", "FLASH", "CLASSIC"])
+        self.assertEqual(mock_llm.call_count, 2)
+
+    @patch('agent_behavior.safe_call_llm_async')
+    def test_batched_price_adjustments(self, mock_llm):
+        # 5 listings, batch_size 2 -> 3 requests (the last single listing uses the one-listing prompt)
+        async def fake_llm(prompt, default, **kwargs):
+            if "decisions" in default:
+                return {"decisions": [{"listing": 0, "action": "C", "coefficient": 0.9, "reason": "止损"},
+                                      {"listing": 1, "action": "A", "coefficient": 1.0, "reason": "死扛"}]}
+            return {"action": "D", "coefficient": 1.0, "reason": "撤牌"}
+        mock_llm.side_effect = fake_llm
+        listings = [{"agent_id": i, "agent_name": f"A{i}", "investment_style": "balanced", "background": "房东",
+                     "property_id": 100 + i, "current_price": 1e6 * (i + 1), "listing_duration": 3}
+                    for i in range(5)]
+
+        results = asyncio.run(decide_price_adjustments_async(listings, "下跌", batch_size=2))
+
+        self.assertEqual(mock_llm.call_count, 3)
+        self.assertEqual([r[0]["action"] for r in results], ["C", "A", "C", "A", "D"])
+        self.assertAlmostEqual(results[2][0]["new_price"], 2.7e6)
+        self.assertAlmostEqual(results[0][1]["comp_min_price"], 0.95e6)
+
+    @patch('agent_behavior.safe_call_llm_async')
+    def test_batched_price_adjustments_invalid_coefficients(self, mock_llm):
+        mock_llm.return_value = {"decisions": [{"listing": 0, "action": "C", "coefficient": None},
+                                               {"listing": 1, "action": "B", "coefficient": "0.95"},
+                                               {"listing": 2, "action": "C", "coefficient": "大幅降价"},
+                                               {"listing": 3, "action": "C", "coefficient": 0.1}]}
+        listings = [{"agent_id": i, "agent_name": f"A{i}", "investment_style": "balanced",
+                     "property_id": 100 + i, "current_price": 1e6, "listing_duration": 3}
+                    for i in range(4)]
+
+        results = asyncio.run(decide_price_adjustments_async(listings, "下跌", batch_size=4))
+
+        self.assertEqual([round(r[0]["new_price"]) for r in results], [960000, 950000, 960000, 700000])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import random
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent_behavior import plan_negotiation_formats_async
+from config.config_loader import SimulationConfig
+from models import Agent, Market
+from transaction_engine import (HybridNegotiationBackend,
+                                NegotiationBackend,
+                                RuleNegotiationBackend,
+                                get_negotiation_backend,
+                                run_negotiation_session_async)
+
+
+def make_buyer(agent_id, max_price, style="balanced"):
+    buyer = Agent(id=agent_id, cash=5e6, monthly_income=5e4)
+    buyer.preference.max_price = max_price
+    buyer.story.investment_style = style
+    return buyer
+
+
+class TestNegotiationBackends(unittest.TestCase):
+    def setUp(self):
+        self.config = SimulationConfig(os.path.join(os.path.dirname(__file__), '../../config/baseline.yaml'))
+        self.seller = Agent(id=1)
+        self.listing = {"property_id": 10, "seller_id": 1, "zone": "A", "listed_price": 3e6, "min_price": 2.6e6}
+        self.market = Market([{"property_id": 10, "zone": "A", "status": "for_sale", "base_value": 3e6}])
+
+    def run_session(self, buyers, seed=0):
+        random.seed(seed)
+        return asyncio.run(run_negotiation_session_async(
+            self.seller, buyers, self.listing, self.market, 1, self.config))
+
+    def test_rule_backend_is_deterministic_and_llm_free(self):
+        self.config._config['negotiation']['backend'] = 'rule'
+        buyers = [make_buyer(2, 2e6), make_buyer(3, 2.9e6, "aggressive"), make_buyer(4, 3.5e6, "desperate")]
+        with patch('transaction_engine.safe_call_llm_async') as llm, \
+                patch('agent_behavior.safe_call_llm_async') as planner_llm:
+            first = self.run_session(buyers)
+            second = self.run_session(buyers)
+        llm.assert_not_called()
+        planner_llm.assert_not_called()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["outcome"], "success")
+        self.assertEqual(first["mode"], "classic")
+        # Buyer 2 fails the pre-check, buyer 3 is the first to close
+        self.assertEqual(first["buyer_id"], 3)
+        self.assertTrue(self.listing["min_price"] <= first["final_price"] <= 2.9e6)
+        for entry in first["history"]:
+            self.assertEqual(set(entry), {"round", "party", "action", "price", "content"})
+
+    def test_rule_batch_matches_single_negotiations(self):
+        backend = RuleNegotiationBackend(self.config)
+        rng = random.Random(5)
+        buyers = [make_buyer(i, rng.uniform(2.2e6, 3.4e6), rng.choice(["aggressive", "balanced", "desperate"]))
+                  for i in range(2, 30)]
+        random.seed(1)
+        batch = backend.negotiate_many(buyers, self.seller, self.listing, self.market, len(buyers))
+        random.seed(1)
+        single = [asyncio.run(backend.negotiate(b, self.seller, self.listing, self.market, len(buyers)))
+                  for b in buyers]
+        self.assertEqual(batch, single)
+        for result in batch:
+            if result["outcome"] == "success":
+                self.assertGreaterEqual(result["final_price"], self.listing["min_price"])
+
+    def test_hybrid_only_uses_llm_for_close_deals(self):
+        self.config._config['negotiation'].update(backend='hybrid', hybrid={"close_margin": 0.05})
+        backend = get_negotiation_backend(self.config)
+        self.assertIsInstance(backend, HybridNegotiationBackend)
+        close, far = make_buyer(2, 2.65e6), make_buyer(3, 3.5e6)
+        self.assertTrue(backend.needs_llm(close, self.listing))
+        self.assertFalse(backend.needs_llm(far, self.listing))
+
+        async def fake_llm(prompt, default, system_prompt="", **kwargs):
+            return {"action": "WITHDRAW", "reason": "no"}
+
+        with patch('transaction_engine.safe_call_llm_async', side_effect=fake_llm) as llm:
+            result = asyncio.run(backend.classic_session(self.seller, [close, far], self.listing, self.market))
+        self.assertTrue(llm.called)
+        self.assertEqual(result["outcome"], "success")
+        self.assertEqual(result["buyer_id"], 3)
+
+    def test_backend_without_negotiate_fails_on_creation(self):
+        class IncompleteBackend(NegotiationBackend):
+            name = "incomplete"
+
+        self.config._config['negotiation']['backend'] = 'incomplete'
+        with patch.dict('transaction_engine.NEGOTIATION_BACKENDS', {"incomplete": IncompleteBackend}):
+            with self.assertRaises(TypeError):
+                get_negotiation_backend(self.config)
+
+
+class TestRuleBackendPlanner(unittest.TestCase):
+    def test_planner_skips_llm_for_rule_backend(self):
+        config = SimulationConfig(os.path.join(os.path.dirname(__file__), '../../config/baseline.yaml'))
+        config._config['negotiation']['backend'] = 'rule'
+        sessions = [(Agent(id=1), [Agent(id=2), Agent(id=3)], "买家众多")]
+        with patch('agent_behavior.safe_call_llm_async') as llm:
+            formats = asyncio.run(plan_negotiation_formats_async(sessions, config))
+        llm.assert_not_called()
+        self.assertEqual(formats, ["CLASSIC"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from utils.db_pool import DatabasePool
+from utils.llm_client import get_usage_stats
+from utils.profiler import SimulationProfiler
+
+
+class TestSimulationProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(path)
+        self.conn = sqlite3.connect(path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_phase_metrics_table_and_summary(self):
+        profiler = SimulationProfiler(cprofile_month=1, output_dir=self.tmpdir.name)
+        profiler.attach(self.conn)
+        usage = get_usage_stats()
+
+        profiler.start_month(1)
+        profiler.start_phase("bulletin")
+        usage.record_call(0.5, SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+        usage.record_call(1.5, SimpleNamespace(prompt_tokens=50, completion_tokens=10))
+        profiler.start_phase("matching")
+        for _ in range(3):
+            self.conn.execute("SELECT 1").fetchall()
+        usage.record_cache_hit()
+        profiler.end_phase()
+        elapsed = profiler.end_month()
+        profiler.persist(self.conn, 1)
+
+        phases = profiler.months[1]
+        self.assertEqual(phases["bulletin"]["llm_calls"], 2)
+        self.assertEqual(phases["bulletin"]["prompt_tokens"], 150)
+        self.assertEqual(phases["bulletin"]["completion_tokens"], 30)
+        self.assertAlmostEqual(phases["bulletin"]["llm_latency_total"], 2.0)
+        self.assertEqual(phases["bulletin"]["db_statements"], 0)
+        self.assertEqual(phases["matching"]["db_statements"], 3)
+        self.assertEqual(phases["matching"]["llm_cache_hits"], 1)
+        self.assertEqual(phases["total"]["llm_calls"], 2)
+        self.assertGreaterEqual(elapsed, phases["bulletin"]["wall_time"] + phases["matching"]["wall_time"])
+
+        rows = self.conn.execute(
+            "SELECT phase, llm_calls, db_statements FROM perf_metrics WHERE month=1 ORDER BY id").fetchall()
+        self.assertEqual(rows, [("bulletin", 2, 0), ("matching", 0, 3), ("total", 2, 3)])
+
+        with open(profiler.write_summary(), encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["phases"]["bulletin"]["llm_latency_avg"], 1.0)
+        self.assertIn("1", summary["months"])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "profile_month_1.prof")))
+
+    def test_latency_max_is_per_span(self):
+        profiler = SimulationProfiler(output_dir=self.tmpdir.name)
+        usage = get_usage_stats()
+        # A slow call earlier in the process must not leak into later spans
+        usage.record_call(9.0)
+
+        profiler.start_month(1)
+        profiler.start_phase("bulletin")
+        usage.record_call(2.0)
+        usage.record_call(0.5)
+        profiler.start_phase("activation")
+        usage.record_call(0.3)
+        profiler.start_phase("matching")
+        profiler.end_month()
+
+        profiler.start_month(2)
+        profiler.start_phase("activation")
+        usage.record_call(0.4)
+        profiler.end_month()
+
+        self.assertEqual(profiler.months[1]["bulletin"]["llm_latency_max"], 2.0)
+        self.assertEqual(profiler.months[1]["activation"]["llm_latency_max"], 0.3)
+        self.assertEqual(profiler.months[1]["matching"]["llm_latency_max"], 0.0)
+        self.assertEqual(profiler.months[1]["total"]["llm_latency_max"], 2.0)
+        self.assertEqual(profiler.months[2]["activation"]["llm_latency_max"], 0.4)
+        self.assertEqual(profiler.months[2]["total"]["llm_latency_max"], 0.4)
+        self.assertEqual(profiler.summary()["phases"]["activation"]["llm_latency_max"], 0.4)
+
+    def test_pool_statements_counted(self):
+        profiler = SimulationProfiler(output_dir=self.tmpdir.name)
+        pool = DatabasePool(os.path.join(self.tmpdir.name, "sim.db"), read_pool_size=2, on_connect=profiler.attach)
+        try:
+            profiler.start_month(0)
+            profiler.start_phase("reporting")
+            pool.read("SELECT COUNT(*) FROM agents_static")
+            pool.execute("DELETE FROM agents_static").result()
+            profiler.end_month()
+        finally:
+            pool.close()
+        self.assertGreaterEqual(profiler.months[0]["reporting"]["db_statements"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from services.reporting_service import (PORTRAIT_FAILED, ReportingService, collect_all_agent_data,
+                                        select_portrait_agents)
+
+
+class _Config:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+class TestBulkReporting(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.executemany("INSERT INTO agents_static (agent_id, name, birth_year, occupation, investment_style) "
+                              "VALUES (?, ?, 1990, '教师', 'balanced')",
+                              [(i, f"A{i}") for i in range(1, 7)])
+        # Agent 6 has no finance row and is not reported
+        self.conn.executemany("INSERT INTO agents_finance (agent_id, cash, total_assets, total_debt) "
+                              "VALUES (?, ?, ?, 0)",
+                              [(i, 1e5 * i, 2e5 * i) for i in range(1, 6)])
+        self.conn.executemany("INSERT INTO transactions (month, buyer_id, seller_id, property_id, final_price) "
+                              "VALUES (?, ?, ?, ?, ?)",
+                              [(2, 1, 2, 10, 3e6), (1, 2, 3, 11, 2e6), (3, 3, 1, 12, 4e6)])
+        self.conn.executemany("INSERT INTO decision_logs (agent_id, month, event_type, decision, reason) "
+                              "VALUES (?, ?, ?, ?, ?)",
+                              [(1, 2, 'BID', 'B', 'r1'), (1, 1, 'LIST_PROPERTY', 'L', 'r2'),
+                               (2, 1, 'ROLE_DECISION', 'X', 'ignored')])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_collect_all_agent_data(self):
+        data = collect_all_agent_data(self.conn)
+        self.assertEqual(sorted(data), [1, 2, 3, 4, 5])
+        self.assertEqual(data[1]["identity"]["name"], "A1")
+        self.assertEqual(data[3]["finance"]["cash"], 3e5)
+        self.assertEqual([(t["month"], t["type"], t["property_id"]) for t in data[1]["transactions"]],
+                         [(2, "BUY", 10), (3, "SELL", 12)])
+        self.assertEqual([(t["month"], t["type"]) for t in data[2]["transactions"]], [(1, "BUY"), (2, "SELL")])
+        self.assertEqual([d["event_type"] for d in data[1]["decisions"]], ["LIST_PROPERTY", "BID"])
+        self.assertEqual(data[2]["decisions"], [])
+
+    def test_no_llm_then_resumable_portraits(self):
+        service = ReportingService(_Config({"system.reporting": {"portrait_concurrency": 2, "chunk_size": 2}}),
+                                   self.conn)
+
+        self.assertEqual(asyncio.run(service.generate_all_agent_reports(3, run_id="r", use_llm=False)), 5)
+        # Re-running does not duplicate reports
+        self.assertEqual(asyncio.run(service.build_reports("r", use_llm=False)), 0)
+        portraits = {row[0] for row in self.conn.execute(
+            "SELECT llm_portrait FROM agent_end_reports WHERE simulation_run_id='r'")}
+        self.assertEqual(portraits, {"LLM Analysis Disabled"})
+
+        # Interrupted portrait stage: two portraits already checkpointed
+        asyncio.run(service.build_reports("p", use_llm=True))
+        self.conn.execute("UPDATE agent_end_reports SET llm_portrait='done', portrait_status='done' "
+                          "WHERE simulation_run_id='p' AND agent_id IN (1, 2)")
+        self.conn.commit()
+
+        calls = []
+
+        async def fake_portrait(data):
+            calls.append(data["identity"]["agent_id"])
+            return f"画像{data['identity']['agent_id']}"
+
+        with patch.object(service, "_generate_llm_portrait", side_effect=fake_portrait):
+            self.assertEqual(asyncio.run(service.generate_portraits("p")), 3)
+        self.assertEqual(sorted(calls), [3, 4, 5])
+        rows = dict(self.conn.execute(
+            "SELECT agent_id, llm_portrait FROM agent_end_reports WHERE simulation_run_id='p'").fetchall())
+        self.assertEqual(rows, {1: "done", 2: "done", 3: "画像3", 4: "画像4", 5: "画像5"})
+        stored = json.loads(self.conn.execute(
+            "SELECT transaction_summary FROM agent_end_reports WHERE agent_id=1 AND simulation_run_id='p'"
+        ).fetchone()[0])
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(asyncio.run(service.generate_portraits("p")), 0)
+
+    def test_resumed_simulation_reports_afresh(self):
+        service = ReportingService(_Config({}), self.conn)
+        self.assertEqual(asyncio.run(service.build_reports("run1_m1-3", use_llm=False)), 5)
+
+        # The resumed simulation changed finances and reports under its own run id
+        self.conn.execute("UPDATE agents_finance SET cash = 1 WHERE agent_id = 1")
+        self.conn.commit()
+        self.assertEqual(asyncio.run(service.build_reports("run2_m4-6", use_llm=False)), 5)
+        finance = {run_id: json.loads(summary)["cash"] for run_id, summary in self.conn.execute(
+            "SELECT simulation_run_id, finance_summary FROM agent_end_reports WHERE agent_id = 1")}
+        self.assertEqual(finance, {"run1_m1-3": 1e5, "run2_m4-6": 1})
+
+    def test_failed_portraits_are_retried(self):
+        service = ReportingService(_Config({}), self.conn)
+        asyncio.run(service.build_reports("f", use_llm=True))
+
+        async def flaky_portrait(data):
+            agent_id = data["identity"]["agent_id"]
+            if agent_id == 2:
+                raise RuntimeError("rate limited")
+            return PORTRAIT_FAILED if agent_id == 3 else f"画像{agent_id}"
+
+        with patch.object(service, "_generate_llm_portrait", side_effect=flaky_portrait):
+            asyncio.run(service.generate_portraits("f"))
+        status = dict(self.conn.execute(
+            "SELECT agent_id, portrait_status FROM agent_end_reports WHERE simulation_run_id='f'").fetchall())
+        self.assertEqual(status, {1: "done", 2: "failed", 3: "failed", 4: "done", 5: "done"})
+
+        async def fake_portrait(data):
+            return f"重试{data['identity']['agent_id']}"
+
+        with patch.object(service, "_generate_llm_portrait", side_effect=fake_portrait):
+            self.assertEqual(asyncio.run(service.generate_portraits("f")), 2)
+        rows = dict(self.conn.execute(
+            "SELECT agent_id, llm_portrait FROM agent_end_reports WHERE simulation_run_id='f' AND agent_id IN (2, 3)"))
+        self.assertEqual(rows, {2: "重试2", 3: "重试3"})
+
+    def test_portrait_policies(self):
+        # Incomes put agents 1-2 in 'low', 3-5 in 'high'; agent 4 gained the most net worth
+        self.conn.executemany("UPDATE agents_finance SET monthly_income = ?, initial_net_worth = ? WHERE agent_id = ?",
+                              [(5e3, 2e5, 1), (5e3, 4e5, 2), (5e4, 6e5, 3), (5e4, 1e5, 4), (5e4, 1e6, 5)])
+        self.conn.commit()
+        data = collect_all_agent_data(self.conn)
+
+        self.assertEqual(select_portrait_agents(data, "all"), {1, 2, 3, 4, 5})
+        self.assertEqual(select_portrait_agents(data, "transacting"), {1, 2, 3})
+        self.assertEqual(select_portrait_agents(data, "top_wealth_change", top_n=1), {4})
+        sample = select_portrait_agents(data, "stratified", sample_rate=0.1, seed=7)
+        self.assertEqual(len(sample & {1, 2}), 1)
+        self.assertEqual(len(sample & {3, 4, 5}), 1)
+        self.assertEqual(sample, select_portrait_agents(data, "stratified", sample_rate=0.1, seed=7))
+        with self.assertRaises(ValueError):
+            select_portrait_agents(data, "everyone")
+
+    def test_batched_portraits_for_selected_agents(self):
+        service = ReportingService(_Config({"system.reporting": {"portrait_policy": "transacting", "batch_size": 5}}),
+                                   self.conn)
+        prompts = []
+
+        async def fake_llm(prompt, default_return, **kwargs):
+            prompts.append(prompt)
+            ids = [int(i) for i in re.findall(r'"id": (\d+)', prompt)]
+            # Agent 3 is dropped from the reply and gets a single-agent prompt
+            return {"portraits": [{"id": i, "portrait": f"批量{i}"} for i in ids if i != 3]}
+
+        async def fake_single(data):
+            return f"单独{data['identity']['agent_id']}"
+
+        with patch('services.reporting_service.safe_call_llm_async', side_effect=fake_llm), \
+                patch.object(service, "_generate_llm_portrait", side_effect=fake_single):
+            self.assertEqual(asyncio.run(service.generate_all_agent_reports(3, run_id="b")), 5)
+
+        # All three transacting agents share tier, style and activity: one batched call
+        self.assertEqual(len(prompts), 1)
+        rows = {agent_id: (status, portrait) for agent_id, status, portrait in self.conn.execute(
+            "SELECT agent_id, portrait_status, llm_portrait FROM agent_end_reports WHERE simulation_run_id='b'")}
+        self.assertEqual(rows[1], ("done", "批量1"))
+        self.assertEqual(rows[2], ("done", "批量2"))
+        self.assertEqual(rows[3], ("done", "单独3"))
+        self.assertEqual(rows[4][0], "skipped")
+        self.assertEqual(rows[5][0], "skipped")
+
+
+if __name__ == '__main__':
+    unittest.main()
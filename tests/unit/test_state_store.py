@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import sys
+import unittest
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from services.state_store import AgentState, MarketState
+
+
+class TestStateStore(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""CREATE TABLE properties_market (
+            property_id INTEGER PRIMARY KEY, owner_id INTEGER, status TEXT, listed_price REAL, min_price REAL,
+            listing_month INTEGER, current_valuation REAL, last_price_update_month INTEGER,
+            last_price_update_reason TEXT, last_transaction_month INTEGER)""")
+        self.conn.execute("""CREATE TABLE agents_finance (
+            agent_id INTEGER PRIMARY KEY, mortgage_monthly_payment REAL, cash REAL, total_assets REAL,
+            total_debt REAL, net_cashflow REAL)""")
+        self.conn.execute("CREATE TABLE active_participants (agent_id INTEGER PRIMARY KEY, role TEXT)")
+        self.conn.executemany("INSERT INTO properties_market (property_id, owner_id, status, listed_price, min_price, "
+                              "listing_month) VALUES (?,?,?,?,?,?)",
+                              [(1, 10, 'for_sale', 100.0, 90.0, 1), (2, 11, 'off_market', None, None, None),
+                               (3, 12, 'for_sale', 300.0, 250.0, 2)])
+        self.conn.executemany("INSERT INTO agents_finance (agent_id, cash) VALUES (?, ?)", [(10, 0), (20, 0)])
+        self.conn.executemany("INSERT INTO active_participants VALUES (?, ?)", [(20, 'BUYER'), (21, 'BUYER')])
+        self.props = [{"property_id": pid, "zone": "A", "status": None, "owner_id": None} for pid in (1, 2, 3)]
+
+    def test_active_listings_and_mirroring(self):
+        state = MarketState(self.conn)
+        state.load(self.props)
+        self.assertEqual([l["property_id"] for l in state.active_listings()], [1, 3])
+        self.assertEqual(state.active_listings()[0]["seller_id"], 10)
+
+        state.update(1, status='off_market', owner_id=20)
+        state.update(2, status='for_sale', listed_price=200.0, min_price=180.0, listing_month=3)
+        self.assertEqual([l["property_id"] for l in state.active_listings()], [2, 3])
+        self.assertEqual(state.props_map[1]["owner_id"], 20)
+        self.assertEqual(state.props_map[2]["status"], 'for_sale')
+
+    def test_flush_writes_only_dirty_rows(self):
+        state = MarketState(self.conn)
+        state.load(self.props)
+        state.update(3, listed_price=280.0, last_price_update_month=4, last_price_update_reason="cut")
+        state.update(3, min_price=240.0)
+        self.assertEqual(state.flush(), 1)
+        self.assertEqual(state.flush(), 0)
+        self.conn.commit()
+        row = self.conn.execute("SELECT listed_price, min_price, last_price_update_reason, status "
+                                "FROM properties_market WHERE property_id=3").fetchone()
+        self.assertEqual(row, (280.0, 240.0, "cut", "for_sale"))
+
+    def test_agent_state_flush(self):
+        state = AgentState(self.conn)
+        agent = SimpleNamespace(id=20, to_v2_finance_dict=lambda: {
+            "mortgage_monthly_payment": 5.0, "cash": 1.0, "total_assets": 2.0, "total_debt": 3.0, "net_cashflow": 4.0})
+        state.mark_finance(agent)
+        state.remove_participant(20)
+        self.assertEqual(state.flush(), 2)
+        row = self.conn.execute(
+            "SELECT cash, mortgage_monthly_payment FROM agents_finance WHERE agent_id=20").fetchone()
+        self.assertEqual(row, (1.0, 5.0))
+        self.assertEqual(self.conn.execute("SELECT agent_id FROM active_participants").fetchall(), [(21,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from database import init_db
+from services.market_service import MarketService
+
+
+class _Config:
+    def __init__(self, zones):
+        self.zones = zones
+
+    def get(self, key, default=None):
+        return self.zones if key == 'market.zones' else default
+
+
+class TestZoneStats(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "sim.db")
+        init_db(path)
+        self.conn = sqlite3.connect(path)
+        # Zone A: 1 listing / 2 buyers (HOT); B: 8 listings / 0 buyers (COLD); C: 3 listings / 2 buyers (BALANCED)
+        props = [(1, 'A', 100.0, 'for_sale'), (2, 'A', 50.0, 'off_market')]
+        props += [(10 + i, 'B', 80.0, 'for_sale') for i in range(8)]
+        props += [(30 + i, 'C', 60.0, 'for_sale') for i in range(3)]
+        self.conn.executemany("INSERT INTO properties_static (property_id, zone, building_area) VALUES (?, ?, ?)",
+                              [(p, z, a) for p, z, a, _ in props])
+        self.conn.executemany("INSERT INTO properties_market (property_id, status) VALUES (?, ?)",
+                              [(p, s) for p, _, _, s in props])
+        self.conn.executemany("INSERT INTO active_participants (agent_id, role, target_zone) VALUES (?, ?, ?)",
+                              [(1, 'BUYER', 'A'), (2, 'BUYER_SELLER', 'A'), (3, 'BUYER', 'C'),
+                               (4, 'BUYER', 'C'), (5, 'SELLER', 'B')])
+        self.conn.executemany("INSERT INTO transactions (month, property_id, final_price) VALUES (?, ?, ?)",
+                              [(3, 2, 5e6), (3, 30, 3e6), (2, 31, 9e6)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def test_heat_and_transactions_for_n_zones(self):
+        service = MarketService(_Config({'A': {}, 'B': {}, 'C': {}, 'D': {}}), self.conn)
+        stats = service.get_zone_stats(3)
+        self.assertEqual({z: s["heat"] for z, s in stats.items()},
+                         {'A': 'HOT', 'B': 'COLD', 'C': 'BALANCED', 'D': 'BALANCED'})
+        self.assertEqual((stats['A']["listings"], stats['A']["buyers"], stats['A']["tx_count"]), (1, 2, 1))
+        self.assertAlmostEqual(stats['A']["avg_unit_price"], 5e6 / 50.0)
+        self.assertEqual(stats['C']["tx_count"], 1)
+        self.assertEqual(stats['D']["listings"], 0)
+
+    def test_bulletin_with_unzoned_rows(self):
+        # A listing and a buyer without a zone group under a None key
+        self.conn.execute("INSERT INTO properties_static (property_id, zone, building_area) VALUES (99, NULL, 70.0)")
+        self.conn.execute("INSERT INTO properties_market (property_id, status) VALUES (99, 'for_sale')")
+        self.conn.execute("INSERT INTO active_participants (agent_id, role, target_zone) VALUES (9, 'BUYER', NULL)")
+        self.conn.commit()
+        service = MarketService(_Config({'A': {}, 'B': {}, 'C': {}}), self.conn)
+        self.assertIn(None, service.get_zone_stats(0))
+
+        text = asyncio.run(service.generate_market_bulletin(1))
+        self.assertIn("A区热度: HOT", text)
+        row = self.conn.execute("SELECT zone_a_heat, zone_stats FROM market_bulletin WHERE month = 1").fetchone()
+        self.assertEqual(row[0], "HOT")
+        self.assertIn("null", json.loads(row[1]))
+        self.assertNotIn("None区", text)
+
+        prompts = []
+
+        async def fake_llm(prompt, default_return, **kwargs):
+            prompts.append(prompt)
+            return default_return
+
+        with patch('utils.llm_client.safe_call_llm_async', side_effect=fake_llm):
+            text = asyncio.run(service.generate_market_bulletin(2))
+        self.assertIn("C区热度: BALANCED", prompts[0])
+        self.assertNotIn("None区", prompts[0])
+        self.assertNotIn("None区", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
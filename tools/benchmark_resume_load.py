@@ -0,0 +1,101 @@
+"""
+Resume load-time benchmark.
+
+Builds a synthetic V2 database (agents_static / agents_finance / properties_static /
+properties_market / active_participants) and times the resume path used by
+SimulationRunner.load_from_db.
+
+Usage:
+    python tools/benchmark_resume_load.py --agents 100000 --properties 150000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.config_loader import SimulationConfig
+from database import get_connection, init_db
+from services.agent_service import AgentService
+from services.market_service import MarketService
+from services.state_store import MarketState
+
+
+def build_db(path: str, n_agents: int, n_props: int, seed: int = 42):
+    rng = random.Random(seed)
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO agents_static (agent_id, name, birth_year, marital_status, children_ages, occupation, "
+        "background_story, investment_style) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"Agent{i}", rng.randint(1960, 2000), "single", "[]", "工程师", "背景故事" * 10, "balanced")
+         for i in range(1, n_agents + 1)))
+    conn.executemany(
+        "INSERT INTO agents_finance (agent_id, monthly_income, cash, total_assets, total_debt, "
+        "mortgage_monthly_payment, net_cashflow, max_affordable_price, psychological_price, "
+        "last_price_update_month, last_price_update_reason) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, rng.uniform(5e3, 8e4), rng.uniform(1e4, 5e6), 0, 0, 0, 0, 0, 0, 0, "")
+         for i in range(1, n_agents + 1)))
+    conn.executemany(
+        "INSERT INTO properties_static (property_id, zone, quality, building_area, property_type, "
+        "is_school_district, school_tier, price_per_sqm, zone_price_tier, initial_value, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((p, rng.choice("AB"), 2, rng.uniform(50, 150), "普通住宅", rng.random() < 0.3, 1, 40000, None, 3e6, 0)
+         for p in range(1, n_props + 1)))
+    conn.executemany(
+        "INSERT INTO properties_market (property_id, owner_id, status, current_valuation, listed_price, min_price, "
+        "rental_price, rental_yield, listing_month, last_transaction_month) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((p, rng.randint(1, n_agents) if rng.random() < 0.8 else None,
+          "for_sale" if rng.random() < 0.05 else "off_market", 3e6, 3.1e6, 2.9e6, 0, 0, 1, None)
+         for p in range(1, n_props + 1)))
+    conn.executemany(
+        "INSERT INTO active_participants (agent_id, role, target_zone, max_price, life_pressure, activated_month, "
+        "role_duration) VALUES (?, 'BUYER', 'A', 3e6, 'patient', 1, 1)",
+        ((i,) for i in rng.sample(range(1, n_agents + 1), min(n_agents, max(1, n_agents // 50)))))
+    conn.commit()
+    conn.close()
+
+
+def run(n_agents: int, n_props: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        build_db(path, n_agents, n_props)
+        print(f"Built synthetic DB ({n_agents} agents, {n_props} properties) in {time.perf_counter() - t0:.2f}s")
+
+        conn = get_connection(path)
+        config = SimulationConfig()
+        agent_service = AgentService(config, conn)
+        market_service = MarketService(config, conn)
+        market_state = MarketState(conn)
+
+        timings = {}
+        t = time.perf_counter()
+        agent_service.load_agents_from_db()
+        timings["agents"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        market_service.load_market_from_db(agent_service.agents, agent_service.agent_map)
+        timings["properties + owner linking"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        market_state.load(market_service.market.properties)
+        timings["market state"] = time.perf_counter() - t
+        conn.close()
+
+        for name, secs in timings.items():
+            print(f"  {name:<28}{secs:8.2f}s")
+        print(f"  {'total':<28}{sum(timings.values()):8.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the resume (load_from_db) path")
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--properties", type=int, default=150000)
+    args = parser.parse_args()
+    run(args.agents, args.properties)
@@ -0,0 +1,34 @@
+"""
+Columnar export of a run DB (Parquet, partitioned by month where applicable).
+
+Streams the run tables in chunks into <out>/<table>/ and writes
+<out>/manifest.json with row counts and schemas. Requires pyarrow.
+
+Usage:
+    python tools/export_run_parquet.py --db results/run_x/simulation.db --out results/run_x/parquet
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.export_service import EXPORT_TABLES, export_run_tables
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Export run tables to Parquet")
+    parser.add_argument("--db", required=True, help="Path to the run DB")
+    parser.add_argument("--out", default=None, help="Output directory (default: <db dir>/parquet)")
+    parser.add_argument("--tables", nargs="*", choices=list(EXPORT_TABLES), default=None)
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="Rows read per fetchmany / row group")
+    parser.add_argument("--compression", default="snappy")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(os.path.dirname(os.path.abspath(args.db)), "parquet")
+    t = time.perf_counter()
+    manifest = export_run_tables(args.db, out_dir, args.tables, args.chunk_rows, args.compression)
+    total = sum(entry["rows"] for entry in manifest["tables"].values())
+    print(f"Exported {total} rows from {len(manifest['tables'])} tables to {out_dir} in {time.perf_counter() - t:.2f}s")
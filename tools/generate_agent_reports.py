@@ -0,0 +1,56 @@
+"""
+Agent end-report generator for an existing run DB.
+
+Runs the ReportingService stages outside a simulation: bulk report data for
+every agent, then (unless --no-llm) the LLM portrait stage, which resumes
+from the portraits still pending in agent_end_reports. --policy overrides
+system.reporting.portrait_policy for agents not yet reported.
+
+Usage:
+    python tools/generate_agent_reports.py --db results/run_x/simulation.db --no-llm
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.config_loader import SimulationConfig
+from database import get_connection, migrate_db_v2_7
+from services.reporting_service import PORTRAIT_POLICIES, ReportingService
+from utils.llm_client import close_async_clients
+
+
+async def run(db_path: str, run_id: str, use_llm: bool, config_path: str, policy: str = None):
+    config = SimulationConfig(config_path)
+    db_config = config.get('system.database', {}) or {}
+    migrate_db_v2_7(db_path, db_config)
+    conn = get_connection(db_path, db_config)
+    try:
+        service = ReportingService(config, conn)
+        if policy:
+            service.portrait_policy = policy
+        t = time.perf_counter()
+        written = await service.build_reports(run_id, use_llm)
+        print(f"Report data: {written} rows in {time.perf_counter() - t:.2f}s")
+        if use_llm:
+            t = time.perf_counter()
+            portraits = await service.generate_portraits(run_id)
+            print(f"LLM portraits: {portraits} in {time.perf_counter() - t:.2f}s")
+    finally:
+        conn.close()
+        await close_async_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate agent end reports for a run DB")
+    parser.add_argument("--db", required=True, help="Path to the run DB")
+    parser.add_argument("--run-id", default=None,
+                        help="simulation_run_id to report under; an existing id resumes that run's reports")
+    parser.add_argument("--no-llm", action="store_true", help="Skip LLM portraits (data-only reports)")
+    parser.add_argument("--policy", choices=PORTRAIT_POLICIES, default=None, help="Portrait selection policy")
+    parser.add_argument("--config", default="config/baseline.yaml")
+    args = parser.parse_args()
+    asyncio.run(run(args.db, args.run_id, not args.no_llm, args.config, args.policy))
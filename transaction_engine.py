@@ -6,9 +6,13 @@ import asyncio
 import json
 import logging
 import random
+from abc import ABC, abstractmethod
 from typing import Dict, List, Optional
 
-from agent_behavior import (decide_negotiation_format, safe_call_llm,
+import numpy as np
+
+from agent_behavior import (decide_negotiation_format,
+                            plan_negotiation_formats_async, safe_call_llm,
                             safe_call_llm_async)
 from models import Agent, Market
 from mortgage_system import calculate_max_affordable_price, check_affordability
@@ -35,8 +39,13 @@ def build_macro_context(month: int, config=None) -> str:
 
 # --- New Negotiation Modes (Phase 5) ---
 
-async def run_batch_bidding_async(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, month: int, config=None, db_conn=None) -> Dict:
-    """Mode A: Batch Bidding (Blind Auction) - Async"""
+async def run_batch_bidding_async(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, month: int,
+                                  config=None) -> Dict:
+    """
+    Mode A: Batch Bidding (Blind Auction) - Async
+    Every outcome carries `bid_records`: one property_buyer_matches row per buyer,
+    in `buyers` order, for the transaction phase to insert in bulk.
+    """
     history = []
     min_price = listing['min_price']
 
@@ -73,7 +82,7 @@ async def run_batch_bidding_async(seller: Agent, buyers: List[Agent], listing: D
         请出价（0表示放弃）：
         输出JSON: {{"bid_price": float, "reason": "..."}}
         """
-        resp = await safe_call_llm_async(prompt, {"bid_price": 0, "reason": "Pass"})
+        resp = await safe_call_llm_async(prompt, {"bid_price": 0, "reason": "Pass"}, priority="negotiation")
         bid_price = float(resp.get("bid_price", 0))
 
         # ✅ Phase 3.1: Validate affordability post-bid
@@ -94,34 +103,23 @@ async def run_batch_bidding_async(seller: Agent, buyers: List[Agent], listing: D
     tasks = [get_buyer_bid(b) for b in buyers]
     results = await asyncio.gather(*tasks)
 
-    # ✅ Phase 3.3: Record all bids to property_buyer_matches table
-    if db_conn:
-        cursor = db_conn.cursor()
-        for bid_result in results:
-            try:
-                cursor.execute("""
-                    INSERT INTO property_buyer_matches
-                    (month, property_id, buyer_id, listing_price, buyer_bid, is_valid_bid, proceeded_to_negotiation)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    month,
-                    listing['property_id'],
-                    bid_result['buyer'].id,
-                    listing['listed_price'],
-                    bid_result['original_bid'],
-                    1 if bid_result['is_valid'] else 0,
-                    1 if bid_result['price'] > 0 else 0
-                ))
-            except Exception as e:
-                logger.error(f"Failed to record bid for buyer {bid_result['buyer'].id}: {e}")
-        db_conn.commit()
+    # ✅ Phase 3.3: Bids for property_buyer_matches (gather keeps buyer order)
+    bid_records = [(
+        month,
+        listing['property_id'],
+        bid_result['buyer'].id,
+        listing['listed_price'],
+        bid_result['original_bid'],
+        1 if bid_result['is_valid'] else 0,
+        1 if bid_result['price'] > 0 else 0
+    ) for bid_result in results]
 
     # ✅ Phase 3.1: Only filter out zero bids (affordability already checked)
     bids = [r for r in results if r['price'] > 0]
 
     # 2. Seller Selects Winner
     if not bids:
-        return {"outcome": "failed", "reason": "No valid bids"}
+        return {"outcome": "failed", "reason": "No valid bids", "bid_records": bid_records}
 
     # Sort by price desc
     bids.sort(key=lambda x: x['price'], reverse=True)
@@ -135,10 +133,11 @@ async def run_batch_bidding_async(seller: Agent, buyers: List[Agent], listing: D
             "buyer_id": best_bid['buyer'].id,
             "final_price": best_bid['price'],
             "mode": "batch_bidding",
-            "history": [{"action": "WIN_BID", "price": best_bid['price'], "buyer": best_bid['buyer'].id}]
+            "history": [{"action": "WIN_BID", "price": best_bid['price'], "buyer": best_bid['buyer'].id}],
+            "bid_records": bid_records
         }
     else:
-        return {"outcome": "failed", "reason": "Highest bid below min_price"}
+        return {"outcome": "failed", "reason": "Highest bid below min_price", "bid_records": bid_records}
 
 def run_batch_bidding(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, config=None) -> Dict:
     """Mode A: Batch Bidding (Blind Auction)"""
@@ -200,7 +199,7 @@ async def run_flash_deal_async(seller: Agent, buyer: Agent, listing: Dict, marke
     必须马上决定：接受(ACCEPT) 或 拒绝(REJECT)。
     输出JSON: {{"action": "ACCEPT"|"REJECT", "reason": "..."}}
     """
-    resp = await safe_call_llm_async(prompt, {"action": "REJECT", "reason": "Pass"})
+    resp = await safe_call_llm_async(prompt, {"action": "REJECT", "reason": "Pass"}, priority="negotiation")
     action = resp.get("action", "REJECT").upper()
 
     if action == "ACCEPT" and flash_price <= buyer.preference.max_price:
@@ -270,56 +269,103 @@ def run_negotiation_session(seller: Agent, buyers: List[Agent], listing: Dict, m
 
     return {"outcome": "failed", "reason": "All negotiations failed"}
 
-async def run_negotiation_session_async(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, month: int, config=None, db_conn=None) -> Dict:
-    """Async Main Entry Point for Negotiation Phase"""
+async def run_negotiation_session_async(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, month: int,
+                                        config=None, mode: str = None) -> Dict:
+    """
+    Async Main Entry Point for Negotiation Phase.
+    `mode` comes from plan_negotiation_formats_async (planned for the whole month);
+    when omitted it is planned here for this single session.
+    """
     if not buyers:
         return {"outcome": "failed", "reason": "No valid buyers"}
 
-    market_hint = "买家众多" if len(buyers) > 1 else "单一买家"
-    mode = decide_negotiation_format(seller, buyers, market_hint)
+    if mode is None:
+        market_hint = "买家众多" if len(buyers) > 1 else "单一买家"
+        mode = (await plan_negotiation_formats_async([(seller, buyers, market_hint)], config))[0]
 
     # Simple Async Implementation: Support Classic Mode primarily for now
     # (Batch and Flash can be added later or reuse sync logic if no LLM calls inside those specific functions yet,
     # but run_batch_bidding DOES use LLM, so they should be async too. For urgency, we map everything to classic async or implement others)
 
-
-    consolidated_log = []
-
     if mode == "BATCH":
-        # ✅ Phase 3.3: Pass db_conn to record bids
-        return await run_batch_bidding_async(seller, buyers, listing, market, month, config, db_conn)
+        # ✅ Phase 3.3: Bids come back as result['bid_records']
+        return await run_batch_bidding_async(seller, buyers, listing, market, month, config)
 
     elif mode == "FLASH":
         # Pick one buyer to offer flash deal (e.g. first one or random)
         target_buyer = buyers[0]
         return await run_flash_deal_async(seller, target_buyer, listing, market)
 
-    elif mode == "CLASSIC":
-         for buyer in buyers:
-            # Await the async negotiate
-            result = await negotiate_async(buyer, seller, listing, market, len(buyers), config)
-            consolidated_log.extend(result.get('history', []))
-
-            if result['outcome'] == 'success':
-                result['buyer_id'] = buyer.id
-                result['mode'] = 'classic'
-                result['history'] = consolidated_log # Preserve prior failed attempts log too
-                return result
     else:
-        # Fallback to sync for unimplemented modes or implement them
-        # For this tier, let's just use Classic Async for all or fallback to sync wrapper
-        # But to gain performance, we really want async.
-        # Let's fallback to CLASSIC async for now to ensure coverage
-        for buyer in buyers:
-            result = await negotiate_async(buyer, seller, listing, market, len(buyers), config)
-            consolidated_log.extend(result.get('history', []))
+        # CLASSIC (and fallback for unknown modes) through the configured negotiation backend
+        backend = get_negotiation_backend(config)
+        concurrent_cfg = (config.negotiation.get('concurrent_classic', {}) if config else {}) or {}
+        if backend.name != "rule" and concurrent_cfg.get('enabled', False) and len(buyers) > 1:
+            return await run_concurrent_classic_async(seller, buyers, listing, market, config,
+                                                      max_parallel=concurrent_cfg.get('max_parallel_buyers', 8),
+                                                      backend=backend)
+
+        return await backend.classic_session(seller, buyers, listing, market)
+
+async def run_concurrent_classic_async(seller: Agent, buyers: List[Agent], listing: Dict, market: Market, config=None,
+                                      max_parallel: int = 8, backend: "NegotiationBackend" = None) -> Dict:
+    """
+    CLASSIC mode with one negotiation thread per buyer running in parallel (at most
+    `max_parallel` at a time, the next buyer starts when a thread fails). The seller
+    sees the best competing offer; the first successful thread wins (ties go to the
+    earlier buyer) and the remaining threads are cancelled.
+    Returns the same schema as the sequential path.
+    """
+    backend = backend or get_negotiation_backend(config)
+    competing_offers: Dict[int, float] = {}
+    queue = list(buyers)
+    running: Dict[asyncio.Task, Agent] = {}
+    order = {b.id: i for i, b in enumerate(buyers)}
+    consolidated_log = []
 
-            if result['outcome'] == 'success':
+    def start_next():
+        buyer = queue.pop(0)
+        task = asyncio.create_task(backend.negotiate(buyer, seller, listing, market, len(buyers),
+                                                     competing_offers=competing_offers))
+        running[task] = buyer
+
+    for _ in range(min(max(1, max_parallel), len(queue))):
+        start_next()
+
+    try:
+        while running:
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in sorted(done, key=lambda t: order[running[t].id]):
+                buyer = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.error(f"Negotiation thread for buyer {buyer.id} failed: {e}")
+                    result = {"outcome": "failed", "history": []}
+
+                if result['outcome'] == 'success' and winner is None:
+                    winner = (buyer, result)
+                else:
+                    consolidated_log.extend(result.get('history', []))
+
+            if winner:
+                buyer, result = winner
+                consolidated_log.extend(result.get('history', []))
                 result['buyer_id'] = buyer.id
                 result['mode'] = 'classic'
-                result['history'] = consolidated_log
+                result['history'] = consolidated_log # Preserve other threads' logs too
                 return result
 
+            while queue and len(running) < max(1, max_parallel):
+                start_next()
+    finally:
+        # Deal closed (or error): stop the remaining threads
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
     return {"outcome": "failed", "reason": "All negotiations failed", "history": consolidated_log}
 
 # --- 1. Seller Listing Logic ---
@@ -421,20 +467,22 @@ def generate_seller_listing(seller: Agent, property_data: Dict, market: Market,
 
 # --- 2. Buyer Matching Logic ---
 
-def match_property_for_buyer(buyer: Agent, listings: List[Dict], properties_map: Dict[int, Dict], ignore_zone: bool = False) -> Optional[Dict]:
+MATCH_BATCH_SYSTEM_PROMPT = """你是一个房地产市场模拟引擎，负责为多位买家各自挑选房源。
+【规则】
+1. 每位买家只能从自己的候选房源(candidates)中选择一套，或不选(null)。
+2. 结合买家需求、预算上限、区域与学区偏好做判断。
+3. 每位买家独立决策，互不影响。"""
+
+
+def build_buyer_shortlist(buyer: Agent, listings: List[Dict], properties_map: Dict[int, Dict],
+                          ignore_zone: bool = False, limit: int = 5) -> List[Dict]:
     """
-    Find the best matching property for a buyer from active listings.
-    listings: List of listing dicts (from property_listings table)
-    properties_map: property_id -> property_data dict (full details)
-    ignore_zone: If True, skip zone matching (for desperation fallback)
+    Rule-based pre-filter for a buyer: zone, price (+20% negotiation buffer), bedrooms, school.
+    Returns up to `limit` cheapest candidate listings.
     """
     pref = buyer.preference
     candidates = []
 
-    # print(f"\n=== DEBUG Buyer {buyer.id} Matching ===")
-    # print(f"Buyer Zone: {pref.target_zone}, Max Price: {pref.max_price:,.0f} (IgnoreZone={ignore_zone})")
-    # print(f"Received {len(listings)} listings for matching")
-
     for listing in listings:
         prop = properties_map.get(listing['property_id'])
         if not prop:
@@ -461,27 +509,127 @@ def match_property_for_buyer(buyer: Agent, listings: List[Dict], properties_map:
 
         candidates.append(listing)
 
-    if not candidates:
+    # Heuristic: Filter to top N cheapest to save tokens, but let LLM decide among them.
+    candidates.sort(key=lambda x: x['listed_price'])
+    return candidates[:limit]
+
+
+class ListingIndex:
+    """
+    Per-month vectorized index over active listings for buyer matching.
+
+    Listings are kept per zone (plus one "all zones" group) as NumPy arrays
+    sorted by price. A buyer's shortlist is the first K entries of the group
+    filtered by bedrooms/school mask, cut at the budget by binary search —
+    the same result as build_buyer_shortlist without scanning every listing.
+    """
+    ALL_ZONES = None
+
+    def __init__(self, listings: List[Dict], properties_map: Dict[int, Dict]):
+        rows = [(l, properties_map[l['property_id']]) for l in listings if l['property_id'] in properties_map]
+        self.listings = [l for l, _ in rows]
+        self.size = len(rows)
+
+        prices = np.array([l['listed_price'] for l, _ in rows], dtype=np.float64)
+        bedrooms = np.array([p.get('bedrooms', 999) for _, p in rows], dtype=np.float64)
+        school = np.array([bool(p.get('is_school_district', False)) for _, p in rows], dtype=bool)
+        zones = np.array([p['zone'] for _, p in rows], dtype=object)
+
+        # Stable sort keeps listing order for equal prices (same as list.sort)
+        order = np.argsort(prices, kind='stable')
+        self._groups = {self.ALL_ZONES: order}
+        for zone in set(zones.tolist()):
+            self._groups[zone] = order[zones[order] == zone]
+
+        self._prices = prices
+        self._bedrooms = bedrooms
+        self._school = school
+        # (zone, min_bedrooms, needs_school) -> (positions, prices), both sorted by price
+        self._filtered = {}
+
+    def _filtered_group(self, zone, min_beds, needs_school):
+        key = (zone, min_beds, needs_school)
+        cached = self._filtered.get(key)
+        if cached is None:
+            group = self._groups.get(zone)
+            if group is None:
+                group = np.empty(0, dtype=np.int64)
+            mask = self._bedrooms[group] >= min_beds
+            if needs_school:
+                mask &= self._school[group]
+            positions = group[mask]
+            cached = (positions, self._prices[positions])
+            self._filtered[key] = cached
+        return cached
+
+    @staticmethod
+    def _buyer_key(buyer: Agent, ignore_zone: bool):
+        pref = buyer.preference
+        zone = pref.target_zone if (pref.target_zone and not ignore_zone) else ListingIndex.ALL_ZONES
+        return zone, getattr(pref, 'min_bedrooms', 1), bool(getattr(pref, 'need_school_district', False))
+
+    def candidates(self, buyer: Agent, k: int = 5, ignore_zone: bool = False) -> List[Dict]:
+        """Top-K cheapest listings this buyer can consider (listed_price <= max_price * 1.2)."""
+        positions, prices = self._filtered_group(*self._buyer_key(buyer, ignore_zone))
+        cut = int(np.searchsorted(prices, buyer.preference.max_price * 1.2, side='right'))
+        return [self.listings[i] for i in positions[:min(k, cut)]]
+
+    def batch_candidates(self, buyers: List[Agent], k: int = 5, ignore_zone: bool = False) -> Dict[int, List[Dict]]:
+        """candidates() for all buyers at once: one vectorized binary search per filter group."""
+        groups = {}
+        for buyer in buyers:
+            groups.setdefault(self._buyer_key(buyer, ignore_zone), []).append(buyer)
+
+        result = {}
+        for key, group_buyers in groups.items():
+            positions, prices = self._filtered_group(*key)
+            limits = np.array([b.preference.max_price * 1.2 for b in group_buyers], dtype=np.float64)
+            cuts = np.minimum(np.searchsorted(prices, limits, side='right'), k)
+            for buyer, cut in zip(group_buyers, cuts.tolist()):
+                result[buyer.id] = [self.listings[i] for i in positions[:cut]]
+        return result
+
+
+def _format_shortlist_prop(listing: Dict, properties_map: Dict[int, Dict]) -> Dict:
+    p = properties_map.get(listing['property_id'])
+    return {
+        "id": listing['property_id'],
+        "zone": p['zone'],
+        "area": p['building_area'],
+        "price": listing['listed_price'],
+        "school": "Yes" if p.get('is_school_district') else "No",
+        "type": p.get('property_type', 'N/A')
+    }
+
+
+def _resolve_selection(shortlist: List[Dict], result: Dict) -> Optional[Dict]:
+    """Map an LLM selection back to a listing. Null = no purchase, unknown id = cheapest."""
+    selected_id = result.get("selected_property_id")
+    if selected_id is None:
         return None
 
-    # 5. LLM Selection from Candidates
-    # Heuristic: Filter to top 5 cheapest to save tokens, but let LLM decide among them.
-    candidates.sort(key=lambda x: x['listed_price'])
-    shortlist = candidates[:5]
+    for c in shortlist:
+        if str(c['property_id']) == str(selected_id):
+            return c
+    return shortlist[0]
 
-    # helper to format prop for prompt
-    def format_prop(l):
-        p = properties_map.get(l['property_id'])
-        return {
-            "id": l['property_id'],
-            "zone": p['zone'],
-            "area": p['building_area'],
-            "price": l['listed_price'],
-            "school": "Yes" if p.get('is_school_district') else "No",
-            "type": p.get('property_type', 'N/A')
-        }
 
-    props_info = [format_prop(c) for c in shortlist]
+def match_property_for_buyer(buyer: Agent, listings: List[Dict], properties_map: Dict[int, Dict],
+                             ignore_zone: bool = False) -> Optional[Dict]:
+    """
+    Find the best matching property for a buyer from active listings.
+    listings: List of listing dicts (from property_listings table)
+    properties_map: property_id -> property_data dict (full details)
+    ignore_zone: If True, skip zone matching (for desperation fallback)
+    """
+    pref = buyer.preference
+    shortlist = build_buyer_shortlist(buyer, listings, properties_map, ignore_zone)
+
+    if not shortlist:
+        return None
+
+    # 5. LLM Selection from Candidates
+    props_info = [_format_shortlist_prop(c, properties_map) for c in shortlist]
 
     prompt = f"""
     你是买家 {buyer.name}。
@@ -500,18 +648,83 @@ def match_property_for_buyer(buyer: Agent, listings: List[Dict], properties_map:
     default_resp = {"selected_property_id": shortlist[0]['property_id'], "reason": "Default cheapest"}
 
     result = safe_call_llm(prompt, default_resp)
-    selected_id = result.get("selected_property_id")
+    return _resolve_selection(shortlist, result)
 
-    if selected_id:
-        for c in shortlist:
-            if c['property_id'] == selected_id:
-                return c
 
-    # Fallback/Logic for explicit None
-    if selected_id is None:
-        return None
+async def _match_buyer_batch_async(batch: List[tuple], properties_map: Dict[int, Dict]) -> Dict[int, Optional[Dict]]:
+    """One structured LLM request for a batch of (buyer, shortlist) pairs."""
+    buyer_summaries = []
+    for buyer, shortlist in batch:
+        pref = buyer.preference
+        buyer_summaries.append({
+            "buyer_id": buyer.id,
+            "name": buyer.name,
+            "need": buyer.story.housing_need,
+            "budget_wan": round(pref.max_price / 10000),
+            "target_zone": pref.target_zone,
+            "need_school": bool(pref.need_school_district),
+            "candidates": [_format_shortlist_prop(c, properties_map) for c in shortlist],
+        })
 
-    return shortlist[0]
+    prompt = f"""
+    【任务】
+    以下每位买家都有一组候选房源（已按价格排序）。请分别为每位买家选择一套最符合其需求的房产；如果都不满意，可以不选(null)。
+
+    【输出要求】
+    输出JSON对象，matches 中每位买家一条:
+    {{"matches": [{{"buyer_id": 123, "selected_property_id": 456, "reason": "..."}}]}}
+
+    【买家列表】({len(batch)}人):
+    {json.dumps(buyer_summaries, ensure_ascii=False)}
+    """
+
+    response = await safe_call_llm_async(prompt, {"matches": []}, system_prompt=MATCH_BATCH_SYSTEM_PROMPT,
+                                         priority="negotiation")
+    decisions = response.get("matches", []) if isinstance(response, dict) else response
+    if not isinstance(decisions, list):
+        decisions = []
+    by_buyer = {str(d.get("buyer_id")): d for d in decisions if isinstance(d, dict)}
+
+    # Buyers the LLM skipped (or a failed call) fall back to the cheapest candidate
+    return {
+        buyer.id: _resolve_selection(shortlist, by_buyer.get(str(buyer.id),
+                                                             {"selected_property_id": shortlist[0]['property_id']}))
+        for buyer, shortlist in batch
+    }
+
+
+async def batched_match_properties_async(buyers: List[Agent], listings: List[Dict], properties_map: Dict[int, Dict],
+                                         batch_size: int = 20, ignore_zone: bool = False,
+                                         listing_index: ListingIndex = None) -> Dict[int, Optional[Dict]]:
+    """
+    Async batched counterpart of match_property_for_buyer.
+    Shortlists come from the vectorized ListingIndex (built here if not passed), then many
+    buyers' shortlists are sent in one structured request; batches run concurrently under
+    the global LLM scheduler.
+    Returns: buyer_id -> selected listing (or None)
+    """
+    if listing_index is None:
+        listing_index = ListingIndex(listings, properties_map)
+    shortlists = listing_index.batch_candidates(buyers, ignore_zone=ignore_zone)
+
+    matches = {}
+    pending = []
+    for buyer in buyers:
+        shortlist = shortlists[buyer.id]
+        if shortlist:
+            pending.append((buyer, shortlist))
+        else:
+            matches[buyer.id] = None
+
+    if not pending:
+        return matches
+
+    batch_size = max(1, int(batch_size))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    results = await asyncio.gather(*[_match_buyer_batch_async(b, properties_map) for b in batches])
+    for r in results:
+        matches.update(r)
+    return matches
 
 # --- 3. Negotiation Logic (Phase 2.2 & P3) ---
 
@@ -688,9 +901,12 @@ def negotiate(buyer: Agent, seller: Agent, listing: Dict, market: Market, potent
 
     return {"outcome": "failed", "reason": "Max rounds reached", "history": negotiation_log, "final_price": 0}
 
-async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Market, potential_buyers_count: int = 10, config=None) -> Dict:
+async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Market, potential_buyers_count: int = 10,
+                          config=None, competing_offers: Optional[Dict[int, float]] = None) -> Dict:
     """
     Async version of negotiate.
+    `competing_offers` (buyer_id -> latest offer) is shared by parallel threads of the
+    same listing so the seller can see the best competing offer.
     """
     # 1. Configuration & Context Setup
     neg_cfg = config.negotiation if config else {}
@@ -757,7 +973,9 @@ async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Ma
 
         输出JSON: {{"action": "OFFER"|"ACCEPT"|"WITHDRAW", "offer_price": 0, "reason": "..."}}
         """
-        buyer_resp = await safe_call_llm_async(buyer_prompt, {"action": "WITHDRAW", "offer_price": 0, "reason": "LLM Error"}, system_prompt="你是精明的购房者。")
+        buyer_resp = await safe_call_llm_async(
+            buyer_prompt, {"action": "WITHDRAW", "offer_price": 0, "reason": "LLM Error"},
+            system_prompt="你是精明的购房者。", priority="negotiation")
         buyer_action = buyer_resp.get("action", "WITHDRAW")
 
         if buyer_action == "OFFER":
@@ -772,6 +990,16 @@ async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Ma
             "round": r, "party": "buyer", "action": buyer_action, "price": buyer_offer_price, "content": buyer_resp.get("reason", "")
         })
 
+        competing_hint = ""
+        if competing_offers is not None:
+            if buyer_action == "WITHDRAW":
+                competing_offers.pop(buyer.id, None)
+            else:
+                competing_offers[buyer.id] = buyer_offer_price
+            others = [p for bid, p in competing_offers.items() if bid != buyer.id]
+            if others:
+                competing_hint = f"\n        - 其他买家最高出价: {max(others):,.0f} (共{len(others)}位买家在同时谈判)"
+
         if buyer_action == "WITHDRAW":
             return {"outcome": "failed", "reason": "Buyer withdrew", "history": negotiation_log, "final_price": 0}
         if buyer_action == "ACCEPT":
@@ -788,7 +1016,7 @@ async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Ma
         【交易背景】
         - 你的心理底价: {min_price:,.0f}
         - 买方最新出价: {buyer_offer_price:,.0f}
-        - 当前你的报价: {current_price:,.0f}
+        - 当前你的报价: {current_price:,.0f}{competing_hint}
 
         【市场提示】{market_hint}{seller_final_hint}
         {'【趋势建议】市场上涨中，可以坚守价格或适当提价。' if market_condition == 'undersupply' else ''}
@@ -804,7 +1032,9 @@ async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Ma
 
         输出JSON: {{"action": "ACCEPT"|"COUNTER"|"REJECT", "counter_price": 0, "reason": "..."}}
         """
-        seller_resp = await safe_call_llm_async(seller_prompt, {"action": "REJECT", "counter_price": 0, "reason": "LLM Error"}, system_prompt="你是理性的房产卖家。")
+        seller_resp = await safe_call_llm_async(
+            seller_prompt, {"action": "REJECT", "counter_price": 0, "reason": "LLM Error"},
+            system_prompt="你是理性的房产卖家。", priority="negotiation")
         seller_action = seller_resp.get("action", "REJECT")
 
         if seller_action == "COUNTER":
@@ -824,6 +1054,242 @@ async def negotiate_async(buyer: Agent, seller: Agent, listing: Dict, market: Ma
 
     return {"outcome": "failed", "reason": "Max rounds reached", "history": negotiation_log, "final_price": 0}
 
+# --- 3b. Negotiation Backends (llm / rule / hybrid) ---
+
+NEGOTIATION_STYLES = ("aggressive", "conservative", "balanced", "desperate")
+
+
+class NegotiationBackend(ABC):
+    """
+    Pluggable engine for one-on-one (CLASSIC) negotiations.
+    Selected by negotiation.backend: llm (default) | rule | hybrid.
+    Results use the negotiate_async schema: outcome, final_price, history[, reason].
+    Subclasses must implement negotiate(); classic_session() may be overridden.
+    """
+    name = "base"
+
+    def __init__(self, config=None):
+        self.config = config
+        self.neg_cfg = config.negotiation if config else {}
+
+    @abstractmethod
+    async def negotiate(self, buyer: Agent, seller: Agent, listing: Dict, market: Market,
+                        potential_buyers_count: int = 10, competing_offers: Optional[Dict[int, float]] = None) -> Dict:
+        """One buyer/seller negotiation over `listing`."""
+
+    async def classic_session(self, seller: Agent, buyers: List[Agent], listing: Dict, market: Market) -> Dict:
+        """Try buyers in order until one deal closes (sequential CLASSIC)."""
+        consolidated_log = []
+        for buyer in buyers:
+            result = await self.negotiate(buyer, seller, listing, market, len(buyers))
+            consolidated_log.extend(result.get('history', []))
+
+            if result['outcome'] == 'success':
+                result['buyer_id'] = buyer.id
+                result['mode'] = 'classic'
+                result['history'] = consolidated_log # Preserve prior failed attempts log too
+                return result
+
+        return {"outcome": "failed", "reason": "All negotiations failed", "history": consolidated_log}
+
+
+class LLMNegotiationBackend(NegotiationBackend):
+    """Every negotiation round is decided by the LLM (negotiate_async)."""
+    name = "llm"
+
+    async def negotiate(self, buyer, seller, listing, market, potential_buyers_count=10, competing_offers=None):
+        return await negotiate_async(buyer, seller, listing, market, potential_buyers_count, self.config,
+                                     competing_offers=competing_offers)
+
+
+class RuleNegotiationBackend(NegotiationBackend):
+    """
+    Deterministic, LLM-free negotiation following style-specific concession curves.
+
+    Uses the same inputs as negotiate_async (rounds_range, heuristic_gap_threshold,
+    market_conditions.buyer_lowball, min_price, buyer max_price). Each round the buyer
+    moves a style-dependent share of the way from its offer toward min(ask, max_price),
+    the seller a share of the way from its ask toward max(min_price, offer); in the
+    final round the seller accepts any offer at or above min_price. All buyers of a
+    listing are evaluated at once with numpy.
+    """
+    name = "rule"
+
+    DEFAULT_CONCESSION = {"aggressive": 0.2, "conservative": 0.3, "balanced": 0.4, "desperate": 0.7}
+    # Market condition scales concessions: (buyer, seller)
+    MARKET_SCALE = {"undersupply": (1.5, 0.5), "oversupply": (0.5, 1.5), "balanced": (1.0, 1.0)}
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        rule_cfg = self.neg_cfg.get('rule_backend', {}) or {}
+        self.concession = {**self.DEFAULT_CONCESSION, **(rule_cfg.get('concession', {}) or {})}
+
+    @staticmethod
+    def _style(agent: Agent) -> str:
+        style = getattr(agent.story, 'negotiation_style', None) or agent.story.investment_style
+        return style if style in NEGOTIATION_STYLES else "balanced"
+
+    def negotiate_many(self, buyers: List[Agent], seller: Agent, listing: Dict, market: Market,
+                       potential_buyers_count: int = 10) -> List[Dict]:
+        """Negotiate `listing` independently with every buyer (vectorised over buyers)."""
+        n = len(buyers)
+        if n == 0:
+            return []
+
+        rounds_range = self.neg_cfg.get('rounds_range', [2, 3])
+        gap_threshold = self.neg_cfg.get('heuristic_gap_threshold', 0.20)
+        market_condition = get_market_condition(market, listing['zone'], potential_buyers_count)
+        cond_cfg = self.neg_cfg.get('market_conditions', {}).get(market_condition, {})
+        lowball_ratio = cond_cfg.get('buyer_lowball', 0.90)
+        buyer_scale, seller_scale = self.MARKET_SCALE.get(market_condition, (1.0, 1.0))
+
+        listed = float(listing['listed_price'])
+        min_price = float(listing['min_price'])
+        buyer_max = np.array([b.preference.max_price for b in buyers], dtype=np.float64)
+        rounds = np.array([random.randint(*rounds_range) for _ in buyers])
+        b_rate = np.array([self.concession.get(self._style(b), 0.4) for b in buyers]) * buyer_scale
+        s_rate = np.full(n, self.concession.get(self._style(seller), 0.4) * seller_scale)
+        b_rate = np.clip(b_rate, 0.0, 1.0)
+        s_rate = np.clip(s_rate, 0.0, 1.0)
+
+        ask = np.full(n, listed)
+        offer = np.minimum(listed * lowball_ratio, buyer_max)
+        final_price = np.zeros(n)
+        # 0 = open, 1 = success, 2 = failed
+        state = np.zeros(n, dtype=np.int8)
+        reasons = [""] * n
+        histories = [[] for _ in range(n)]
+
+        precheck_fail = min_price > buyer_max * (1 + gap_threshold)
+        state[precheck_fail] = 2
+        for i in np.flatnonzero(precheck_fail):
+            reasons[i] = f"Pre-check: Price gap {(listed - buyer_max[i]) / listed:.1%} too large"
+
+        for r in range(1, int(rounds.max()) + 1):
+            active = (state == 0) & (rounds >= r)
+            if not active.any():
+                break
+            is_final = rounds == r
+
+            # --- Buyer Turn ---
+            if r > 1:
+                target = np.minimum(ask, buyer_max)
+                offer = np.where(active, offer + b_rate * (target - offer), offer)
+            buyer_accept = active & (offer >= ask) & (ask <= buyer_max)
+            for i in np.flatnonzero(active):
+                action = "ACCEPT" if buyer_accept[i] else "OFFER"
+                price = ask[i] if buyer_accept[i] else offer[i]
+                histories[i].append({"round": r, "party": "buyer", "action": action, "price": float(price),
+                                     "content": "rule"})
+            final_price = np.where(buyer_accept, ask, final_price)
+            state[buyer_accept] = 1
+
+            # --- Seller Turn ---
+            active = active & ~buyer_accept
+            next_ask = ask - s_rate * (ask - np.maximum(min_price, offer))
+            seller_accept = active & ((next_ask <= offer) | (is_final & (offer >= min_price)))
+            seller_reject = active & is_final & ~seller_accept
+            for i in np.flatnonzero(active):
+                if seller_accept[i]:
+                    action, price = "ACCEPT", offer[i]
+                elif seller_reject[i]:
+                    action, price = "REJECT", ask[i]
+                else:
+                    action, price = "COUNTER", next_ask[i]
+                histories[i].append({"round": r, "party": "seller", "action": action, "price": float(price),
+                                     "content": "rule"})
+            ask = np.where(active & ~seller_accept & ~seller_reject, next_ask, ask)
+            final_price = np.where(seller_accept, offer, final_price)
+            state[seller_accept] = 1
+            state[seller_reject] = 2
+            for i in np.flatnonzero(seller_reject):
+                reasons[i] = "Seller rejected"
+
+        results = []
+        for i in range(n):
+            if state[i] == 1:
+                results.append({"outcome": "success", "final_price": float(final_price[i]), "history": histories[i]})
+            else:
+                results.append({"outcome": "failed", "reason": reasons[i] or "Max rounds reached",
+                                "history": histories[i], "final_price": 0})
+        return results
+
+    async def negotiate(self, buyer, seller, listing, market, potential_buyers_count=10, competing_offers=None):
+        return self.negotiate_many([buyer], seller, listing, market, potential_buyers_count)[0]
+
+    async def classic_session(self, seller, buyers, listing, market):
+        # Pair outcomes are independent, so evaluating all buyers at once and taking
+        # the first success is equivalent to the sequential loop.
+        consolidated_log = []
+        for buyer, result in zip(buyers, self.negotiate_many(buyers, seller, listing, market, len(buyers))):
+            consolidated_log.extend(result['history'])
+            if result['outcome'] == 'success':
+                result['buyer_id'] = buyer.id
+                result['mode'] = 'classic'
+                result['history'] = consolidated_log
+                return result
+        return {"outcome": "failed", "reason": "All negotiations failed", "history": consolidated_log}
+
+
+class HybridNegotiationBackend(RuleNegotiationBackend):
+    """
+    Rule engine by default; the LLM negotiates only close or high-value deals:
+    |buyer max_price - min_price| <= close_margin * listed_price, or
+    listed_price >= high_value_threshold.
+    """
+    name = "hybrid"
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        hybrid_cfg = self.neg_cfg.get('hybrid', {}) or {}
+        self.close_margin = hybrid_cfg.get('close_margin', 0.05)
+        self.high_value_threshold = hybrid_cfg.get('high_value_threshold', 10_000_000)
+        self.llm = LLMNegotiationBackend(config)
+
+    def needs_llm(self, buyer: Agent, listing: Dict) -> bool:
+        listed = listing['listed_price']
+        if listed >= self.high_value_threshold:
+            return True
+        return abs(buyer.preference.max_price - listing['min_price']) <= self.close_margin * listed
+
+    async def negotiate(self, buyer, seller, listing, market, potential_buyers_count=10, competing_offers=None):
+        if self.needs_llm(buyer, listing):
+            return await self.llm.negotiate(buyer, seller, listing, market, potential_buyers_count, competing_offers)
+        return self.negotiate_many([buyer], seller, listing, market, potential_buyers_count)[0]
+
+    async def classic_session(self, seller, buyers, listing, market):
+        rule_buyers = [b for b in buyers if not self.needs_llm(b, listing)]
+        rule_results = dict(zip((b.id for b in rule_buyers),
+                                self.negotiate_many(rule_buyers, seller, listing, market, len(buyers))))
+        consolidated_log = []
+        for buyer in buyers:
+            result = rule_results.get(buyer.id)
+            if result is None:
+                result = await self.llm.negotiate(buyer, seller, listing, market, len(buyers))
+            consolidated_log.extend(result.get('history', []))
+            if result['outcome'] == 'success':
+                result['buyer_id'] = buyer.id
+                result['mode'] = 'classic'
+                result['history'] = consolidated_log
+                return result
+        return {"outcome": "failed", "reason": "All negotiations failed", "history": consolidated_log}
+
+
+NEGOTIATION_BACKENDS = {
+    "llm": LLMNegotiationBackend,
+    "rule": RuleNegotiationBackend,
+    "hybrid": HybridNegotiationBackend,
+}
+
+
+def get_negotiation_backend(config=None) -> NegotiationBackend:
+    name = (config.negotiation.get('backend', 'llm') if config else 'llm') or 'llm'
+    backend_cls = NEGOTIATION_BACKENDS.get(name)
+    if backend_cls is None:
+        logger.warning(f"Unknown negotiation backend '{name}', using llm")
+        backend_cls = LLMNegotiationBackend
+    return backend_cls(config)
+
 # --- 4. Transaction Execution Logic ---
 
 def execute_transaction(buyer: Agent, seller: Agent, property_data: Dict, final_price: float, market: Market = None, config=None) -> Optional[Dict]:
@@ -2,11 +2,28 @@
 Agent行为日志记录器 - 按agent_id和时间排序完整记录LLM决策
 用于研究分析Agent的思维过程和决策逻辑
 """
-import csv
 import os
+import sqlite3
+import time
+from collections import defaultdict, deque
 from datetime import datetime
 from typing import Any, Dict, List
 
+from utils.buffered_writer import BufferedRowWriter
+
+# 每个Agent保留的谈判记录条数 (get_agent_history 只展示最近5条)
+NEGOTIATION_HISTORY_ENTRIES = 5
+
+DECISION_HEADER = [
+    "月份", "Agent_ID", "姓名", "角色",
+    "行动描述", "目标区域", "价格预期",
+    "紧迫程度", "推理过程", "记录时间"
+]
+NEGOTIATION_HEADER = [
+    "月份", "谈判ID", "轮次", "角色", "Agent_ID",
+    "动作", "价格", "对外发言", "内心想法", "记录时间"
+]
+
 
 class BehaviorLogger:
     """
@@ -15,9 +32,18 @@ class BehaviorLogger:
     记录内容：
     1. agent_decisions.csv - Agent月度决策（角色选择、策略描述、推理过程）
     2. negotiations_detail.csv - 谈判详情（每轮对话、内心想法）
+
+    get_agent_history 不再读取CSV：log_decision/log_negotiation 同时写入内存中
+    按Agent的环形缓冲 (决策保留 history_months 条, 谈判保留最近5条)。
+    传入 db_conn 时，缓冲条目也会写入 agent_history 表 (flush_history 批量写入，
+    调用方提交)，断点续跑时用 rebuild_history 重建缓冲。
+
+    CSV 由 BufferedRowWriter 缓冲并在后台线程批量写入 (flush_rows 条或每 flush_interval 秒)；
+    月末调用 flush()，结束时调用 close()。parquet=True 时同时输出同名 .parquet (需 pyarrow)。
     """
 
-    def __init__(self, results_dir: str = "results"):
+    def __init__(self, results_dir: str = "results", history_months: int = 3, db_conn: sqlite3.Connection = None,
+                 flush_rows: int = 1000, flush_interval: float = 2.0, parquet: bool = False):
         self.results_dir = results_dir
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.output_dir = os.path.join(results_dir, f"result_{self.session_id}")
@@ -30,26 +56,39 @@ class BehaviorLogger:
         # 计数器
         self.negotiation_counter = 0
 
-        self._init_csv_files()
-
-    def _init_csv_files(self):
-        """初始化CSV文件头"""
-        # 决策日志
-        with open(self.decisions_file, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "月份", "Agent_ID", "姓名", "角色",
-                "行动描述", "目标区域", "价格预期",
-                "紧迫程度", "推理过程", "记录时间"
-            ])
+        # 按Agent的历史环形缓冲: agent_id -> deque[(月份, 角色, 行动描述, 紧迫程度)] / deque[(月份, 动作, 内心想法)]
+        self.history_months = history_months
+        self._decision_history = defaultdict(lambda: deque(maxlen=self.history_months))
+        self._negotiation_history = defaultdict(lambda: deque(maxlen=NEGOTIATION_HISTORY_ENTRIES))
+        self.db_conn = db_conn
+        self._pending_history_rows = []
 
-        # 谈判详情日志
-        with open(self.negotiations_file, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "月份", "谈判ID", "轮次", "角色", "Agent_ID",
-                "动作", "价格", "对外发言", "内心想法", "记录时间"
-            ])
+        # 记录时间按秒缓存，避免每行格式化一次
+        self._ts_second = None
+        self._ts_text = ""
+
+        # 初始化CSV文件头 (缓冲写入)
+        self._decision_writer = BufferedRowWriter(self.decisions_file, DECISION_HEADER,
+                                                  flush_rows, flush_interval, parquet)
+        self._negotiation_writer = BufferedRowWriter(self.negotiations_file, NEGOTIATION_HEADER,
+                                                     flush_rows, flush_interval, parquet)
+
+    def _timestamp(self) -> str:
+        second = int(time.time())
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self._ts_text
+
+    def flush(self):
+        """将缓冲中的日志写盘 (月末调用)"""
+        self._decision_writer.flush()
+        self._negotiation_writer.flush()
+
+    def close(self):
+        """写完剩余日志并停止后台写线程"""
+        self._decision_writer.close()
+        self._negotiation_writer.close()
 
     def log_decision(self, month: int, agent: Any, decision: Dict):
         """
@@ -60,20 +99,23 @@ class BehaviorLogger:
             agent: Agent对象
             decision: LLM返回的决策字典
         """
-        with open(self.decisions_file, 'a', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                month,
-                agent.id,
-                getattr(agent, 'name', f'Agent_{agent.id}'),
-                decision.get('role', 'OBSERVER'),
-                decision.get('action_description', ''),
-                decision.get('target_zone', ''),
-                decision.get('price_expectation', ''),
-                decision.get('urgency', 0.5),
-                decision.get('reasoning', '').replace('\n', ' '),  # 去除换行
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            ])
+        role = decision.get('role', 'OBSERVER')
+        action = decision.get('action_description', '')
+        urgency = decision.get('urgency', 0.5)
+        self._remember(agent.id, month, 'decision', role, action, urgency, '')
+
+        self._decision_writer.write([
+            month,
+            agent.id,
+            getattr(agent, 'name', f'Agent_{agent.id}'),
+            role,
+            action,
+            decision.get('target_zone', ''),
+            decision.get('price_expectation', ''),
+            urgency,
+            decision.get('reasoning', '').replace('\n', ' '),  # 去除换行
+            self._timestamp()
+        ])
 
     def log_negotiation(self, month: int, buyer_id: int, seller_id: int,
                         property_id: int, history: List[Dict],
@@ -93,60 +135,105 @@ class BehaviorLogger:
         self.negotiation_counter += 1
         neg_id = f"{month}_{self.negotiation_counter}"
 
-        with open(self.negotiations_file, 'a', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-
-            # 写入每轮谈判记录
-            for entry in history:
-                party = entry.get('party', '')
-                agent_id = buyer_id if party == 'buyer' else seller_id
-
-                # Handle None values safely
-                price_val = entry.get('price')
-                message_val = entry.get('message') or ''
-                thought_val = entry.get('thought') or ''
-
-                writer.writerow([
-                    month,
-                    neg_id,
-                    entry.get('round', 0),
-                    "买方" if party == 'buyer' else "卖方",
-                    agent_id,
-                    entry.get('action', ''),
-                    price_val if price_val is not None else '',
-                    str(message_val).replace('\n', ' '),
-                    str(thought_val).replace('\n', ' '),
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                ])
-
-            # 写入谈判结果汇总行
-            # Handle None values
-            safe_price = float(final_price) if final_price is not None else 0
-
-            if outcome == 'success':
-                result_text = f'✅ 成交 ¥{safe_price:,.0f}'
-            elif outcome == 'failed':
-                result_text = '❌ 失败'
-            elif outcome == 'max_rounds':
-                result_text = '⏱️ 超时'
-            else:
-                result_text = str(outcome)
+        timestamp = self._timestamp()
+        rows = []
+
+        # 写入每轮谈判记录
+        for entry in history:
+            party = entry.get('party', '')
+            agent_id = buyer_id if party == 'buyer' else seller_id
+
+            # Handle None values safely
+            price_val = entry.get('price')
+            message_val = entry.get('message') or ''
+            thought_val = entry.get('thought') or ''
+
+            self._remember(agent_id, month, 'negotiation', '', entry.get('action', ''), None,
+                           str(thought_val).replace('\n', ' '))
 
-            writer.writerow([
-                month, neg_id, "结果", "-", "-",
-                result_text, safe_price,
-                f"房产{property_id}: 买家{buyer_id} vs 卖家{seller_id}",
-                "", datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows.append([
+                month,
+                neg_id,
+                entry.get('round', 0),
+                "买方" if party == 'buyer' else "卖方",
+                agent_id,
+                entry.get('action', ''),
+                price_val if price_val is not None else '',
+                str(message_val).replace('\n', ' '),
+                str(thought_val).replace('\n', ' '),
+                timestamp
             ])
 
+        # 写入谈判结果汇总行
+        # Handle None values
+        safe_price = float(final_price) if final_price is not None else 0
+
+        if outcome == 'success':
+            result_text = f'✅ 成交 ¥{safe_price:,.0f}'
+        elif outcome == 'failed':
+            result_text = '❌ 失败'
+        elif outcome == 'max_rounds':
+            result_text = '⏱️ 超时'
+        else:
+            result_text = str(outcome)
+
+        rows.append([
+            month, neg_id, "结果", "-", "-",
+            result_text, safe_price,
+            f"房产{property_id}: 买家{buyer_id} vs 卖家{seller_id}",
+            "", timestamp
+        ])
+        self._negotiation_writer.write_many(rows)
+
     def get_output_dir(self) -> str:
         """获取输出目录路径"""
         return self.output_dir
 
+    def _remember(self, agent_id: int, month: int, kind: str, role: str, action: str, urgency, thought: str):
+        """写入内存环形缓冲 (以及待写入 agent_history 的队列)"""
+        if kind == 'decision':
+            self._decision_history[agent_id].append((month, role, action, urgency))
+        else:
+            self._negotiation_history[agent_id].append((month, action, thought))
+        if self.db_conn is not None:
+            self._pending_history_rows.append((agent_id, month, kind, role, action, urgency, thought))
+
+    def flush_history(self) -> int:
+        """批量写入缓冲中的历史条目到 agent_history (调用方提交)"""
+        if self.db_conn is None or not self._pending_history_rows:
+            return 0
+        rows, self._pending_history_rows = self._pending_history_rows, []
+        self.db_conn.executemany("""
+            INSERT INTO agent_history (agent_id, month, kind, role, action, urgency, thought)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        return len(rows)
+
+    def rebuild_history(self, last_month: int) -> int:
+        """断点续跑: 从 agent_history 读取最近 history_months 个月的条目重建环形缓冲"""
+        if self.db_conn is None:
+            return 0
+        self._decision_history.clear()
+        self._negotiation_history.clear()
+        rows = self.db_conn.execute("""
+            SELECT agent_id, month, kind, role, action, urgency, thought
+            FROM agent_history
+            WHERE month > ? AND month <= ?
+            ORDER BY id
+        """, (last_month - self.history_months, last_month)).fetchall()
+        for agent_id, month, kind, role, action, urgency, thought in rows:
+            if kind == 'decision':
+                self._decision_history[agent_id].append((month, role, action, urgency))
+            else:
+                self._negotiation_history[agent_id].append((month, action, thought))
+        return len(rows)
+
     def get_agent_history(self, agent_id: int, max_months: int = 3) -> str:
         """
         获取指定Agent最近N个月的决策历史和谈判历史（用于构建LLM上下文）
 
+        只读内存缓冲，不访问磁盘；max_months 超过 history_months 时按 history_months 截断。
+
         Args:
             agent_id: Agent ID
             max_months: 最多返回几个月的记录
@@ -156,43 +243,17 @@ class BehaviorLogger:
         """
         history_lines = []
 
-        # 1. 获取决策历史
-        if os.path.exists(self.decisions_file):
-            try:
-                decisions = []
-                with open(self.decisions_file, 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if str(row.get('Agent_ID', '')) == str(agent_id):
-                            decisions.append(row)
-
-                # Filter recent
-                recent_decisions = decisions[-max_months:] if len(decisions) > max_months else decisions
-                for r in recent_decisions:
-                    history_lines.append(f"- [月度决策] 第{r.get('月份', '?')}月: [{r.get('角色', '?')}] {r.get('行动描述', '')} (紧迫度:{r.get('紧迫程度', '?')})")
-            except Exception:
-                pass
-
-        # 2. 获取谈判历史
-        if os.path.exists(self.negotiations_file):
-            try:
-                negotiations = []
-                with open(self.negotiations_file, 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if str(row.get('Agent_ID', '')) == str(agent_id):
-                            negotiations.append(row)
-
-                # Filter recent negotiations (limit to last 5 entries to save tokens)
-                recent_negs = negotiations[-5:] if len(negotiations) > 5 else negotiations
-                for r in recent_negs:
-                    action = r.get('动作', '')
-                    thought = r.get('内心想法', '')
-                    # Truncate thought
-                    if len(thought) > 30: thought = thought[:30] + "..."
-                    history_lines.append(f"- [谈判记录] 第{r.get('月份', '?')}月: {action} (想法: {thought})")
-            except Exception:
-                pass
+        # 1. 决策历史
+        decisions = self._decision_history.get(agent_id, ())
+        recent_decisions = list(decisions)[-max_months:] if max_months > 0 else []
+        for month, role, action, urgency in recent_decisions:
+            history_lines.append(f"- [月度决策] 第{month}月: [{role}] {action} (紧迫度:{urgency})")
+
+        # 2. 谈判历史 (最近5条)
+        for month, action, thought in self._negotiation_history.get(agent_id, ()):
+            # Truncate thought
+            if len(thought) > 30: thought = thought[:30] + "..."
+            history_lines.append(f"- [谈判记录] 第{month}月: {action} (想法: {thought})")
 
         if not history_lines:
             return ""
@@ -0,0 +1,121 @@
+"""
+Buffered append-only row writer for high-volume run logs (CSV + optional Parquet)
+"""
+import csv
+import logging
+import os
+import threading
+from typing import Iterable, List, Sequence
+
+# 可选: pyarrow 用于 Parquet 输出 (未安装时仅写 CSV)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedRowWriter:
+    """
+    Rows are appended to an in-memory buffer and written by a background
+    thread once `flush_rows` rows are queued or every `flush_interval` seconds.
+    The CSV file stays open for the writer's lifetime. flush() drains the
+    buffer synchronously (month boundaries); close() flushes and stops the thread.
+
+    With parquet=True each drain is also written as a row group to
+    <path without .csv>.parquet (all columns as strings, named by `header`),
+    so a run's logs can be loaded column-wise with pandas/pyarrow.
+    """
+
+    def __init__(self, path: str, header: Sequence[str], flush_rows: int = 1000,
+                 flush_interval: float = 2.0, parquet: bool = False, encoding: str = 'utf-8-sig'):
+        self.path = path
+        self.header = list(header)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+
+        self._buffer: List[list] = []
+        self._lock = threading.Lock()      # guards _buffer
+        self._io_lock = threading.Lock()   # serialises drains (background thread vs flush())
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._file = open(path, 'w', newline='', encoding=encoding)
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(self.header)
+        self._file.flush()
+
+        self.parquet_path = None
+        self._parquet_writer = None
+        if parquet:
+            if PYARROW_AVAILABLE:
+                self.parquet_path = os.path.splitext(path)[0] + ".parquet"
+                self._schema = pa.schema([(name, pa.string()) for name in self.header])
+            else:
+                logger.warning(f"pyarrow not installed; Parquet output disabled for {path}")
+
+        self._thread = threading.Thread(target=self._run, name=f"writer-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def write(self, row: Sequence):
+        self.write_many([row])
+
+    def write_many(self, rows: Iterable[Sequence]):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Writer for {self.path} is closed")
+            self._buffer.extend(list(row) for row in rows)
+            full = len(self._buffer) >= self.flush_rows
+        if full:
+            self._wake.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Background flush of {self.path} failed: {e}")
+
+    def flush(self) -> int:
+        """Write all buffered rows now. Returns the number of rows written."""
+        with self._io_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            self._csv.writerows(rows)
+            self._file.flush()
+            if self.parquet_path:
+                self._write_parquet(rows)
+            return len(rows)
+
+    def _write_parquet(self, rows: List[list]):
+        columns = {name: [None if row[i] is None else str(row[i]) for row in rows]
+                   for i, name in enumerate(self.header)}
+        table = pa.Table.from_pydict(columns, schema=self._schema)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.parquet_path, self._schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._closed:
+            return
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        with self._io_lock:
+            self._file.close()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+from database import get_connection
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DatabasePool:
+    """
+    Thread-safe access layer for one run DB.
+
+    - Writes: a single writer thread owns the only write connection and runs
+      submitted jobs one at a time, each in its own transaction (commit on
+      success, rollback on error). Writers never interleave commits and never
+      contend with each other for the SQLite write lock.
+    - Reads: `read_pool_size` query_only connections handed out per call, so
+      lookups from worker threads run in parallel (WAL: readers do not block
+      the writer).
+    - Async: *_async methods run on a thread pool via run_in_executor and can be
+      awaited from coroutines without blocking the event loop.
+
+    The pool opens its own connections; other connections to the same file
+    (e.g. the runner's main connection) keep working alongside it, but must
+    commit their pending writes before awaiting a pool write. `on_connect` is
+    called with every connection the pool opens (e.g. SimulationProfiler.attach).
+    """
+
+    def __init__(self, db_path: str, db_config: Dict = None, read_pool_size: int = 4,
+                 on_connect: Callable[[sqlite3.Connection], None] = None):
+        self.db_path = db_path
+        self.db_config = db_config
+        self.read_pool_size = max(1, int(read_pool_size))
+        self.on_connect = on_connect
+
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._all_readers: List[sqlite3.Connection] = []
+        for _ in range(self.read_pool_size):
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = 1")
+            self._readers.put(conn)
+            self._all_readers.append(conn)
+        self._executor = ThreadPoolExecutor(max_workers=self.read_pool_size + 1, thread_name_prefix="db-pool")
+
+        self._closed = False
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._writer_ready = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+        self._writer_ready.wait()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Pooled connections are used from whichever thread borrows them
+        conn = get_connection(self.db_path, self.db_config, check_same_thread=False)
+        if self.on_connect:
+            self.on_connect(conn)
+        return conn
+
+    # --- Writer ---
+
+    def _write_loop(self):
+        conn = self._connect()
+        self._writer_ready.set()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is _STOP:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = fn(conn)
+                    conn.commit()
+                    future.set_result(result)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"DB write failed: {e}")
+                    future.set_exception(e)
+        finally:
+            conn.close()
+
+    def submit_write(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue fn(conn) on the writer thread; it runs in its own transaction."""
+        if self._closed:
+            raise RuntimeError("DatabasePool is closed")
+        future = Future()
+        self._jobs.put((fn, future))
+        return future
+
+    def execute(self, sql: str, params: Sequence = ()) -> Future:
+        return self.submit_write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> Future:
+        rows = list(seq_of_params)
+        return self.submit_write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    async def write_async(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self.submit_write(fn))
+
+    async def execute_async(self, sql: str, params: Sequence = ()) -> int:
+        return await asyncio.wrap_future(self.execute(sql, params))
+
+    async def executemany_async(self, sql: str, seq_of_params: Iterable[Sequence]) -> int:
+        return await asyncio.wrap_future(self.executemany(sql, seq_of_params))
+
+    def flush(self):
+        """Block until every write queued so far has been committed."""
+        self.submit_write(lambda conn: None).result()
+
+    # --- Readers ---
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool."""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def read(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def run_read(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(conn, *args) with a pooled read connection."""
+        with self.reader() as conn:
+            return fn(conn, *args)
+
+    async def read_async(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.read, sql, params)
+
+    async def run_read_async(self, fn: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.run_read, fn, *args)
+
+    # --- Lifecycle ---
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.put(_STOP)
+        self._writer.join()
+        self._executor.shutdown(wait=True)
+        for conn in self._all_readers:
+            conn.close()
@@ -0,0 +1,192 @@
+"""
+Persistent, content-addressed LLM response cache.
+
+Responses are keyed by (model id, system prompt, user prompt, temperature, json_mode)
+and stored in a small SQLite file, by default next to the run DB (llm_cache.db).
+Sampled requests (temperature > 0) also carry an occurrence index: the n-th
+identical request of a run gets its own entry, so repeated prompts keep
+independent samples instead of all sharing the first answer.
+
+Modes:
+- off:      cache disabled
+- record:   serve hits, call the LLM on misses and store the answer
+- readonly: serve hits, call the LLM on misses but never write
+- replay:   serve hits only; misses are NOT sent to the LLM (deterministic replays)
+
+Writes (new responses and LRU hit/last_access bookkeeping) are buffered in
+memory and committed in one transaction every `flush_every` operations or
+`flush_interval` seconds, and on close(), so no transaction is left open
+between operations and commits stay off the per-call path.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "record", "readonly", "replay")
+
+
+class LLMResponseCache:
+    def __init__(self, path: str = None, mode: str = "off", max_entries: int = 200000, max_size_mb: float = 512,
+                 flush_every: int = 50, flush_interval: float = 5.0):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode} (expected one of {CACHE_MODES})")
+        self.mode = mode if path else "off"
+        self.path = path
+        self.max_entries = int(max_entries or 0)
+        self.max_bytes = int((max_size_mb or 0) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_evict = 0
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval = flush_interval
+        # Buffered writes: cache_key -> row to insert / (hit count, last_access) to apply
+        self._pending_puts: Dict[str, tuple] = {}
+        self._pending_access: Dict[str, list] = {}
+        self._last_flush = time.monotonic()
+        # base key -> identical requests seen so far in this run
+        self._occurrences: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if self.mode != "off":
+            self._open()
+
+    def _open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                hits INTEGER DEFAULT 0,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+        logger.info(f"LLM response cache enabled ({self.mode}): {self.path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str, temperature: float, json_mode: bool) -> str:
+        payload = json.dumps([model, system_prompt, prompt, temperature, bool(json_mode)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def occurrence_key(self, key: str) -> str:
+        """Key for the next occurrence of `key` in this run (the first keeps the base key)."""
+        with self._lock:
+            n = self._occurrences.get(key, 0)
+            self._occurrences[key] = n + 1
+        return key if n == 0 else hashlib.sha256(f"{key}#{n}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            pending = self._pending_puts.get(key)
+            if pending is not None:
+                response = pending[2]
+            else:
+                row = self._conn.execute("SELECT response FROM llm_cache WHERE cache_key = ?", (key,)).fetchone()
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                response = row[0]
+            self.stats["hits"] += 1
+            if self.mode == "record":
+                # LRU bookkeeping, buffered until the next flush
+                access = self._pending_access.setdefault(key, [0, 0.0])
+                access[0] += 1
+                access[1] = time.time()
+                self._maybe_flush()
+            return response
+
+    def put(self, key: str, model: str, response: str):
+        if self.mode != "record":
+            return
+        now = time.time()
+        with self._lock:
+            self._pending_puts[key] = (key, model, response, len(response.encode("utf-8")), now, now)
+            self._pending_access.pop(key, None)
+            self.stats["writes"] += 1
+            self._writes_since_evict += 1
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        """Flush when enough operations are buffered or the interval has passed. Caller holds the lock."""
+        if (len(self._pending_puts) + len(self._pending_access) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        """Commit buffered inserts and LRU updates in one transaction. Caller holds the lock."""
+        self._last_flush = time.monotonic()
+        if not self._pending_puts and not self._pending_access:
+            return
+        puts, self._pending_puts = list(self._pending_puts.values()), {}
+        access, self._pending_access = self._pending_access, {}
+        self._conn.executemany("""
+            INSERT OR REPLACE INTO llm_cache (cache_key, model, response, size, hits, created_at, last_access)
+            VALUES (?, ?, ?, ?, 0, ?, ?)
+        """, puts)
+        self._conn.executemany("UPDATE llm_cache SET hits = hits + ?, last_access = ? WHERE cache_key = ?",
+                               [(hits, last_access, key) for key, (hits, last_access) in access.items()])
+        self._conn.commit()
+        # Evict in chunks rather than on every write
+        if self._writes_since_evict >= 100:
+            self._evict()
+
+    def flush(self):
+        if self._conn:
+            with self._lock:
+                self._flush()
+
+    def _evict(self):
+        """Drop least-recently-used entries until both size bounds hold. Caller holds the lock."""
+        self._writes_since_evict = 0
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        excess = 0
+        if self.max_entries and count > self.max_entries:
+            excess = count - self.max_entries
+        if self.max_bytes and total > self.max_bytes and count:
+            avg = total / count
+            excess = max(excess, int((total - self.max_bytes) / avg) + 1)
+        if excess <= 0:
+            return
+        self._conn.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+            )
+        """, (excess,))
+        self._conn.commit()
+        self.stats["evictions"] += excess
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, mode=self.mode, hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+    def close(self):
+        if self._conn:
+            with self._lock:
+                self._flush()
+                self._conn.close()
+                self._conn = None
@@ -1,9 +1,18 @@
+import asyncio
+import heapq
+import itertools
 import json
 import logging
 import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List
 
 from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
+from openai import AsyncOpenAI, OpenAI, RateLimitError
+
+from utils.llm_cache import LLMResponseCache
 
 # Load environment variables
 load_dotenv()
@@ -30,17 +39,40 @@ if not SMART_API_KEY:
     logger.warning("SMART_API_KEY (or DEEPSEEK_API_KEY) not found. Main LLM calls will fail.")
 
 # Initialize Clients
+# Fast clients reuse Smart clients if config is identical to save resources
+_SHARED_PROVIDER = FAST_API_KEY == SMART_API_KEY and FAST_BASE_URL == SMART_BASE_URL
+
 # Smart Clients
 client_smart = OpenAI(api_key=SMART_API_KEY, base_url=SMART_BASE_URL)
-aclient_smart = AsyncOpenAI(api_key=SMART_API_KEY, base_url=SMART_BASE_URL)
 
-# Fast Clients (Reuse Smart clients if config is identical to save resources)
-if FAST_API_KEY == SMART_API_KEY and FAST_BASE_URL == SMART_BASE_URL:
+# Fast Clients
+if _SHARED_PROVIDER:
     client_fast = client_smart
-    aclient_fast = aclient_smart
 else:
     client_fast = OpenAI(api_key=FAST_API_KEY, base_url=FAST_BASE_URL)
-    aclient_fast = AsyncOpenAI(api_key=FAST_API_KEY, base_url=FAST_BASE_URL)
+
+
+def _build_async_clients():
+    smart = AsyncOpenAI(api_key=SMART_API_KEY, base_url=SMART_BASE_URL)
+    fast = smart if _SHARED_PROVIDER else AsyncOpenAI(api_key=FAST_API_KEY, base_url=FAST_BASE_URL)
+    return smart, fast
+
+
+# Async clients keep their HTTP connection pool on the event loop that first uses them,
+# so SimulationRunner.run_async drives a whole run on one loop and closes them at the end.
+aclient_smart, aclient_fast = _build_async_clients()
+
+
+async def close_async_clients():
+    """Close the pooled async clients and replace them with fresh ones for the next event loop."""
+    global aclient_smart, aclient_fast
+    old = {id(c): c for c in (aclient_smart, aclient_fast)}
+    aclient_smart, aclient_fast = _build_async_clients()
+    for client in old.values():
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug(f"Closing async LLM client failed: {e}")
 
 def get_client(model_type: str, is_async: bool = False):
     """Select appropriate client based on model type."""
@@ -54,39 +86,490 @@ def get_model_id(model_type: str) -> str:
         return MODEL_FAST
     return MODEL_SMART
 
-def call_llm(prompt: str, system_prompt: str = "You are a helpful assistant in a real estate simulation.", json_mode: bool = False, model_type: str = "smart") -> str:
+# --- 3. Global Request Scheduler ---
+# Every LLM call in the process goes through one scheduler so that the
+# parallel phases (activation batches, negotiation sessions, bids) cannot
+# overload the provider. Limits are per model type (smart/fast); waiting
+# requests are served by priority lane, then FIFO.
+
+DEFAULT_SCHEDULER_CONFIG = {
+    "smart": {"max_concurrency": 16, "requests_per_minute": 600, "tokens_per_minute": 1000000},
+    "fast": {"max_concurrency": 32, "requests_per_minute": 1200, "tokens_per_minute": 2000000},
+    # Lower value = served first
+    "priorities": {"negotiation": 0, "activation": 1, "default": 2, "reporting": 3},
+    # Pause a model lane for N seconds after the provider answers 429
+    "rate_limit_cooldown": 5.0,
+    "rate_limit_retries": 2,
+}
+
+
+def estimate_tokens(*texts: str, completion_reserve: int = 512) -> int:
+    """Rough token estimate (CJK-heavy prompts run ~0.6 tokens per char)."""
+    chars = sum(len(t) for t in texts if t)
+    return int(chars * 0.6) + completion_reserve
+
+
+class _TokenBucket:
+    """Per-minute budget refilled continuously. A budget of 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute or 0)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Oversized requests are admitted once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.capacity > 0:
+            self.tokens -= amount
+
+
+class _Ticket:
+    """
+    A queued request. Wakes either a coroutine or a blocked thread.
+    Sync tickets always use a threading.Event, even when created on the event-loop thread.
+    """
+
+    def __init__(self, lane: str, priority: int, priority_name: str, tokens: int, seq: int, sync: bool = False):
+        self.lane = lane
+        self.priority = priority
+        self.priority_name = priority_name
+        self.tokens = tokens
+        self.seq = seq
+        self.used_tokens = None
+        self.enqueued_at = time.monotonic()
+        self._loop = None
+        if sync:
+            self._event = threading.Event()
+        else:
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def notify(self):
+        if self._loop is None:
+            self._event.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # Loop already closed; the waiter is gone
+
+    async def wait_async(self, timeout):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+    def wait_sync(self, timeout):
+        self._event.wait(timeout)
+        self._event.clear()
+
+
+class _ModelLane:
+    def __init__(self, name: str, cfg: Dict):
+        self.name = name
+        self.max_concurrency = max(1, int(cfg.get("max_concurrency", 16)))
+        self.requests = _TokenBucket(cfg.get("requests_per_minute", 0))
+        self.tokens = _TokenBucket(cfg.get("tokens_per_minute", 0))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.waiters: List[_Ticket] = []
+        # Stats
+        self.granted = 0
+        self.max_queue_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.rate_limited = 0
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+    - Concurrency cap per model type
+    - Requests-per-minute and tokens-per-minute token buckets
+    - Priority lanes (negotiation > activation > default > reporting)
+    Works for both coroutines and plain threads (sync call_llm).
+    """
+
+    def __init__(self, config: Dict = None):
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.configure(config)
+
+    def configure(self, config: Dict = None):
+        """(Re)build lanes from a config dict (see DEFAULT_SCHEDULER_CONFIG). Resets stats."""
+        cfg = {k: (dict(v) if isinstance(v, dict) else v) for k, v in DEFAULT_SCHEDULER_CONFIG.items()}
+        for key, value in (config or {}).items():
+            if isinstance(value, dict) and isinstance(cfg.get(key), dict):
+                cfg[key].update(value)
+            else:
+                cfg[key] = value
+
+        with self._lock:
+            self.priorities: Dict[str, int] = cfg["priorities"]
+            self.rate_limit_cooldown = float(cfg.get("rate_limit_cooldown", 5.0))
+            self.rate_limit_retries = int(cfg.get("rate_limit_retries", 2))
+            self._lanes = {name: _ModelLane(name, cfg[name]) for name in ("smart", "fast")}
+            self._priority_stats: Dict[str, Dict] = {}
+
+    def _lane(self, model_type: str) -> _ModelLane:
+        return self._lanes["fast" if model_type.lower() == "fast" else "smart"]
+
+    def _new_ticket(self, model_type: str, priority: str, tokens: int, sync: bool = False) -> _Ticket:
+        lane = self._lane(model_type)
+        level = self.priorities.get(priority, self.priorities.get("default", 2))
+        ticket = _Ticket(lane.name, level, priority, tokens, next(self._seq), sync=sync)
+        with self._lock:
+            heapq.heappush(lane.waiters, ticket)
+            lane.max_queue_depth = max(lane.max_queue_depth, len(lane.waiters))
+        return ticket
+
+    def _try_grant(self, ticket: _Ticket):
+        """Returns 0 when granted, seconds to sleep when rate limited, None to wait for a release."""
+        lane = self._lanes[ticket.lane]
+        now = time.monotonic()
+        with self._lock:
+            if not lane.waiters or lane.waiters[0] is not ticket:
+                return None
+            if lane.in_flight >= lane.max_concurrency:
+                return None
+            wait = max(lane.paused_until - now,
+                       lane.requests.wait_time(1, now),
+                       lane.tokens.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+
+            heapq.heappop(lane.waiters)
+            lane.in_flight += 1
+            lane.requests.consume(1)
+            lane.tokens.consume(ticket.tokens)
+
+            waited = now - ticket.enqueued_at
+            lane.granted += 1
+            lane.wait_total += waited
+            lane.wait_max = max(lane.wait_max, waited)
+            p_stats = self._priority_stats.setdefault(ticket.priority_name,
+                                                      {"requests": 0, "wait_total": 0.0, "wait_max": 0.0})
+            p_stats["requests"] += 1
+            p_stats["wait_total"] += waited
+            p_stats["wait_max"] = max(p_stats["wait_max"], waited)
+            next_head = lane.waiters[0] if lane.waiters else None
+
+        # The next request in line may also fit
+        if next_head:
+            next_head.notify()
+        return 0
+
+    def _abandon(self, ticket: _Ticket):
+        lane = self._lanes[ticket.lane]
+        with self._lock:
+            if ticket in lane.waiters:
+                lane.waiters.remove(ticket)
+                heapq.heapify(lane.waiters)
+            next_head = lane.waiters[0] if lane.waiters else None
+        if next_head:
+            next_head.notify()
+
+    async def acquire(self, model_type: str = "smart", priority: str = "default", tokens: int = 0) -> _Ticket:
+        ticket = self._new_ticket(model_type, priority, tokens)
+        try:
+            while True:
+                wait = self._try_grant(ticket)
+                if wait == 0:
+                    return ticket
+                await ticket.wait_async(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def acquire_sync(self, model_type: str = "smart", priority: str = "default", tokens: int = 0) -> _Ticket:
+        """
+        Blocking acquire for plain threads. On a thread running an event loop a
+        wait would block the loop (and the async holders that must release the
+        slot), so a request that cannot be granted at once raises RuntimeError.
+        """
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        ticket = self._new_ticket(model_type, priority, tokens, sync=True)
+        try:
+            while True:
+                wait = self._try_grant(ticket)
+                if wait == 0:
+                    return ticket
+                if on_loop:
+                    raise RuntimeError(f"Sync LLM call on the event-loop thread found no free {ticket.lane} slot; "
+                                       f"use the async API (call_llm_async) from coroutines")
+                ticket.wait_sync(wait)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def release(self, ticket: _Ticket):
+        lane = self._lanes[ticket.lane]
+        with self._lock:
+            lane.in_flight = max(0, lane.in_flight - 1)
+            # Reconcile the token budget with the real usage reported by the API
+            if ticket.used_tokens is not None:
+                lane.tokens.consume(ticket.used_tokens - ticket.tokens)
+            next_head = lane.waiters[0] if lane.waiters else None
+        if next_head:
+            next_head.notify()
+
+    def penalize(self, model_type: str, seconds: float = None):
+        """Pause a model lane after a provider-side rate limit (HTTP 429)."""
+        lane = self._lane(model_type)
+        with self._lock:
+            lane.paused_until = max(lane.paused_until, time.monotonic() + (seconds or self.rate_limit_cooldown))
+            lane.rate_limited += 1
+
+    @asynccontextmanager
+    async def slot(self, model_type: str = "smart", priority: str = "default", tokens: int = 0):
+        ticket = await self.acquire(model_type, priority, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @contextmanager
+    def slot_sync(self, model_type: str = "smart", priority: str = "default", tokens: int = 0):
+        ticket = self.acquire_sync(model_type, priority, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def get_stats(self) -> Dict:
+        """Queue depth and wait-time stats per model lane and per priority lane."""
+        with self._lock:
+            lanes = {}
+            for name, lane in self._lanes.items():
+                lanes[name] = {
+                    "queue_depth": len(lane.waiters),
+                    "max_queue_depth": lane.max_queue_depth,
+                    "in_flight": lane.in_flight,
+                    "requests": lane.granted,
+                    "rate_limited": lane.rate_limited,
+                    "avg_wait": lane.wait_total / lane.granted if lane.granted else 0.0,
+                    "max_wait": lane.wait_max,
+                }
+            priorities = {
+                name: {
+                    "requests": s["requests"],
+                    "avg_wait": s["wait_total"] / s["requests"] if s["requests"] else 0.0,
+                    "max_wait": s["wait_max"],
+                }
+                for name, s in self._priority_stats.items()
+            }
+        return {"models": lanes, "priorities": priorities}
+
+
+_scheduler = LLMScheduler()
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+def configure_scheduler(config: Dict = None) -> LLMScheduler:
+    """Apply `system.llm.scheduler` from baseline.yaml to the global scheduler."""
+    _scheduler.configure(config)
+    return _scheduler
+
+
+def format_scheduler_stats(stats: Dict = None) -> str:
+    stats = stats or _scheduler.get_stats()
+    parts = []
+    for name, s in stats["models"].items():
+        if s["requests"] or s["queue_depth"]:
+            parts.append(f"{name}: {s['requests']} calls, queue {s['queue_depth']} (max {s['max_queue_depth']}), "
+                         f"wait avg {s['avg_wait']:.2f}s / max {s['max_wait']:.2f}s, 429x{s['rate_limited']}")
+    return "; ".join(parts) if parts else "no LLM calls"
+
+
+class LLMUsageStats:
+    """
+    Cumulative LLM call counters (calls, latency, tokens) for profiling; diff two snapshots per phase.
+    A max is not diffable, so per-span maximum latency comes from windows (open_window / close_window).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "cache_hits": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+        self._window_ids = itertools.count()
+        self._windows: Dict[int, float] = {}
+
+    def record_call(self, latency: float, usage=None):
+        with self._lock:
+            s = self._stats
+            s["calls"] += 1
+            s["latency_total"] += latency
+            s["latency_max"] = max(s["latency_max"], latency)
+            for key, current in self._windows.items():
+                if latency > current:
+                    self._windows[key] = latency
+            if usage is not None:
+                s["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                s["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def record_cache_hit(self):
+        with self._lock:
+            self._stats["cache_hits"] += 1
+
+    def record_error(self):
+        with self._lock:
+            self._stats["errors"] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def open_window(self) -> int:
+        """Start tracking the max single-call latency from now; returns the window key."""
+        with self._lock:
+            key = next(self._window_ids)
+            self._windows[key] = 0.0
+            return key
+
+    def close_window(self, key: int) -> float:
+        """Stop tracking a window and return its max latency (0.0 if no calls)."""
+        with self._lock:
+            return self._windows.pop(key, 0.0)
+
+
+_usage = LLMUsageStats()
+
+
+def get_usage_stats() -> LLMUsageStats:
+    return _usage
+
+
+_cache = LLMResponseCache()
+
+
+def get_cache() -> LLMResponseCache:
+    return _cache
+
+
+def configure_cache(path: str = None, config: Dict = None) -> LLMResponseCache:
+    """
+    Apply `system.llm.cache` from baseline.yaml. `path` is the default cache file
+    (the runner passes llm_cache.db next to the run DB); `cache.path` overrides it.
+    Caching stays off unless `cache.mode` enables it.
+    """
+    global _cache
+    config = config or {}
+    _cache.close()
+    # An unquoted YAML `mode: off` loads as False
+    mode = (config.get("mode") or "off") if config.get("enabled", True) else "off"
+    _cache = LLMResponseCache(
+        path=config.get("path") or path,
+        mode=mode,
+        max_entries=config.get("max_entries", 200000),
+        max_size_mb=config.get("max_size_mb", 512),
+        flush_every=config.get("flush_every", 50),
+        flush_interval=config.get("flush_interval", 5.0),
+    )
+    return _cache
+
+
+def format_cache_stats(stats: Dict = None) -> str:
+    stats = stats or _cache.get_stats()
+    if stats["mode"] == "off":
+        return "off"
+    return (f"{stats['mode']}: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['writes']} writes, {stats['evictions']} evicted")
+
+
+def _cache_lookup(kwargs: Dict, system_prompt: str, prompt: str, json_mode: bool):
+    """Returns (cache_key, cached_response). cache_key is None when caching is off."""
+    if not _cache.enabled:
+        return None, None
+    key = LLMResponseCache.make_key(kwargs["model"], system_prompt, prompt, kwargs["temperature"], json_mode)
+    if kwargs["temperature"] > 0:
+        key = _cache.occurrence_key(key)
+    return key, _cache.get(key)
+
+
+def call_llm(prompt: str, system_prompt: str = "You are a helpful assistant in a real estate simulation.",
+             json_mode: bool = False, model_type: str = "smart", priority: str = "default") -> str:
     """
     Call LLM via OpenAI SDK (Supports Dual Providers).
     model_type: 'smart' (default) or 'fast'
+    priority: scheduler lane ('negotiation', 'activation', 'default', 'reporting')
     """
     current_client = get_client(model_type, is_async=False)
 
-    try:
-        kwargs = {
-            "model": get_model_id(model_type),
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False,
-            "temperature": 0.7
-        }
-        if json_mode:
-            kwargs["response_format"] = {"type": "json_object"}
-
-        response = current_client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logger.error(f"LLM Call Failed ({model_type}): {e}")
-        return f"Error: {str(e)}"
-
-def safe_call_llm(prompt: str, default_return: dict, system_prompt: str = "", model_type: str = "smart") -> dict:
+    kwargs = {
+        "model": get_model_id(model_type),
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        "stream": False,
+        "temperature": 0.7
+    }
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    cache_key, cached = _cache_lookup(kwargs, system_prompt, prompt, json_mode)
+    if cached is not None:
+        _usage.record_cache_hit()
+        return cached
+    if cache_key and _cache.replay_only:
+        logger.warning(f"LLM cache miss in replay mode ({model_type}), skipping call")
+        return "Error: LLM cache miss (replay mode)"
+
+    est_tokens = estimate_tokens(prompt, system_prompt)
+    for attempt in range(_scheduler.rate_limit_retries + 1):
+        try:
+            with _scheduler.slot_sync(model_type, priority, est_tokens) as ticket:
+                started = time.perf_counter()
+                response = current_client.chat.completions.create(**kwargs)
+                _usage.record_call(time.perf_counter() - started, getattr(response, "usage", None))
+                if getattr(response, "usage", None):
+                    ticket.used_tokens = response.usage.total_tokens
+            content = response.choices[0].message.content.strip()
+            if cache_key:
+                _cache.put(cache_key, kwargs["model"], content)
+            return content
+        except RateLimitError as e:
+            _scheduler.penalize(model_type)
+            if attempt < _scheduler.rate_limit_retries:
+                continue
+            _usage.record_error()
+            logger.error(f"LLM Call Failed ({model_type}): {e}")
+            return f"Error: {str(e)}"
+        except Exception as e:
+            _usage.record_error()
+            logger.error(f"LLM Call Failed ({model_type}): {e}")
+            return f"Error: {str(e)}"
+
+def safe_call_llm(prompt: str, default_return: dict, system_prompt: str = "", model_type: str = "smart",
+                  priority: str = "default") -> dict:
     """
     Call LLM and parse JSON response. Returns default if failure.
     """
     json_prompt = prompt + "\n\n请只输出JSON格式，不要包含Markdown代码块或其他文本。"
 
-    response_text = call_llm(json_prompt, system_prompt, json_mode=True, model_type=model_type)
+    response_text = call_llm(json_prompt, system_prompt, json_mode=True, model_type=model_type, priority=priority)
 
     clean_text = response_text.replace("```json", "").replace("```", "").strip()
 
@@ -103,38 +586,68 @@ def safe_call_llm(prompt: str, default_return: dict, system_prompt: str = "", mo
             pass
         return default_return
 
-async def call_llm_async(prompt: str, system_prompt: str = "You are a helpful assistant in a real estate simulation.", json_mode: bool = False, model_type: str = "smart") -> str:
+async def call_llm_async(prompt: str, system_prompt: str = "You are a helpful assistant in a real estate simulation.",
+                         json_mode: bool = False, model_type: str = "smart", priority: str = "default") -> str:
     """
     Async Call LLM via OpenAI SDK (Supports Dual Providers).
+    Admission is controlled by the global LLMScheduler (see get_scheduler()).
     """
     current_client = get_client(model_type, is_async=True)
 
-    try:
-        kwargs = {
-            "model": get_model_id(model_type),
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False,
-            "temperature": 0.7
-        }
-        if json_mode:
-            kwargs["response_format"] = {"type": "json_object"}
-
-        response = await current_client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logger.error(f"Async LLM Call Failed ({model_type}): {e}")
-        return f"Error: {str(e)}"
-
-async def safe_call_llm_async(prompt: str, default_return: dict, system_prompt: str = "", model_type: str = "smart") -> dict:
+    kwargs = {
+        "model": get_model_id(model_type),
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        "stream": False,
+        "temperature": 0.7
+    }
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    cache_key, cached = _cache_lookup(kwargs, system_prompt, prompt, json_mode)
+    if cached is not None:
+        _usage.record_cache_hit()
+        return cached
+    if cache_key and _cache.replay_only:
+        logger.warning(f"LLM cache miss in replay mode ({model_type}), skipping call")
+        return "Error: LLM cache miss (replay mode)"
+
+    est_tokens = estimate_tokens(prompt, system_prompt)
+    for attempt in range(_scheduler.rate_limit_retries + 1):
+        try:
+            async with _scheduler.slot(model_type, priority, est_tokens) as ticket:
+                started = time.perf_counter()
+                response = await current_client.chat.completions.create(**kwargs)
+                _usage.record_call(time.perf_counter() - started, getattr(response, "usage", None))
+                if getattr(response, "usage", None):
+                    ticket.used_tokens = response.usage.total_tokens
+            content = response.choices[0].message.content.strip()
+            if cache_key:
+                _cache.put(cache_key, kwargs["model"], content)
+            return content
+        except RateLimitError as e:
+            _scheduler.penalize(model_type)
+            if attempt < _scheduler.rate_limit_retries:
+                continue
+            _usage.record_error()
+            logger.error(f"Async LLM Call Failed ({model_type}): {e}")
+            return f"Error: {str(e)}"
+        except Exception as e:
+            _usage.record_error()
+            logger.error(f"Async LLM Call Failed ({model_type}): {e}")
+            return f"Error: {str(e)}"
+
+async def safe_call_llm_async(prompt: str, default_return: dict, system_prompt: str = "", model_type: str = "smart",
+                              priority: str = "default") -> dict:
     """
     Async wrapper for safe JSON LLM calls.
     """
     json_prompt = prompt + "\n\n请只输出JSON格式，不要包含Markdown代码块或其他文本。"
 
-    response_text = await call_llm_async(json_prompt, system_prompt, json_mode=True, model_type=model_type)
+    response_text = await call_llm_async(json_prompt, system_prompt, json_mode=True, model_type=model_type,
+                                         priority=priority)
 
     clean_text = response_text.replace("```json", "").replace("```", "").strip()
 
@@ -0,0 +1,171 @@
+import random
+
+from config.agent_templates import get_template_for_tier
+from models import AgentStory
+
+
+class PersonaGenerator:
+    """
+    Offline, template-based persona synthesizer (zero LLM calls).
+
+    Composes AgentStory fields from config/agent_templates.py plus weighted
+    fragments. Each agent gets its own RNG derived from (seed, agent_id), so a
+    persona does not depend on generation order. Follows the same consistency
+    rules as the story prompt:
+    1. Property owners are never described as 刚需 / 首次置业 / 租房居住.
+    2. Cash-rich owners (>100w) are never described as 积蓄不多.
+    3. housing_need: 刚需 only without property, 改善/投资 only with property, 学区 only with children.
+    """
+
+    # Phrases that contradict owning property (rule 1) or being cash-rich (rule 2)
+    OWNER_FORBIDDEN = ("无房", "首次置业", "租房", "刚需", "上车")
+    RICH_FORBIDDEN = ("积蓄不多",)
+    # Template backgrounds mentioning children only fit families with children
+    CHILD_PHRASES = ("孩子", "子女")
+    RICH_CASH = 1_000_000
+
+    # (text, weight)
+    CAREER_OUTLOOKS = [("稳定", 0.45), ("上升", 0.25), ("波动", 0.2), ("下行压力", 0.1)]
+
+    FAMILY_PLANS = {
+        "single": [("暂无结婚计划", 0.4), ("计划两年内结婚", 0.35), ("专注事业", 0.25)],
+        "married_young": [("计划要孩子", 0.4), ("孩子刚出生", 0.3), ("丁克", 0.3)],
+        "married_mid": [("孩子上小学", 0.4), ("孩子读初中", 0.3), ("二胎家庭", 0.3)],
+        "married_senior": [("子女已成年", 0.6), ("照顾年迈父母", 0.4)],
+    }
+    # Family plans that imply a school-age child now or soon
+    SCHOOL_FAMILY_PLANS = {"孩子刚出生": "未来需要学区", "孩子上小学": "需要优质小学学区",
+                           "孩子读初中": "需要优质初中学区", "二胎家庭": "需要优质小学学区"}
+
+    FAMILY_SENTENCES = {
+        "暂无结婚计划": "目前单身，生活重心在工作上。",
+        "计划两年内结婚": "和伴侣感情稳定，计划两年内结婚。",
+        "专注事业": "把主要精力放在事业发展上。",
+        "计划要孩子": "婚后正计划要孩子。",
+        "孩子刚出生": "家里刚添了新成员，开销明显增加。",
+        "丁克": "夫妻二人选择丁克，生活相对宽裕。",
+        "孩子上小学": "孩子正在上小学，教育是家庭头等大事。",
+        "孩子读初中": "孩子读初中，升学压力不小。",
+        "二胎家庭": "家里有两个孩子，居住空间日渐紧张。",
+        "子女已成年": "子女已经成年独立。",
+        "照顾年迈父母": "需要兼顾照顾年迈的父母。",
+    }
+
+    HOUSING_SENTENCES = {
+        "刚需": [("希望尽快买下属于自己的第一套房。", 0.5), ("厌倦了租房搬家，想在通勤范围内安家。", 0.5)],
+        "改善": [("名下已有{props}套房产，希望置换面积更大、品质更好的住房。", 0.6),
+                 ("名下已有{props}套房产，考虑卖旧换新改善居住条件。", 0.4)],
+        "投资": [("名下已有{props}套房产，把房产视为资产配置的重要部分。", 0.6),
+                 ("名下已有{props}套房产，关注核心地段的长期增值。", 0.4)],
+        "学区": [("为了孩子上学，优先考虑优质学区。", 1.0)],
+        "无": [("暂无明确的购房计划。", 1.0)],
+    }
+    TIER_BACKGROUNDS = {
+        "ultra_high": "事业有成，现金流充裕，关注资产保值增值。",
+        "high": "收入较高，工作节奏快，对居住品质有要求。",
+        "middle": "收入稳定，生活按部就班。",
+        "lower_middle": "收入一般，日常开支精打细算。",
+        "low": "收入不高，生活节俭。",
+    }
+    OWNER_BACKGROUNDS = {
+        "ultra_high": "事业有成，资产雄厚，房产是家族资产的重要组成部分。",
+        "high": "收入较高，早年购入了房产，正在考虑优化资产配置。",
+        "middle": "收入稳定，通过多年积累已经置业。",
+        "lower_middle": "收入一般，早年购入的住房是家里最主要的资产。",
+        "low": "收入不高，名下住房多为家中早年所购。",
+    }
+
+    SELLING_MOTIVATIONS = {
+        "改善": [("置换升级", 0.7), ("暂无", 0.3)],
+        "投资": [("高位止盈", 0.4), ("资产变现", 0.3), ("暂无", 0.3)],
+        "学区": [("置换学区房", 0.8), ("暂无", 0.2)],
+    }
+
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+
+    def _rng(self, agent_id: int) -> random.Random:
+        return random.Random(self.seed * 1_000_003 + agent_id)
+
+    def should_enrich(self, agent_id: int, sample_rate: float) -> bool:
+        """Deterministic per-agent sampling for optional LLM enrichment."""
+        if sample_rate <= 0:
+            return False
+        return random.Random(f"enrich:{self.seed}:{agent_id}").random() < sample_rate
+
+    @staticmethod
+    def _pick(rng: random.Random, options):
+        texts, weights = zip(*options)
+        return rng.choices(texts, weights=weights, k=1)[0]
+
+    def _family_plan(self, rng, agent) -> str:
+        if agent.marital_status != "married":
+            key = "single"
+        elif agent.age < 33:
+            key = "married_young"
+        elif agent.age < 50:
+            key = "married_mid"
+        else:
+            key = "married_senior"
+        return self._pick(rng, self.FAMILY_PLANS[key])
+
+    def _housing_need(self, rng, template_need: str, props: int, has_school_need: bool, rich: bool) -> str:
+        if has_school_need and (template_need == "学区" or rng.random() < 0.5):
+            return "学区"
+        if props > 0:
+            if template_need in ("改善", "投资"):
+                return template_need
+            return "投资" if rich else "改善"
+        if template_need in ("刚需", "无"):
+            return template_need
+        return "刚需"
+
+    def _background(self, template: dict, tier: str, props: int, rich: bool, has_children: bool) -> str:
+        """Template background if it is consistent with this agent, else a generic tier sentence."""
+        text = template.get("background", "")
+        inconsistent = (
+            (props > 0 and any(p in text for p in self.OWNER_FORBIDDEN))
+            or (rich and any(p in text for p in self.RICH_FORBIDDEN))
+            or (not has_children and any(p in text for p in self.CHILD_PHRASES))
+        )
+        if text and not inconsistent:
+            return text
+        backgrounds = self.OWNER_BACKGROUNDS if props > 0 else self.TIER_BACKGROUNDS
+        return backgrounds.get(tier, backgrounds["middle"])
+
+    def generate(self, agent, tier: str, template: dict = None, investment_style: str = None) -> AgentStory:
+        """Build an AgentStory for `agent` (properties must already be allocated)."""
+        rng = self._rng(agent.id)
+        template = template or get_template_for_tier(tier, rng)
+        props = len(agent.owned_properties)
+        rich = agent.cash > self.RICH_CASH
+
+        family_plan = self._family_plan(rng, agent)
+        education_need = self.SCHOOL_FAMILY_PLANS.get(family_plan, "无")
+        housing_need = self._housing_need(rng, template.get("housing_need", "无"), props,
+                                          education_need != "无", rich)
+
+        has_children = education_need != "无" or family_plan == "子女已成年"
+        background = self._background(template, tier, props, rich, has_children)
+        sentences = [
+            f"{agent.age}岁，职业是{template['occupation']}。",
+            background,
+            self.FAMILY_SENTENCES[family_plan],
+            self._pick(rng, self.HOUSING_SENTENCES[housing_need]).format(props=props),
+        ]
+
+        if props > 0:
+            selling_motivation = self._pick(rng, self.SELLING_MOTIVATIONS.get(housing_need, [("暂无", 1.0)]))
+        else:
+            selling_motivation = "无"
+
+        return AgentStory(
+            occupation=template["occupation"],
+            career_outlook=self._pick(rng, self.CAREER_OUTLOOKS),
+            family_plan=family_plan,
+            education_need=education_need,
+            housing_need=housing_need,
+            selling_motivation=selling_motivation,
+            background_story="".join(sentences),
+            investment_style=investment_style or "balanced",
+        )
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from utils.llm_client import get_usage_stats
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = ("wall_time", "llm_calls", "llm_cache_hits", "llm_errors", "llm_latency_total", "llm_latency_max",
+                 "prompt_tokens", "completion_tokens", "db_statements")
+
+# LLMUsageStats key -> metric name
+_LLM_FIELDS = {"calls": "llm_calls", "cache_hits": "llm_cache_hits", "errors": "llm_errors",
+               "latency_total": "llm_latency_total", "prompt_tokens": "prompt_tokens",
+               "completion_tokens": "completion_tokens"}
+
+
+def _empty_metrics() -> Dict:
+    return {field: 0 for field in METRIC_FIELDS}
+
+
+class SimulationProfiler:
+    """
+    Per-month, per-phase profile of a simulation run (system.profiling).
+
+    For every phase it records wall time, LLM calls / cache hits / errors,
+    LLM latency (total and max single call), prompt/completion tokens and the
+    number of SQL statements run on attached connections. Phases run one after
+    another, so counters are diffed between phase start and end. Month 0 holds
+    run-level phases (initialization, reporting); phase 'total' is the whole month.
+
+    Rows go to the perf_metrics table once per month and a JSON summary is
+    written at the end of the run. With cprofile_month set, that month runs
+    under cProfile: profile_month_<m>.prof (pstats / snakeviz / flameprof) and a
+    text digest sorted by cumulative time are written to output_dir.
+    """
+
+    def __init__(self, enabled: bool = True, cprofile_month: Optional[int] = None, output_dir: str = "."):
+        self.enabled = enabled
+        self.cprofile_month = cprofile_month
+        self.output_dir = output_dir
+        self.months: Dict[int, Dict[str, Dict]] = {}
+
+        self._db_lock = threading.Lock()
+        self._db_statements = 0
+        self._month = None
+        self._month_started = None
+        self._month_counters = None
+        self._month_window = None
+        self._phase = None
+        self._phase_started = None
+        self._phase_counters = None
+        self._phase_window = None
+        self._cprofile = None
+
+    # --- Counters ---
+
+    def attach(self, conn: sqlite3.Connection):
+        """Count SQL statements executed on `conn`."""
+        if self.enabled:
+            conn.set_trace_callback(self._on_statement)
+
+    def _on_statement(self, _sql):
+        with self._db_lock:
+            self._db_statements += 1
+
+    def _counters(self) -> Dict:
+        return {"llm": get_usage_stats().snapshot(), "db_statements": self._db_statements}
+
+    def _diff(self, started: float, before: Dict, window: int) -> Dict:
+        after = self._counters()
+        metrics = _empty_metrics()
+        metrics["wall_time"] = time.perf_counter() - started
+        for key, field in _LLM_FIELDS.items():
+            metrics[field] = after["llm"][key] - before["llm"][key]
+        # Max single-call latency is not diffable; each span tracks its own window
+        metrics["llm_latency_max"] = get_usage_stats().close_window(window)
+        metrics["db_statements"] = after["db_statements"] - before["db_statements"]
+        return metrics
+
+    def _add(self, month: int, phase: str, metrics: Dict):
+        bucket = self.months.setdefault(month, {}).setdefault(phase, _empty_metrics())
+        for field in METRIC_FIELDS:
+            if field == "llm_latency_max":
+                bucket[field] = max(bucket[field], metrics[field])
+            else:
+                bucket[field] += metrics[field]
+
+    # --- Phases ---
+
+    def start_month(self, month: int):
+        self._month = month
+        self._month_started = time.perf_counter()
+        self._month_counters = self._counters()
+        self._month_window = get_usage_stats().open_window()
+        if self.enabled and self.cprofile_month == month:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def start_phase(self, name: str):
+        """Close the open phase (if any) and start `name`."""
+        self.end_phase()
+        self._phase = name
+        self._phase_started = time.perf_counter()
+        self._phase_counters = self._counters()
+        self._phase_window = get_usage_stats().open_window()
+
+    def end_phase(self):
+        if self._phase is None:
+            return
+        metrics = self._diff(self._phase_started, self._phase_counters, self._phase_window)
+        self._add(self._month or 0, self._phase, metrics)
+        self._phase = None
+
+    @contextmanager
+    def phase(self, name: str):
+        self.start_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase()
+
+    def end_month(self) -> float:
+        """Close the month; returns its wall time in seconds."""
+        self.end_phase()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._dump_cprofile(self._month)
+            self._cprofile = None
+        total = self._diff(self._month_started, self._month_counters, self._month_window)
+        self._add(self._month, "total", total)
+        return total["wall_time"]
+
+    def _dump_cprofile(self, month: int):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile_month_{month}.prof")
+        self._cprofile.dump_stats(path)
+        digest = io.StringIO()
+        pstats.Stats(self._cprofile, stream=digest).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(self.output_dir, f"profile_month_{month}.txt"), "w", encoding="utf-8") as f:
+            f.write(digest.getvalue())
+        logger.info(f"cProfile for month {month} written to {path}")
+
+    # --- Output ---
+
+    def persist(self, conn: sqlite3.Connection, month: int):
+        """Write the month's phase rows to perf_metrics."""
+        if not self.enabled or month not in self.months:
+            return
+        rows = [(month, phase, *(m[field] for field in METRIC_FIELDS)) for phase, m in self.months[month].items()]
+        conn.executemany(f"""INSERT INTO perf_metrics (month, phase, {', '.join(METRIC_FIELDS)})
+                             VALUES ({', '.join('?' * (len(METRIC_FIELDS) + 2))})""", rows)
+        conn.commit()
+
+    def format_month(self, month: int) -> str:
+        phases = self.months.get(month, {})
+        parts = [f"{name} {m['wall_time']:.2f}s/{m['llm_calls']} llm/{m['db_statements']} sql"
+                 for name, m in phases.items() if name != "total"]
+        total = phases.get("total", _empty_metrics())
+        return f"Month {month} profile: {total['wall_time']:.2f}s total | " + ", ".join(parts)
+
+    def summary(self) -> Dict:
+        phases: Dict[str, Dict] = {}
+        for month, month_phases in self.months.items():
+            for name, m in month_phases.items():
+                bucket = phases.setdefault(name, _empty_metrics())
+                for field in METRIC_FIELDS:
+                    if field == "llm_latency_max":
+                        bucket[field] = max(bucket[field], m[field])
+                    else:
+                        bucket[field] += m[field]
+        for m in phases.values():
+            m["llm_latency_avg"] = m["llm_latency_total"] / m["llm_calls"] if m["llm_calls"] else 0.0
+        return {"months": {str(k): v for k, v in sorted(self.months.items())}, "phases": phases}
+
+    def write_summary(self, path: str = None) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = path or os.path.join(self.output_dir, "perf_summary.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        logger.info(f"Performance summary written to {path}")
+        return path
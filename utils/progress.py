@@ -0,0 +1,43 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ThroughputMeter:
+    """
+    Progress / throughput meter for long batch phases (e.g. agent story generation).
+    Logs done/total, items per second and ETA at most every `log_interval` seconds.
+    """
+
+    def __init__(self, total: int, label: str = "Progress", unit: str = "items", log_interval: float = 5.0):
+        self.total = total
+        self.label = label
+        self.unit = unit
+        self.log_interval = log_interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last_log = self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, n: int = 1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last_log >= self.log_interval or self.done >= self.total:
+            self._last_log = now
+            logger.info(self.format())
+
+    def format(self) -> str:
+        pct = self.done / self.total * 100 if self.total else 100.0
+        rate = self.rate
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        return (f"{self.label}: {self.done}/{self.total} ({pct:.1f}%) | "
+                f"{rate:.1f} {self.unit}/s | elapsed {self.elapsed:.1f}s | ETA {eta:.0f}s")